@@ -0,0 +1,290 @@
+"""
+Сквозной бенчмарк обработчиков start_router.
+
+Обновления передаются в настоящий диспетчер бота через feed_raw_update,
+Bot API заменен сессией без сети, модель - локальным OpenAI-совместимым
+сервером с заготовленными вызовами database_search. Поиск идет в
+PostgreSQL (или в снимке в памяти с --memory-search) по отдельной схеме,
+заполненной синтетическими объявлениями, для каждого размера из --sizes.
+
+Каждая итерация - новый пользователь, который отправляет /start и запрос,
+листает список зданий, открывает первое здание и первый объект в нем.
+Сценарии в отчете:
+    search_first_page - от запроса до показа первой страницы зданий
+    search            - от запроса до завершения его обработки
+    pagination        - нажатие "➡️" в списке зданий
+    open_building     - открытие здания из списка
+    open_unit         - открытие объекта здания
+Задержки считаются в отдельном проходе, затем проход под tracemalloc
+замеряет пиковый и оставшийся объем выделенной памяти на сценарий.
+Каждый запрос по умолчанию уникален, поэтому кеш извлечения не
+срабатывает и каждый поиск проходит через модель. Подключение берется
+из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.e2e --sizes 10000 100000 --iterations 50 --output e2e.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from aiogram.methods import EditMessageText
+from psycopg import AsyncConnection
+
+from benchmarks.fakes import FakeLLM, FakeSession, callback_buttons, callback_update, make_search_queries, message_update
+from benchmarks.seed import schema_conninfo, seed_schema
+from benchmarks.synthetic import make_area_names
+from database import close_pool, invalidate_catalog, start_memory_search, stop_memory_search
+from handlers import start_router
+from handlers.start_handler import _pending_requests
+from loader import bot, dp, proj_settings
+from utils import close_openai_client
+
+SCENARIOS = ("search_first_page", "search", "pagination", "open_building", "open_unit")
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Timings:
+    """
+    Задержки сценариев в миллисекундах.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._started = None
+
+    @contextmanager
+    def measure(self, scenario):
+        self._started = time.perf_counter()
+        yield
+        self.mark(scenario)
+
+    def mark(self, scenario):
+        self.samples[scenario].append((time.perf_counter() - self._started) * 1000)
+
+    def report(self):
+        return {scenario: {
+            "count": len(values),
+            "ms_p50": round(statistics.median(values), 3),
+            "ms_p95": round(_percentile(values, 95), 3),
+            "ms_p99": round(_percentile(values, 99), 3),
+            "ms_mean": round(statistics.fmean(values), 3),
+        } for scenario, values in self.samples.items()}
+
+
+class Allocations:
+    """
+    Пиковый и оставшийся после сценария объем памяти в КиБ по данным tracemalloc.
+    """
+
+    def __init__(self):
+        self.peak = defaultdict(list)
+        self.retained = defaultdict(list)
+        self._baseline = 0
+
+    @contextmanager
+    def measure(self, scenario):
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        yield
+        current, _ = tracemalloc.get_traced_memory()
+        self.mark(scenario)
+        self.retained[scenario].append((current - self._baseline) / 1024)
+
+    def mark(self, scenario):
+        self.peak[scenario].append((tracemalloc.get_traced_memory()[1] - self._baseline) / 1024)
+
+    def report(self):
+        reports = {scenario: {
+            "peak_kib_p50": round(statistics.median(values), 1),
+            "peak_kib_p95": round(_percentile(values, 95), 1),
+        } for scenario, values in self.peak.items()}
+        for scenario, values in self.retained.items():
+            reports[scenario]["retained_kib_p50"] = round(statistics.median(values), 1)
+
+        return reports
+
+
+class Flow:
+    """
+    Прохождение сценариев одним пользователем через диспетчер бота.
+    """
+
+    def __init__(self, session, queries, unique_queries):
+        self.session = session
+        self.queries = list(queries)
+        self.unique_queries = unique_queries
+        self._update_ids = itertools.count(1)
+        self._user_ids = itertools.count(1000)
+
+    async def _feed(self, update):
+        await dp.feed_raw_update(bot=bot, update=update)
+
+    async def _click(self, user_id, data, message_id):
+        await self._feed(callback_update(next(self._update_ids), user_id, data, message_id))
+        return self.session.last_requests.get(user_id)
+
+    async def run(self, iteration, recorder):
+        """
+        Один пользователь: /start, запрос, следующая страница, здание, объект.
+
+        Args:
+            iteration: Номер итерации, по нему выбирается запрос
+            recorder: Timings или Allocations
+        """
+        user_id = next(self._user_ids)
+        query = self.queries[iteration % len(self.queries)]
+        if self.unique_queries:
+            query = f"{query}, вариант {user_id}"
+
+        await self._feed(message_update(next(self._update_ids), user_id, "/start"))
+
+        # Первая страница показывается правкой сообщения загрузки с клавиатурой
+        first_page = self.session.wait_for(lambda method: isinstance(method, EditMessageText)
+                                           and method.chat_id == user_id and method.reply_markup is not None)
+        with recorder.measure("search"):
+            await self._feed(message_update(next(self._update_ids), user_id, query))
+            task = _pending_requests[user_id]["task"]
+            await asyncio.wait([first_page, task], return_when=asyncio.FIRST_COMPLETED)
+            if first_page.done():
+                recorder.mark("search_first_page")
+            await task
+        first_page.cancel()
+
+        results = self.session.last_requests.get(user_id)
+        if not callback_buttons(results, "open-wrap:"):
+            return
+        message_id = results.message_id
+
+        if callback_buttons(results, "foreign:next"):
+            with recorder.measure("pagination"):
+                results = await self._click(user_id, "foreign:next", message_id)
+
+        with recorder.measure("open_building"):
+            units = await self._click(user_id, callback_buttons(results, "open-wrap:")[0], message_id)
+
+        units_buttons = callback_buttons(units, "wrap-obj:")
+        if units_buttons:
+            with recorder.measure("open_unit"):
+                await self._click(user_id, units_buttons[0], message_id)
+
+
+async def _prepare_database(connection, args, size):
+    await seed_schema(connection, args.schema, size, max(1, size // args.units_per_building), args.areas)
+
+    invalidate_catalog()
+    if proj_settings.memory_search_enabled:
+        await start_memory_search()
+
+
+async def _run_size(flow, args):
+    for iteration in range(args.warmup):
+        await flow.run(iteration, Timings())
+
+    timings = Timings()
+    started = time.perf_counter()
+    for iteration in range(args.iterations):
+        await flow.run(iteration, timings)
+    elapsed = time.perf_counter() - started
+
+    allocations = Allocations()
+    tracemalloc.start()
+    try:
+        for iteration in range(args.alloc_iterations):
+            await flow.run(iteration, allocations)
+    finally:
+        tracemalloc.stop()
+
+    timing_report, allocation_report = timings.report(), allocations.report()
+    return {
+        "iterations": args.iterations,
+        "seconds": round(elapsed, 2),
+        "scenarios": {scenario: {**timing_report.get(scenario, {}), **allocation_report.get(scenario, {})}
+                      for scenario in SCENARIOS if scenario in timing_report or scenario in allocation_report},
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Количества объектов")
+    parser.add_argument("--units-per-building", type=int, default=50)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=50, help="Пользователей в проходе замера задержек")
+    parser.add_argument("--alloc-iterations", type=int, default=10, help="Пользователей в проходе под tracemalloc")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="Задержка ответа поддельной модели, мс")
+    parser.add_argument("--memory-search", action="store_true", help="Искать в снимке в памяти")
+    parser.add_argument("--rule-extractor", action="store_true", help="Извлекать критерии правилами до модели")
+    parser.add_argument("--extraction-cache", action="store_true",
+                        help="Повторять одни и те же запросы, чтобы срабатывал кеш извлечения")
+    parser.add_argument("--llm-port", type=int, default=18082)
+    parser.add_argument("--schema", default="bench_e2e")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после замеров")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    # Подробные логи обработчиков искажали бы замеры
+    logging.disable(logging.INFO)
+
+    # Пул соединений бота читает настройки libpq из окружения, так запросы идут в схему бенчмарка
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema},public"
+    proj_settings.request_debounce = 0
+    proj_settings.debug_mode = False
+    proj_settings.memory_search_enabled = args.memory_search
+    proj_settings.rule_extractor_enabled = args.rule_extractor
+
+    queries = make_search_queries(make_area_names(args.areas))
+    llm = FakeLLM(queries, latency_ms=args.llm_ms)
+    proj_settings.openai_base_url = await llm.start(args.llm_port)
+
+    session = FakeSession()
+    bot.session = session
+    dp.include_router(start_router)
+    flow = Flow(session, queries, unique_queries=not args.extraction_cache)
+
+    reports = []
+    try:
+        async with await AsyncConnection.connect(schema_conninfo(args.schema), autocommit=True) as connection:
+            try:
+                for size in args.sizes:
+                    await _prepare_database(connection, args, size)
+                    try:
+                        report = await _run_size(flow, args)
+                    finally:
+                        await stop_memory_search()
+                        await close_pool()
+                    reports.append({"units": size, **report})
+                    print(json.dumps(reports[-1], ensure_ascii=False, indent=2))
+            finally:
+                if not args.keep:
+                    await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+    finally:
+        await close_openai_client()
+        await llm.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "settings": {key: value for key, value in vars(args).items() if key != "output"},
+                "llm_requests": llm.requests,
+                "bot_api_requests": session.requests,
+                "results": reports,
+            }, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
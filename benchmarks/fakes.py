@@ -0,0 +1,219 @@
+"""
+Поддельные Bot API и OpenAI-совместимый API для бенчмарков, которые
+прогоняют настоящие обработчики бота без сети и без модели.
+"""
+import asyncio
+import itertools
+import json
+import time
+from datetime import datetime
+
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText, SendMessage
+from aiohttp import web
+
+# Ответ модели без вызова функции: критериев в запросе недостаточно
+CLARIFICATION = "Уточните, пожалуйста, количество спален и бюджет"
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия Bot API без сети: на отправку и правку сообщений отвечает так же,
+    как Telegram, остальные методы возвращают True. Последний запрос в каждый
+    чат сохраняется, а запроса, подходящего под условие, можно дождаться.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+        self.last_requests = {}
+        self._message_ids = itertools.count(1)
+        self._waiters = []
+
+    def wait_for(self, predicate):
+        """
+        Ожидание запроса к Bot API, подходящего под условие.
+
+        Args:
+            predicate: Функция, которая получает метод Bot API и возвращает True для нужного запроса
+
+        Returns:
+            asyncio.Future: Будущий результат - подошедший метод
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((predicate, future))
+        return future
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            self.last_requests[chat_id] = method
+
+        # Отмененные ожидания удаляются вместе с выполненными
+        for waiter in [waiter for waiter in self._waiters if waiter[1].done() or waiter[0](method)]:
+            self._waiters.remove(waiter)
+            if not waiter[1].done():
+                waiter[1].set_result(method)
+
+        if isinstance(method, SendMessage):
+            message_id = next(self._message_ids)
+        elif isinstance(method, (EditMessageText, EditMessageReplyMarkup)):
+            message_id = method.message_id
+        else:
+            return True
+
+        markup = method.reply_markup if isinstance(method.reply_markup, types.InlineKeyboardMarkup) else None
+        return types.Message(message_id=message_id, date=datetime.now(), text=getattr(method, "text", None),
+                             chat=types.Chat(id=chat_id, type="private"), reply_markup=markup).as_(bot)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def message_update(update_id, user_id, text):
+    """
+    Обновление с текстовым сообщением пользователя в виде словаря.
+    """
+    user = {"id": user_id, "is_bot": False, "first_name": "user"}
+    return {"update_id": update_id, "message": {"message_id": update_id, "date": 0, "text": text, "from": user,
+                                                "chat": {"id": user_id, "type": "private"}}}
+
+
+def callback_update(update_id, user_id, data, message_id):
+    """
+    Обновление с нажатием inline-кнопки под сообщением бота в виде словаря.
+    """
+    user = {"id": user_id, "is_bot": False, "first_name": "user"}
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": user, "chat_instance": "bench", "data": data,
+        "message": {"message_id": message_id, "date": 0, "text": "", "chat": {"id": user_id, "type": "private"}},
+    }}
+
+
+def callback_buttons(method, prefix):
+    """
+    Данные кнопок клавиатуры запроса к Bot API, начинающиеся с префикса.
+
+    Args:
+        method: Метод Bot API с reply_markup
+        prefix: Префикс callback_data, например "open-wrap:"
+
+    Returns:
+        list: Значения callback_data в порядке кнопок
+    """
+    markup = getattr(method, "reply_markup", None)
+    if not isinstance(markup, types.InlineKeyboardMarkup):
+        return []
+
+    return [button.callback_data for row in markup.inline_keyboard for button in row
+            if button.callback_data and button.callback_data.startswith(prefix)]
+
+
+def make_search_queries(area_names):
+    """
+    Запросы пользователей и аргументы database_search, которые вернула бы на них модель.
+
+    Args:
+        area_names: Названия районов в синтетических данных
+
+    Returns:
+        dict: Текст запроса -> аргументы вызова функции
+    """
+    area = area_names[0]
+    return {
+        "Апартаменты с двумя спальнями от 1 до 3 млн": {
+            "purpose": "For Sale", "type": "Apartment", "bedroom_count": 2,
+            "min_price": 1000000, "max_price": 3000000,
+        },
+        f"Вилла в районе {area} с четырьмя спальнями до 10 млн": {
+            "type": "Villa", "bedroom_count": 4, "min_price": 0, "max_price": 10000000, "area": area,
+        },
+        "Таунхаус с тремя спальнями в аренду до 2 млн": {
+            "purpose": "For Rent", "type": "Townhouse", "bedroom_count": 3, "min_price": 0, "max_price": 2000000,
+        },
+        "Пентхаус с видом на море, три спальни, от 5 до 15 млн": {
+            "type": "Penthouse", "bedroom_count": 3, "view": "Sea View", "min_price": 5000000, "max_price": 15000000,
+        },
+    }
+
+
+class FakeLLM:
+    """
+    Поддельный OpenAI-совместимый API chat.completions.
+
+    Если в новом сообщении пользователя есть один из известных запросов,
+    отвечает вызовом database_search с заготовленными аргументами, иначе -
+    уточняющим вопросом через ask_user.
+
+    Args:
+        responses: Текст запроса -> аргументы вызова функции
+        latency_ms: Задержка ответа, имитирующая время работы модели
+    """
+
+    def __init__(self, responses, latency_ms=0.0):
+        self.responses = responses
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self._runner = None
+
+    async def handle(self, request):
+        body = await request.json()
+        self.requests += 1
+        prompt = body["messages"][-1]["content"]
+        tools = {tool["function"]["name"] for tool in body.get("tools", [])}
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        # Длинные запросы проверяются первыми: уточнение содержит текст исходного запроса
+        arguments = next((self.responses[query] for query in sorted(self.responses, key=len, reverse=True)
+                          if query in prompt), None)
+        if arguments is not None:
+            name = "database_search"
+        elif "ask_user" in tools:
+            name, arguments = "ask_user", {"question": CLARIFICATION, "known": {}}
+        else:
+            name = None
+
+        if name is None:
+            message, finish_reason = {"role": "assistant", "content": CLARIFICATION}, "stop"
+        else:
+            message, finish_reason = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{self.requests}", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }]}, "tool_calls"
+
+        return web.json_response({
+            "id": f"chatcmpl-{self.requests}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        })
+
+    async def start(self, port):
+        """
+        Запуск сервера на localhost.
+
+        Args:
+            port: Порт сервера
+
+        Returns:
+            str: Базовый URL для OPENAI_BASE_URL
+        """
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle)
+        # Список моделей запрашивает прогрев клиента при запуске бота
+        app.router.add_get("/v1/models", lambda request: web.json_response({"object": "list", "data": []}))
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+
+        return f"http://127.0.0.1:{port}/v1"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
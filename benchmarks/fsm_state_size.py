@@ -0,0 +1,178 @@
+"""
+Размер данных состояния одного пользователя до и после перехода на компактное состояние.
+
+"До" - состояние в том виде, в котором его сохранял исходный обработчик:
+все найденные объекты по зданиям, UUID на каждое здание, разбиение на
+страницы и копия объектов открытого здания. "После" - критерии поиска,
+ключи текущих страниц и идентификаторы объектов на странице.
+
+Состояния записываются в хранилище с протоколом Redis: по умолчанию в
+fakeredis в памяти процесса, с --redis-url - в настоящий сервер.
+
+Запуск из корня проекта:
+    python -m benchmarks.fsm_state_size --units 50 200 1000
+    python -m benchmarks.fsm_state_size --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import Redis
+
+from benchmarks.synthetic import make_area_names, make_building_names
+from database import Unit
+from fsm_redis_storage import MsgpackRedisStorage, pack_data
+from handlers.start_handler import _set_buildings_page, _set_wrap_page
+from utils import PAGE_SIZE, organize_by_building
+
+CRITERIA = {
+    "purpose": "For Sale", "beds": 2, "property_type": "Apartment", "area": None, "building": None, "view": None,
+    "price_min": 1000000, "price_max": 3000000, "baths": 0, "sqft_min": 0, "sqft_max": 0, "furnishing": None,
+    "completion": None, "vacant": None, "handover_date": None,
+}
+
+
+def _make_units(count, buildings_count, seed):
+    rng = random.Random(seed)
+    buildings = make_building_names(buildings_count)
+    areas = make_area_names(10)
+
+    return sorted((Unit(
+        id=100000 + index,
+        price=Decimal(rng.randrange(1000000, 3000000, 1000)).quantize(Decimal("0.01")),
+        type_unit="Apartment",
+        purpose="For Sale",
+        completion=rng.choice(["Ready", "Off-Plan"]),
+        handover_date=date(2025, 1, 1) + timedelta(days=rng.randrange(1500)),
+        furnishing=rng.choice(["Furnished", "Unfurnished"]),
+        studio="",
+        sqft=Decimal(rng.randrange(60000, 250000)) / 100,
+        baths=rng.randint(1, 3),
+        beds=2,
+        view=rng.choice(["Sea View", "City View", ""]),
+        vacant=rng.choice(["Vacant", "Rented"]),
+        agent_name=f"Agent {rng.randint(1, 50)}",
+        agent_whatsapp=f"+9715{rng.randint(0, 99999999):08d}",
+        building=rng.choice(buildings),
+        area=rng.choice(areas),
+    ) for index in range(count)), key=lambda unit: unit.price)
+
+
+def _original_state(units, message_text):
+    # Повторяет состояние исходного get_user_request и open_wrap_list: объекты - словари с ключами
+    results = {name: [unit._asdict() for unit in rows] for name, rows in organize_by_building(units).items()}
+    names = list(results)
+    names_uuid_dict = dict(zip(names, [str(uuid4()) for _ in names]))
+    state = {
+        "user_request": "апартаменты с двумя спальнями от 1 до 3 млн",
+        "index": 0,
+        "names_uuid_dict": names_uuid_dict,
+        "result": {"status": "success", "message": message_text,
+                   "results": {names_uuid_dict[name]: rows for name, rows in results.items()}},
+        "message_text": message_text,
+        "objects_names_list_chunks": [names[i:i + PAGE_SIZE] for i in range(0, len(names), PAGE_SIZE)],
+    }
+
+    opened = results[names[0]]
+    state["wrap_object_name"] = names_uuid_dict[names[0]]
+    state["wrap_index"] = 0
+    state["wrap_result"] = {row["id"]: row for row in opened}
+    state["wrap_types_list"] = [f"{row['type_unit']}: {row['id']}" for row in opened]
+    state["wrap_types_ids_list"] = {f"{row['type_unit']}: {row['id']}": row["id"] for row in opened}
+    state["wrap_types_list_chunks"] = [state["wrap_types_list"][i:i + PAGE_SIZE]
+                                       for i in range(0, len(opened), PAGE_SIZE)]
+
+    return state
+
+
+def _page_state(keys):
+    return {"index": 0, "first_key": [str(keys[0][0]), keys[0][1]], "last_key": [str(keys[-1][0]), keys[-1][1]]}
+
+
+def _compact_state(units, message_text):
+    # Повторяет состояние текущего get_user_request и open_wrap_list
+    results = organize_by_building(units)
+    names = list(results)[:PAGE_SIZE]
+    opened = results[names[0]][:PAGE_SIZE]
+    state = {
+        "user_request": "апартаменты с двумя спальнями от 1 до 3 млн",
+        "search": {"criteria": {key: value for key, value in CRITERIA.items() if value is not None and value != ""},
+                   "tier": 0},
+        "total_buildings": len(results),
+        "message_text": message_text,
+        "buildings_page": _page_state([(results[name][0].price, name) for name in names]),
+        "wrap_object_name": names[0],
+        "wrap_total": len(results[names[0]]),
+        "wrap_page": _page_state([(unit.price, unit.id) for unit in opened]),
+    }
+    state["buildings_page"]["units"] = [len(results[name]) for name in names]
+    _set_buildings_page(state, names)
+    _set_wrap_page(state, opened)
+
+    return state
+
+
+async def _stored_size(storage, key, data):
+    await storage.set_data(key, data)
+    stored = await storage.redis.strlen(storage.key_builder.build(key, "data"))
+    await storage.set_data(key, {})
+
+    return stored
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, nargs="+", default=[50, 200, 1000], help="Найдено объектов")
+    parser.add_argument("--redis-url", help="Сервер Redis; по умолчанию fakeredis")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        redis = Redis.from_url(args.redis_url)
+    else:
+        from fakeredis import FakeAsyncRedis
+        redis = FakeAsyncRedis()
+
+    json_storage = RedisStorage(redis, json_dumps=lambda data: json.dumps(data, ensure_ascii=False, default=str))
+    msgpack_storage = MsgpackRedisStorage(redis)
+    key = StorageKey(bot_id=1, chat_id=1, user_id=1)
+
+    reports = []
+    for count in args.units:
+        units = _make_units(count, max(count // 5, 1), seed=count)
+        message_text = f"Найдено {count} объектов по вашему запросу"
+        original = _original_state(units, message_text)
+        compact = _compact_state(units, message_text)
+
+        # Компактное состояние должно без потерь проходить через хранилище
+        await msgpack_storage.set_data(key, compact)
+        assert await msgpack_storage.get_data(key) == compact
+        assert len(pack_data(compact)) == await _stored_size(msgpack_storage, key, compact)
+
+        reports.append({
+            "units": count,
+            "original_json_bytes": await _stored_size(json_storage, key, original),
+            "compact_json_bytes": await _stored_size(json_storage, key, compact),
+            "compact_msgpack_bytes": await _stored_size(msgpack_storage, key, compact),
+        })
+
+    await redis.aclose()
+
+    for report in reports:
+        print(f"Объектов: {report['units']:>5}  до: {report['original_json_bytes']:>8} Б  "
+              f"после (JSON): {report['compact_json_bytes']:>5} Б  "
+              f"после (MessagePack): {report['compact_msgpack_bytes']:>5} Б")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,320 @@
+"""
+Нагрузочный тест: множество виртуальных пользователей в одном процессе бота.
+
+Диспетчер настраивается так же, как в main.py (setup_dispatcher), Bot API
+заменен сессией без сети, модель - локальным OpenAI-совместимым сервером
+с заданной задержкой, поиск идет по схеме с синтетическими объявлениями.
+Пользователи подключаются равномерно в течение --ramp-up секунд и проходят
+весь сценарий с паузами на размышление между действиями: /start, запрос
+(часть пользователей сначала пишет расплывчатый запрос и уточняет его
+следующим сообщением), "➡️" в списке зданий, открытие здания и объекта,
+возврат к списку объектов и к списку зданий.
+
+В отчете - пропускная способность в обновлениях и сценариях в секунду,
+перцентили длительности каждого обработчика и полного поиска (от
+сообщения до ответа, включая ожидание REQUEST_DEBOUNCE), задержка цикла
+событий, рост хранилища состояний FSM и пиковая память процесса.
+С --output в JSON сохраняется также динамика по времени.
+Подключение к базе берется из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.load --users 2000 --ramp-up 60 --think 1 5 --llm-ms 800
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import time
+from collections import defaultdict
+
+from aiogram import BaseMiddleware
+from psycopg import AsyncConnection
+
+from benchmarks.fakes import FakeLLM, FakeSession, callback_buttons, callback_update, make_search_queries, message_update
+from benchmarks.seed import schema_conninfo, seed_schema
+from benchmarks.synthetic import make_area_names
+from handlers import start_router
+from handlers.start_handler import _pending_requests
+from loader import bot, proj_settings
+from main import setup_dispatcher
+from rate_limiter import RateLimitMiddleware
+
+# Расплывчатый запрос, на который модель отвечает уточняющим вопросом
+VAGUE_QUERY = "Хочу купить квартиру"
+
+# Интервал, с которым проверяется задержка цикла событий, секунд
+LAG_INTERVAL = 0.05
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+
+    def percentile(percent):
+        return round(values[min(len(values) - 1, int(len(values) * percent / 100))], 3)
+
+    return {"count": len(values), "ms_p50": percentile(50), "ms_p95": percentile(95), "ms_p99": percentile(99),
+            "ms_max": round(values[-1], 3)}
+
+
+def _storage_stats(storage):
+    # Хранилища без счетчиков (Redis) в отчет не попадают
+    return storage.stats() if hasattr(storage, "stats") else {}
+
+
+class HandlerTimings(BaseMiddleware):
+    """
+    Длительность обработчиков роутера по имени обработчика, в миллисекундах.
+    """
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[data["handler"].callback.__name__].append((time.perf_counter() - started) * 1000)
+
+
+class LoadStats:
+    """
+    Счетчики нагрузочного теста и динамика по времени.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.loop_lag = []
+        self.timeline = []
+        self.updates = 0
+        self.flows = 0
+        self.errors = 0
+        self.active_users = 0
+
+
+class VirtualUsers:
+    """
+    Виртуальные пользователи, которые проходят сценарий бота через диспетчер.
+    """
+
+    def __init__(self, dispatcher, session, queries, stats, args):
+        self.dispatcher = dispatcher
+        self.session = session
+        self.queries = list(queries)
+        self.stats = stats
+        self.args = args
+        self._update_ids = itertools.count(1)
+
+    async def _feed(self, update):
+        self.stats.updates += 1
+        await self.dispatcher.feed_raw_update(bot=bot, update=update)
+
+    async def _think(self, rng):
+        await asyncio.sleep(rng.uniform(*self.args.think))
+
+    async def _send(self, user_id, text):
+        started = time.perf_counter()
+        await self._feed(message_update(next(self._update_ids), user_id, text))
+        pending = _pending_requests.get(user_id)
+        if pending is not None:
+            await pending["task"]
+        self.stats.samples["search"].append((time.perf_counter() - started) * 1000)
+
+        return self.session.last_requests.get(user_id)
+
+    async def _click(self, user_id, rng, message, prefix):
+        buttons = callback_buttons(message, prefix)
+        if not buttons:
+            return None
+
+        await self._think(rng)
+        await self._feed(callback_update(next(self._update_ids), user_id, rng.choice(buttons), message.message_id))
+        return self.session.last_requests.get(user_id)
+
+    async def _flow(self, user_id, rng):
+        await self._feed(message_update(next(self._update_ids), user_id, "/start"))
+        await self._think(rng)
+
+        query = rng.choice(self.queries)
+        if not self.args.extraction_cache:
+            query = f"{query}, вариант {user_id}"
+        if rng.random() < self.args.clarify:
+            await self._send(user_id, VAGUE_QUERY)
+            await self._think(rng)
+        results = await self._send(user_id, query)
+
+        results = await self._click(user_id, rng, results, "foreign:next") or results
+        units = await self._click(user_id, rng, results, "open-wrap:")
+        if units is None:
+            return
+        unit = await self._click(user_id, rng, units, "wrap-obj:")
+        if unit is not None:
+            await self._click(user_id, rng, unit, "go-back:wrap")
+        await self._click(user_id, rng, units, "go-back:foreign")
+
+    async def run(self, user_id):
+        """
+        Подключение пользователя со случайной задержкой в пределах --ramp-up и прохождение сценария.
+
+        Args:
+            user_id: Идентификатор виртуального пользователя
+        """
+        rng = random.Random(user_id)
+        await asyncio.sleep(rng.uniform(0, self.args.ramp_up))
+
+        self.stats.active_users += 1
+        try:
+            for _ in range(self.args.rounds):
+                await self._flow(user_id, rng)
+                self.stats.flows += 1
+        except Exception as e:
+            self.stats.errors += 1
+            logging.getLogger(__name__).error(f"Ошибка виртуального пользователя {user_id}: {e!r}")
+        finally:
+            self.stats.active_users -= 1
+
+
+async def _monitor(stats, storage, sample_interval):
+    loop = asyncio.get_running_loop()
+    started = last_sample = loop.time()
+    interval_lag = 0.0
+    while True:
+        before = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag = (loop.time() - before - LAG_INTERVAL) * 1000
+        stats.loop_lag.append(lag)
+        interval_lag = max(interval_lag, lag)
+
+        if loop.time() - last_sample >= sample_interval:
+            last_sample = loop.time()
+            storage_stats = _storage_stats(storage)
+            stats.timeline.append({
+                "second": round(last_sample - started, 1),
+                "active_users": stats.active_users,
+                "updates": stats.updates,
+                "flows": stats.flows,
+                "loop_lag_ms_max": round(interval_lag, 3),
+                "fsm_sessions": storage_stats.get("sessions"),
+                "fsm_bytes": storage_stats.get("bytes"),
+            })
+            interval_lag = 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Виртуальных пользователей")
+    parser.add_argument("--rounds", type=int, default=1, help="Сколько раз каждый пользователь проходит сценарий")
+    parser.add_argument("--ramp-up", type=float, default=30.0, help="За сколько секунд подключаются все пользователи")
+    parser.add_argument("--think", type=float, nargs=2, default=[1.0, 5.0], metavar=("MIN", "MAX"),
+                        help="Пауза пользователя между действиями, секунд")
+    parser.add_argument("--clarify", type=float, default=0.3,
+                        help="Доля пользователей, которые уточняют запрос вторым сообщением")
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="Задержка ответа поддельной модели, мс")
+    parser.add_argument("--debounce", type=float, help="REQUEST_DEBOUNCE вместо значения из настроек")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Ограничивать запросы к Bot API так же, как при TELEGRAM_RATE_LIMIT=True")
+    parser.add_argument("--memory-search", action="store_true", help="Искать в снимке в памяти")
+    parser.add_argument("--rule-extractor", action="store_true", help="Извлекать критерии правилами до модели")
+    parser.add_argument("--extraction-cache", action="store_true",
+                        help="Повторять одни и те же запросы, чтобы срабатывал кеш извлечения")
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--buildings", type=int, default=2000)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Интервал записи динамики, секунд")
+    parser.add_argument("--llm-port", type=int, default=18083)
+    parser.add_argument("--schema", default="bench_load")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после теста")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    # Пул соединений бота читает настройки libpq из окружения, так запросы идут в схему бенчмарка
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema},public"
+    proj_settings.debug_mode = False
+    proj_settings.memory_search_enabled = args.memory_search
+    proj_settings.rule_extractor_enabled = args.rule_extractor
+    if args.debounce is not None:
+        proj_settings.request_debounce = args.debounce
+
+    queries = make_search_queries(make_area_names(args.areas))
+    llm = FakeLLM(queries, latency_ms=args.llm_ms)
+    proj_settings.openai_base_url = await llm.start(args.llm_port)
+
+    session = FakeSession()
+    if args.rate_limit:
+        session.middleware(RateLimitMiddleware(
+            global_rate=proj_settings.telegram_global_rate,
+            chat_rate=proj_settings.telegram_chat_rate,
+            chat_burst=proj_settings.telegram_chat_burst,
+            max_retries=proj_settings.telegram_max_retries,
+        ))
+    bot.session = session
+    _, dispatcher = setup_dispatcher()
+
+    stats = LoadStats()
+    start_router.message.middleware(HandlerTimings(stats.samples))
+    start_router.callback_query.middleware(HandlerTimings(stats.samples))
+    users = VirtualUsers(dispatcher, session, queries, stats, args)
+
+    async with await AsyncConnection.connect(schema_conninfo(args.schema), autocommit=True) as connection:
+        await seed_schema(connection, args.schema, args.units, args.buildings, args.areas)
+        try:
+            await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher, **dispatcher.workflow_data)
+            storage_before = _storage_stats(dispatcher.storage)
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            monitor = asyncio.create_task(_monitor(stats, dispatcher.storage, args.sample_interval))
+            started = time.perf_counter()
+            await asyncio.gather(*(users.run(user_id) for user_id in range(1, args.users + 1)))
+            elapsed = time.perf_counter() - started
+            monitor.cancel()
+
+            storage_after = _storage_stats(dispatcher.storage)
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        finally:
+            await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher, **dispatcher.workflow_data)
+            await llm.stop()
+            if not args.keep:
+                await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+
+    fsm_bytes = [sample["fsm_bytes"] for sample in stats.timeline if sample["fsm_bytes"] is not None]
+    summary = {
+        "users": args.users,
+        "seconds": round(elapsed, 2),
+        "updates": stats.updates,
+        "updates_per_second": round(stats.updates / elapsed, 1),
+        "flows": stats.flows,
+        "flows_per_second": round(stats.flows / elapsed, 2),
+        "errors": stats.errors,
+        "llm_requests": llm.requests,
+        "bot_api_requests": session.requests,
+        "peak_concurrent_users": max((sample["active_users"] for sample in stats.timeline), default=0),
+        "loop_lag": _percentiles(stats.loop_lag),
+        "fsm_before": storage_before,
+        "fsm_after": storage_after,
+        "fsm_bytes_peak": max(fsm_bytes, default=None),
+        # ru_maxrss в Linux - в килобайтах
+        "max_rss_mib_before": round(rss_before / 1024, 1),
+        "max_rss_mib_after": round(rss_after / 1024, 1),
+    }
+    handlers = {name: _percentiles(values) for name, values in sorted(stats.samples.items())}
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    for name, report in handlers.items():
+        print(f"{name:<28} {json.dumps(report)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"settings": vars(args), "summary": summary, "handlers": handlers, "timeline": stats.timeline},
+                      file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
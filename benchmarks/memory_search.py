@@ -0,0 +1,183 @@
+"""
+Сравнение поиска в снимке в памяти с поиском через PostgreSQL.
+
+Скрипт заполняет отдельную схему синтетическими объявлениями, применяет
+миграции, загружает снимок и для случайных критериев сравнивает
+результаты и время обоих путей: подсчет с выбором уровня, первую
+страницу зданий (вместе с порядком зданий с одинаковой минимальной
+ценой) и первую страницу объектов здания. Часть объектов остается без
+здания. В конце замеряется
+инкрементальное обновление снимка после изменения части объектов и
+одного агента, и обновленный снимок сверяется с загруженным заново.
+Время одного поиска в отчете - сумма всех трех операций.
+Подключение берется из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.memory_search --units 100000 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from psycopg import AsyncConnection
+
+from benchmarks.seed import create_schema, schema_conninfo, seed_listings
+from benchmarks.synthetic import make_area_names, make_criteria
+from database import close_pool, database_handler, memory_search
+from database.migrations import apply_migrations
+
+
+def _units(snapshot):
+    return {unit_id: snapshot.rows[position] for unit_id, position in snapshot.positions.items()}
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    if asyncio.iscoroutine(result):
+        result = await result
+
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def _compare(snapshot, criteria):
+    timings = {"sql": 0.0, "memory": 0.0}
+
+    sql_count, elapsed = await _timed(database_handler.count_search_results, criteria)
+    timings["sql"] += elapsed
+    memory_count, elapsed = await _timed(snapshot.count_search_results, criteria)
+    timings["memory"] += elapsed
+
+    mismatches = [] if sql_count == memory_count else [f"count {sql_count} != {memory_count}"]
+    tier = sql_count[0]
+    if tier is None:
+        return timings, mismatches
+
+    sql_buildings, elapsed = await _timed(database_handler.search_buildings_page, criteria, tier, 5)
+    timings["sql"] += elapsed
+    memory_buildings, elapsed = await _timed(snapshot.buildings_page, criteria, tier, 5)
+    timings["memory"] += elapsed
+
+    # Цены округлены до тысяч, поэтому на страницах много зданий с одинаковой минимальной ценой,
+    # и порядок таких зданий должен совпадать так же, как и сами сводки
+    if sql_buildings != memory_buildings:
+        mismatches.append("buildings page")
+
+    # Следующая страница по ключу последнего здания, как при нажатии "➡️"
+    if sql_buildings:
+        key = [str(sql_buildings[-1]["min_price"]), sql_buildings[-1]["building"]]
+        if (await database_handler.search_buildings_page(criteria, tier, 5, after=key)
+                != snapshot.buildings_page(criteria, tier, 5, after=key)):
+            mismatches.append("next buildings page")
+
+    building = sql_buildings[0]["building"]
+    sql_units, elapsed = await _timed(database_handler.search_units_page, criteria, tier, building, 5)
+    timings["sql"] += elapsed
+    memory_units, elapsed = await _timed(snapshot.units_page, criteria, tier, building, 5)
+    timings["memory"] += elapsed
+
+    if sql_units != memory_units:
+        mismatches.append("units page")
+
+    return timings, mismatches
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--buildings", type=int, default=2000)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--no-building-every", type=int, default=50, help="Каждый N-й объект - без здания")
+    parser.add_argument("--changed", type=float, default=0.01, help="Доля объектов, изменяемых перед обновлением")
+    parser.add_argument("--schema", default="bench_memory")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после замеров")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    conninfo = schema_conninfo(args.schema)
+    # Пул соединений бота читает настройки libpq из окружения, так запросы идут в схему бенчмарка
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema},public"
+
+    async with await AsyncConnection.connect(conninfo, autocommit=True) as connection:
+        await create_schema(connection, args.schema)
+        try:
+            await seed_listings(connection, args.units, args.buildings, args.areas)
+            # Часть объектов без здания: в обоих путях они группируются под пустым названием
+            await connection.execute('UPDATE "Units" SET building_id = NULL WHERE id %% %s = 0', [args.no_building_every])
+            await apply_migrations(conninfo)
+            # Объявления считаются измененными в течение прошлого месяца, иначе все они попадут в окно REFRESH_OVERLAP
+            await connection.execute('ALTER TABLE "Units" DISABLE TRIGGER units_set_updated_at')
+            await connection.execute(
+                "UPDATE \"Units\" SET updated_at = now() - interval '1 hour' - random() * interval '30 days'"
+            )
+            await connection.execute('ALTER TABLE "Units" ENABLE TRIGGER units_set_updated_at')
+            await connection.execute("ANALYZE")
+
+            snapshot, load_ms = await _timed(memory_search.load_snapshot)
+
+            rng = random.Random(7)
+            area_names = make_area_names(args.areas)
+            sql_ms, memory_ms, mismatched = [], [], []
+            for _ in range(args.queries):
+                criteria = make_criteria(rng, area_names)
+                timings, mismatches = await _compare(snapshot, criteria)
+                sql_ms.append(timings["sql"])
+                memory_ms.append(timings["memory"])
+                if mismatches:
+                    mismatched.append({"criteria": criteria, "mismatches": mismatches})
+
+            await connection.execute(
+                "UPDATE \"Units\" SET price = price + 1000,"
+                " post_status = CASE WHEN id %% 10 = 0 THEN 'archived' ELSE 'published' END"
+                " WHERE random() < %s",
+                [args.changed],
+            )
+            # Имя и WhatsApp агента хранятся в каждом его объекте снимка
+            await connection.execute(
+                "UPDATE \"Agents\" SET name = name || ' (updated)', whatsapp = '+971500000000'"
+                " WHERE id = (SELECT min(agent_id) FROM \"Units\" WHERE post_status != 'archived')"
+            )
+            memory_search._snapshot = snapshot
+            _, refresh_ms = await _timed(memory_search.refresh_snapshot)
+            refreshed_units = _units(memory_search._snapshot)
+            reloaded = await memory_search.load_snapshot()
+        finally:
+            await close_pool()
+            if not args.keep:
+                await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+
+    report = {
+        "units": args.units,
+        "snapshot_units": snapshot.size,
+        "snapshot_load_ms": round(load_ms, 1),
+        "queries": args.queries,
+        "sql_ms_p50": round(statistics.median(sql_ms), 3),
+        "sql_ms_p95": round(_percentile(sql_ms, 95), 3),
+        "memory_ms_p50": round(statistics.median(memory_ms), 3),
+        "memory_ms_p95": round(_percentile(memory_ms, 95), 3),
+        "mismatched_queries": len(mismatched),
+        "incremental_refresh_ms": round(refresh_ms, 1),
+        "refresh_matches_reload": refreshed_units == _units(reloaded),
+    }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    for item in mismatched[:10]:
+        print(f"Расхождение: {item}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"summary": report, "mismatched": mismatched}, file, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+"""
+Размер промпта и задержка по ходам диалога с уточняющими вопросами.
+
+"До" - промпт в том виде, в котором его строил исходный build_messages:
+одно сообщение, в котором инструкции и справочники перемежаются с запросом,
+а на каждом ходе в запрос заново попадает весь текст диалога. "После" -
+неизменные инструкции и справочники в начале и только новое сообщение
+вместе с критериями и вопросом прошлого хода в конце.
+
+Для каждого хода считаются токены промпта, включая схему функций, и
+токены общего начала с предыдущим запросом к модели - ту часть, которую
+провайдер может взять из кеша промптов. Часть ходов упоминает районы и
+здания из справочника, поэтому замер идет и с отбором кандидатов
+(CANDIDATES_ENABLED), и без него: с отбором в промпт попадает только
+короткий список похожих названий, и общим началом остаются инструкции со
+схемой функций (stable_prefix_tokens). Без --llm критерии и вопросы
+прошлых ходов берутся из заготовленных диалогов. С --llm замеряется
+задержка настоящего вызова модели, и из ответа берутся prompt_tokens и
+cached_tokens (используются OPENAI_* из .env, в том числе OPENAI_BASE_URL).
+
+Запуск из корня проекта:
+    python -m benchmarks.multi_turn --buildings 1000
+    python -m benchmarks.multi_turn --buildings 1000 --llm --repeat 3
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.prompt_size import _count_tokens
+from benchmarks.synthetic import make_area_names, make_building_names
+from database import build_catalog
+from utils.candidates import select_catalog_candidates
+from loader import proj_settings
+from utils.gpt_handler import SYSTEM_PROMPT, TOOLS, _create_completion, build_messages, close_openai_client
+
+QUESTION = "Уточните, пожалуйста, бюджет и количество спален"
+
+# Ходы диалога: новое сообщение и критерии, которые модель вернула бы в ask_user после него.
+# {area} и {building} заменяются названиями из справочника
+DIALOGS = [
+    [("Хочу купить квартиру в {area}", {"type": "Apartment", "purpose": "For Sale", "area": "{area}"}),
+     ("две спальни", {"type": "Apartment", "purpose": "For Sale", "area": "{area}", "bedroom_count": 2}),
+     ("бюджет от 1 до 3 млн", None)],
+    [("Ищу виллу с видом на море", {"type": "Villa", "view": "Sea View"}),
+     ("4 спальни, до 10 млн, можно в {building}", None)],
+    [("Нужен таунхаус в аренду", {"type": "Townhouse", "purpose": "For Rent"}),
+     ("3 спальни, район {area}", {"type": "Townhouse", "purpose": "For Rent", "bedroom_count": 3, "area": "{area}"}),
+     ("не дороже 2 млн в год", None)],
+]
+
+
+def _fill_dialogs(catalog):
+    names = {"area": catalog.areas[len(catalog.areas) // 2], "building": catalog.buildings[len(catalog.buildings) // 2]}
+    return [[(text.format(**names), {key: value.format(**names) if isinstance(value, str) else value
+                                     for key, value in known.items()} if known else None)
+             for text, known in dialog]
+            for dialog in DIALOGS]
+
+
+def _original_messages(query, areas, buildings):
+    # Исходный build_messages из utils.gpt_handler
+    prompt = f'''Твоя задача - подобрать пользователю по запросу объекты недвижимости.
+    Тебе необходимо определить критерии, по которым пользователь ищет объект недвижимости. Минимальная необходимая информация - количество спален (bedroom_count), минимальная цена (min_price), максимальная цена (max_price) и тип объекта (type).
+    Если пользователь не сообщил какой-то из обязательных критериев, задавай уточняющие вопросы. Определив критерии, вызови функцию database_search с соответствующими аргументами.
+
+
+    Возможные названия зданий:
+    {buildings}
+
+    Возможные названия районов
+    {areas}
+
+    Запрос пользователя:
+    {query}
+    '''
+
+    return [{"role": "user", "content": prompt}]
+
+
+def _request_text(messages):
+    # Текст запроса в том порядке, в котором его видит провайдер: схема функций, затем сообщения
+    return json.dumps(TOOLS, ensure_ascii=False) + "".join(
+        f"<{message['role']}>{message['content']}" for message in messages)
+
+
+def _common_prefix(first, second):
+    length = 0
+    for first_char, second_char in zip(first, second):
+        if first_char != second_char:
+            break
+        length += 1
+
+    return first[:length]
+
+
+async def _call(messages):
+    started = time.perf_counter()
+    completion = await _create_completion(messages)
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    usage = completion.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    return completion, {
+        "llm_ms": latency_ms,
+        "usage_prompt_tokens": usage.prompt_tokens if usage else None,
+        "usage_cached_tokens": getattr(details, "cached_tokens", None) if details else None,
+    }
+
+
+def _known_from(completion, known):
+    message = completion.choices[0].message
+    if not message.tool_calls or message.tool_calls[0].function.name != "ask_user":
+        return known, message.content
+
+    arguments = json.loads(message.tool_calls[0].function.arguments)
+    return {**known, **{key: value for key, value in (arguments.get("known") or {}).items()
+                        if value not in (None, "")}}, arguments.get("question")
+
+
+async def _run(mode, catalog, repeat, use_llm, count_tokens):
+    turns = defaultdict(lambda: defaultdict(list))
+    previous = ""
+
+    for _ in range(repeat):
+        for dialog in _fill_dialogs(catalog):
+            history, known, question = "", {}, None
+            for index, (text, expected_known) in enumerate(dialog):
+                history = f"{history} {text}".strip()
+                if mode == "original":
+                    messages = _original_messages(history, *select_catalog_candidates(catalog, history))
+                else:
+                    messages = build_messages(text, *select_catalog_candidates(catalog, text), known, question)
+
+                request = _request_text(messages)
+                stats = turns[index]
+                stats["prompt_tokens"].append(count_tokens(request))
+                stats["prefix_tokens"].append(count_tokens(_common_prefix(request, previous)))
+                previous = request
+
+                if use_llm:
+                    completion, measured = await _call(messages)
+                    for key, value in measured.items():
+                        if value is not None:
+                            stats[key].append(value)
+                    known, question = _known_from(completion, known)
+                else:
+                    known, question = expected_known or known, QUESTION
+
+    return {f"turn_{index + 1}": {key: round(statistics.median(values), 1) for key, values in stats.items()}
+            for index, stats in sorted(turns.items())}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=int, default=1000, help="Зданий в справочнике")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов каждого диалога")
+    parser.add_argument("--llm", action="store_true")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    catalog = build_catalog(make_area_names(max(args.buildings // 10, 10)), make_building_names(args.buildings))
+    count_tokens = _count_tokens()
+
+    report = {
+        "buildings": args.buildings,
+        "stable_prefix_tokens": count_tokens(_request_text([{"role": "system", "content": SYSTEM_PROMPT}])),
+    }
+    try:
+        for candidates_enabled in (False, True):
+            proj_settings.candidates_enabled = candidates_enabled
+            report[f"candidates_{'on' if candidates_enabled else 'off'}"] = {
+                "original": await _run("original", catalog, args.repeat, args.llm, count_tokens),
+                "incremental": await _run("incremental", catalog, args.repeat, args.llm, count_tokens),
+            }
+    finally:
+        if args.llm:
+            await close_openai_client()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+"""
+Подготовленные канонические запросы поиска против разбора и планирования на каждый вызов.
+
+Скрипт заполняет отдельную схему синтетическими объявлениями и для
+случайных критериев выполняет запросы, которые делает бот при поиске:
+подсчет с выбором уровня, первую страницу зданий и первую страницу
+объектов здания. Каждый запрос выполняется двумя способами:
+    inline   - значения подставлены в текст, сервер разбирает и планирует
+               каждый текст заново (так работали запросы до канонических форм)
+    prepared - EXECUTE запроса, подготовленного на соединении пула один раз
+В отчете - пропускная способность, перцентили времени и время
+планирования из EXPLAIN ANALYZE, а также сколько раз PostgreSQL выбрал
+общий и частный план для каждого подготовленного запроса.
+Подключение берется из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.prepared_queries --units 100000 --queries 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from psycopg import AsyncClientCursor, AsyncConnection
+from psycopg.rows import dict_row
+
+from benchmarks.seed import schema_conninfo, seed_schema
+from benchmarks.synthetic import make_area_names, make_criteria
+from database import close_pool, get_pool
+from database.database_handler import (BUILDINGS_PAGE_STATEMENTS, COUNT_STATEMENT, UNITS_PAGE_STATEMENTS,
+                                       _execute_prepared, _fetch_prepared, buildings_page_query, count_search_query,
+                                       units_page_query)
+from loader import proj_settings
+
+PAGE_SIZE = 5
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def _fetch_inline(statement, params):
+    pool = await get_pool()
+    async with pool.connection() as connection:
+        async with AsyncClientCursor(connection, row_factory=dict_row) as cursor:
+            await cursor.execute(statement.sql, params, prepare=False)
+            return await cursor.fetchall()
+
+
+async def _planning_ms(statement, params, prepared):
+    # Время планирования одного выполнения по EXPLAIN ANALYZE
+    pool = await get_pool()
+    async with pool.connection() as connection:
+        if prepared:
+            await _execute_prepared(connection, statement, params)
+            query, values = "EXPLAIN (ANALYZE, FORMAT JSON) " + statement.execute_sql, statement.values(params)
+        else:
+            query, values = "EXPLAIN (ANALYZE, FORMAT JSON) " + statement.sql, params
+
+        async with AsyncClientCursor(connection) as cursor:
+            await cursor.execute(query, values, prepare=False)
+            return (await cursor.fetchone())[0][0]["Planning Time"]
+
+
+async def _search(fetch, criteria):
+    """
+    Подсчет, первая страница зданий и первая страница объектов первого здания.
+
+    Returns:
+        list: Пары (запрос, параметры), выполненные при поиске
+    """
+    executed = []
+
+    _, params = count_search_query(criteria)
+    executed.append((COUNT_STATEMENT, params))
+    counted = await fetch(COUNT_STATEMENT, params)
+    if not counted:
+        return executed
+
+    tier = counted[0]["tier"]
+    _, params, reverse = buildings_page_query(criteria, tier, PAGE_SIZE)
+    executed.append((BUILDINGS_PAGE_STATEMENTS[reverse], params))
+    buildings = await fetch(BUILDINGS_PAGE_STATEMENTS[reverse], params)
+
+    _, params, reverse = units_page_query(criteria, tier, buildings[0]["building"], PAGE_SIZE)
+    executed.append((UNITS_PAGE_STATEMENTS[reverse], params))
+    await fetch(UNITS_PAGE_STATEMENTS[reverse], params)
+
+    return executed
+
+
+async def _measure(fetch, criteria_list):
+    timings, executed = [], []
+    started = time.perf_counter()
+    for criteria in criteria_list:
+        search_started = time.perf_counter()
+        executed.extend(await _search(fetch, criteria))
+        timings.append((time.perf_counter() - search_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "searches_per_second": round(len(criteria_list) / elapsed, 1),
+        "queries_per_second": round(len(executed) / elapsed, 1),
+        "search_ms_p50": round(statistics.median(timings), 3),
+        "search_ms_p95": round(_percentile(timings, 95), 3),
+    }, executed
+
+
+async def _prepared_plans():
+    pool = await get_pool()
+    async with pool.connection() as connection:
+        async with connection.cursor(row_factory=dict_row) as cursor:
+            await cursor.execute("SELECT name, generic_plans, custom_plans FROM pg_prepared_statements"
+                                 " WHERE name LIKE 'bot\\_%' ORDER BY name")
+            return await cursor.fetchall()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--buildings", type=int, default=2000)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=300, help="Поисков со случайными критериями")
+    parser.add_argument("--explain", type=int, default=50, help="Запросов, для которых снимается время планирования")
+    parser.add_argument("--schema", default="bench_prepared")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после замеров")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    # Пул соединений бота читает настройки libpq из окружения, так запросы идут в схему бенчмарка
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema},public"
+    # Одно соединение в пуле: все подготовленные запросы и счетчики их планов - на нем
+    proj_settings.db_pool_min_size = proj_settings.db_pool_max_size = 1
+
+    rng = random.Random(11)
+    area_names = make_area_names(args.areas)
+    criteria_list = [make_criteria(rng, area_names) for _ in range(args.queries)]
+
+    async with await AsyncConnection.connect(schema_conninfo(args.schema), autocommit=True) as connection:
+        await seed_schema(connection, args.schema, args.units, args.buildings, args.areas)
+        try:
+            # Прогрев кеша страниц и подготовка запросов на соединении
+            await _measure(_fetch_prepared, criteria_list[:20])
+            await _measure(_fetch_inline, criteria_list[:20])
+
+            inline, executed = await _measure(_fetch_inline, criteria_list)
+            prepared, _ = await _measure(_fetch_prepared, criteria_list)
+
+            sample = executed[:args.explain]
+            inline["planning_ms_p50"] = round(statistics.median(
+                [await _planning_ms(statement, params, prepared=False) for statement, params in sample]), 3)
+            prepared["planning_ms_p50"] = round(statistics.median(
+                [await _planning_ms(statement, params, prepared=True) for statement, params in sample]), 3)
+            plans = await _prepared_plans()
+        finally:
+            await close_pool()
+            if not args.keep:
+                await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+
+    report = {
+        "units": args.units,
+        "queries": args.queries,
+        "distinct_statements": len({statement.name for statement, _ in executed}),
+        "inline": inline,
+        "prepared": prepared,
+        "prepared_plans": plans,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
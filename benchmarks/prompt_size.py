@@ -0,0 +1,115 @@
+"""
+Сравнение размера промпта и задержки с отбором кандидатов и без него.
+
+Запуск из корня проекта:
+    python -m benchmarks.prompt_size --sizes 100 1000 5000
+    python -m benchmarks.prompt_size --sizes 100 1000 --llm
+
+С флагом --llm дополнительно замеряется полный вызов модели
+(используются OPENAI_* из .env, в том числе OPENAI_BASE_URL).
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from benchmarks.synthetic import make_area_names, make_building_names
+from database import build_catalog
+from utils.candidates import select_catalog_candidates
+from utils.gpt_handler import build_messages, process_users_query
+
+QUERY_TEMPLATES = [
+    "апартаменты от 4000000 до 7000000 с двумя спальнями",
+    "хочу виллу с 4 спальнями в {area} до 15 млн",
+    "квартира 1 спальня в {building}, бюджет 1.5 млн",
+    "пентхаус в районе {area}, 3 спальни, от 8 до 12 млн",
+    "2 спальни апартаменты до 2 млн",
+]
+
+
+def _count_tokens():
+    try:
+        import tiktoken
+    except ImportError:
+        # Грубая оценка, если tiktoken не установлен
+        return lambda text: len(text) // 3
+
+    encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+def _make_queries(catalog, count, seed):
+    rng = random.Random(seed)
+    return [rng.choice(QUERY_TEMPLATES).format(area=rng.choice(catalog.areas),
+                                              building=rng.choice(catalog.buildings))
+            for _ in range(count)]
+
+
+async def _measure(size, queries_count, use_llm, count_tokens):
+    catalog = build_catalog(make_area_names(max(size // 10, 10)), make_building_names(size))
+    queries = _make_queries(catalog, queries_count, seed=size)
+
+    # Первый вызов строит индекс, его стоимость считаем отдельно
+    started = time.perf_counter()
+    select_catalog_candidates(catalog, queries[0])
+    index_build_ms = (time.perf_counter() - started) * 1000
+
+    report = {"catalog_size": size, "index_build_ms": round(index_build_ms, 2)}
+    for mode in ("full", "candidates"):
+        tokens, select_ms, llm_ms = [], [], []
+        for query in queries:
+            started = time.perf_counter()
+            if mode == "full":
+                areas, buildings = catalog.areas_text, catalog.buildings_text
+            else:
+                areas, buildings = select_catalog_candidates(catalog, query)
+            select_ms.append((time.perf_counter() - started) * 1000)
+
+            tokens.append(sum(count_tokens(message["content"]) for message in build_messages(query, areas, buildings)))
+
+            if use_llm:
+                started = time.perf_counter()
+                await process_users_query(query, areas, buildings)
+                llm_ms.append((time.perf_counter() - started) * 1000)
+
+        report[mode] = {
+            "prompt_tokens_mean": round(statistics.mean(tokens), 1),
+            "prompt_tokens_max": max(tokens),
+            "select_ms_mean": round(statistics.mean(select_ms), 3),
+        }
+        if llm_ms:
+            report[mode]["llm_ms_p50"] = round(statistics.median(llm_ms), 1)
+            report[mode]["llm_ms_max"] = round(max(llm_ms), 1)
+
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--llm", action="store_true")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    count_tokens = _count_tokens()
+    reports = [await _measure(size, args.queries, args.llm, count_tokens) for size in args.sizes]
+
+    for report in reports:
+        print(f"Зданий: {report['catalog_size']:>6}  индекс: {report['index_build_ms']:>8} мс")
+        for mode in ("full", "candidates"):
+            print(f"    {mode:<10} {report[mode]}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+    if args.llm:
+        from utils import close_openai_client
+        await close_openai_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Планы и время запросов поиска до и после миграций с индексами.
+
+Скрипт создает в локальном PostgreSQL отдельную схему, заполняет ее
+синтетическими объявлениями, применяет миграции без индексов и снимает
+EXPLAIN ANALYZE для запросов, которые выполняет бот. Затем применяет
+оставшиеся миграции и повторяет замеры. Подключение берется из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.query_plans --units 200000
+    python -m benchmarks.query_plans --units 50000 --keep --output plans.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+
+from psycopg import AsyncClientCursor, AsyncConnection
+
+from benchmarks.seed import create_schema, schema_conninfo, seed_listings
+from benchmarks.synthetic import make_area_names, make_building_names
+from database.database_handler import buildings_page_query, count_search_query, units_page_query
+from database.migrations import apply_migrations
+
+# Последняя миграция, которая не создает индексов
+BASELINE_VERSION = 2
+
+BASE_CRITERIA = {
+    "purpose": "For Sale", "beds": 2, "property_type": "Apartment", "price_min": 1000000,
+    "price_max": 3000000,
+}
+
+
+def _make_cases(area, building):
+    area_criteria = {**BASE_CRITERIA, "area": area.split()[0]}
+    building_criteria = {**BASE_CRITERIA, "building": building}
+    rent_criteria = {**BASE_CRITERIA, "purpose": "For Rent", "view": "Sea View"}
+
+    return [
+        ("count: type, beds, price", count_search_query(BASE_CRITERIA)),
+        ("count: area substring", count_search_query(area_criteria)),
+        ("count: building substring", count_search_query(building_criteria)),
+        ("count: rent, view", count_search_query(rent_criteria)),
+        ("buildings page", buildings_page_query(BASE_CRITERIA, 0, 5)[:2]),
+        ("units page", units_page_query(building_criteria, 0, building, 5)[:2]),
+    ]
+
+
+def _scan_nodes(plan):
+    nodes = []
+    if "Scan" in plan["Node Type"]:
+        target = plan.get("Index Name") or plan.get("Relation Name") or plan.get("CTE Name")
+        nodes.append(f"{plan['Node Type']} {target}")
+    for child in plan.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+
+    return nodes
+
+
+async def _explain(connection, query, params, repeat):
+    timings = []
+    async with AsyncClientCursor(connection) as cursor:
+        for _ in range(repeat):
+            await cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+            explain = (await cursor.fetchone())[0][0]
+            timings.append(explain["Planning Time"] + explain["Execution Time"])
+
+    return {
+        "ms_median": round(statistics.median(timings), 3),
+        "scans": sorted(set(_scan_nodes(explain["Plan"]))),
+    }
+
+
+async def _measure(connection, cases, repeat):
+    return {name: await _explain(connection, query, params, repeat) for name, (query, params) in cases}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--buildings", type=int, default=2000)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого запроса")
+    parser.add_argument("--schema", default="bench_search")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после замеров")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    conninfo = schema_conninfo(args.schema)
+    cases = _make_cases(make_area_names(args.areas)[0], make_building_names(args.buildings)[0])
+
+    async with await AsyncConnection.connect(conninfo, autocommit=True) as connection:
+        await create_schema(connection, args.schema)
+        try:
+            await seed_listings(connection, args.units, args.buildings, args.areas)
+
+            await apply_migrations(conninfo, target=BASELINE_VERSION)
+            await connection.execute("ANALYZE")
+            before = await _measure(connection, cases, args.repeat)
+
+            await apply_migrations(conninfo)
+            await connection.execute("ANALYZE")
+            after = await _measure(connection, cases, args.repeat)
+        finally:
+            if not args.keep:
+                await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+
+    report = []
+    for name, _ in cases:
+        report.append({"query": name, "before": before[name], "after": after[name]})
+        speedup = before[name]["ms_median"] / max(after[name]["ms_median"], 0.001)
+        print(f"{name:<32} {before[name]['ms_median']:>10.3f} мс -> {after[name]['ms_median']:>10.3f} мс"
+              f"  x{speedup:.1f}")
+        print(f"    до:    {', '.join(before[name]['scans'])}")
+        print(f"    после: {', '.join(after[name]['scans'])}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"units": args.units, "buildings": args.buildings, "areas": args.areas, "queries": report},
+                      file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+"""
+Сравнение извлечения критериев правилами с извлечением моделью.
+
+Для каждого запроса вызываются оба извлекателя; для запросов, которые
+правила разобрали полностью, считается совпадение аргументов по полям.
+
+Перед сравнением проверяется разбор запросов из EXTRACTOR_CHECKS с
+пустым справочником: расхождение с ожидаемым результатом останавливает
+скрипт. С флагом --check-only выполняется только эта проверка, без
+модели и базы.
+
+Запуск из корня проекта:
+    python -m benchmarks.rule_extractor_accuracy
+    python -m benchmarks.rule_extractor_accuracy --check-only
+    python -m benchmarks.rule_extractor_accuracy --queries queries.jsonl --output report.json
+
+Файл запросов - JSONL со строками вида {"query": "..."}. Справочники
+берутся из базы, с флагом --no-db используется пустой справочник.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+from database import build_catalog, close_pool, get_catalog
+from utils.candidates import select_catalog_candidates
+from utils.gpt_handler import close_openai_client, process_users_query
+from utils.rule_extractor import UNSUPPORTED_RE, extract_search_arguments
+
+DEFAULT_QUERIES = [
+    "Найди мне апартаменты от 4000000 до 7000000 с двумя спальнями",
+    "2 спальни апартаменты до 2 млн",
+    "квартира 1 спальня от 1.5 до 3 млн с мебелью, аренда",
+    "villa 4 bedrooms 3 baths under 15m",
+    "пентхаус 3-х спальный до 12 млн",
+    "2br flat from 500k to 900k ready",
+    "апартаменты не дороже 3 млн, 2 спальни",
+    "таунхаус с тремя спальнями от 2.5 до 4 млн без мебели",
+    "хочу купить виллу, 5 спален, до 20 млн",
+    "апартаменты до 2 млн",
+    "апартаменты с видом на море 2 спальни до 2 млн",
+]
+
+REQUIRED_FIELDS = ("type", "bedroom_count", "min_price", "max_price")
+
+# Запрос и ожидаемые поля результата правил; None - запрос должен уйти в модель
+EXTRACTOR_CHECKS = [
+    ("2 bedroom apartment до 2000000", {"type": "Apartment", "bedroom_count": 2, "max_price": 2000000}),
+    ("апартаменты 2 спальни от 2025000 до 3000000", {"bedroom_count": 2, "min_price": 2025000,
+                                                     "max_price": 3000000}),
+    # Без типа объекта не хватает обязательного критерия
+    ("2 bedroom до 2000000", None),
+    # Год сдачи правилами не разбирается
+    ("апартаменты 2 спальни до 2 млн, сдача в 2026", None),
+    ("апартаменты с видом на море 2 спальни до 2 млн", None),
+    # Диапазон или варианты количества спален
+    ("квартира 2-3 спальни до 5 млн", None),
+    ("квартира от 2 до 3 спален до 5 млн", None),
+    ("квартира 1 или 2 спальни до 5 млн", None),
+    # Числа, похожие на цену, рядом с настоящим бюджетом
+    ("apartment 2 bedrooms under 3m, 10-15 min to the beach", None),
+    ("квартира 2 спальни до 3 млн, бюджет 2 млн", None),
+]
+
+# Числа, в которых есть год, не должны считаться упоминанием года
+PRICES_WITH_YEAR_DIGITS = ["2 bedroom до 2000000", "от 2025000 до 3000000"]
+
+
+def _check_extractor():
+    catalog = build_catalog([], [])
+    for query in PRICES_WITH_YEAR_DIGITS:
+        assert UNSUPPORTED_RE.search(query) is None, f"Цена принята за неподдерживаемый критерий: {query!r}"
+
+    for query, expected in EXTRACTOR_CHECKS:
+        arguments = extract_search_arguments(query, catalog)
+        if expected is None:
+            assert arguments is None, f"Запрос {query!r} должен уйти в модель, правила вернули {arguments}"
+        else:
+            assert arguments is not None, f"Правила не разобрали запрос {query!r}"
+            mismatches = {field: arguments.get(field) for field, value in expected.items()
+                          if not _same(value, arguments.get(field))}
+            assert not mismatches, f"Запрос {query!r}: ожидалось {expected}, получено {mismatches}"
+
+    print(f"Проверка правил: {len(EXTRACTOR_CHECKS) + len(PRICES_WITH_YEAR_DIGITS)} случаев без расхождений")
+
+
+def _same(rule_value, llm_value):
+    if isinstance(rule_value, (int, float)) and isinstance(llm_value, (int, float)):
+        return float(rule_value) == float(llm_value)
+
+    return (rule_value or "") == (llm_value or "")
+
+
+async def _compare(query, catalog):
+    started = time.perf_counter()
+    rule_arguments = extract_search_arguments(query, catalog)
+    rule_ms = (time.perf_counter() - started) * 1000
+
+    areas, buildings = select_catalog_candidates(catalog, query)
+    started = time.perf_counter()
+    message, llm_arguments, _ = await process_users_query(query, areas, buildings)
+    llm_ms = (time.perf_counter() - started) * 1000
+
+    mismatches = []
+    if rule_arguments and llm_arguments:
+        mismatches = [field for field, value in rule_arguments.items()
+                      if not _same(value, llm_arguments.get(field))]
+
+    return {
+        "query": query,
+        "rule_ms": round(rule_ms, 3),
+        "llm_ms": round(llm_ms, 1),
+        "rule_arguments": rule_arguments,
+        "llm_arguments": llm_arguments,
+        "llm_message": message,
+        "mismatches": mismatches,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="JSONL-файл с запросами")
+    parser.add_argument("--no-db", action="store_true", help="Не загружать справочники из базы")
+    parser.add_argument("--check-only", action="store_true", help="Только проверка правил, без модели")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    _check_extractor()
+    if args.check_only:
+        return
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as file:
+            queries = [json.loads(line)["query"] for line in file if line.strip()]
+    else:
+        queries = DEFAULT_QUERIES
+
+    catalog = build_catalog([], []) if args.no_db else await get_catalog()
+
+    try:
+        results = [await _compare(query, catalog) for query in queries]
+    finally:
+        await close_openai_client()
+        await close_pool()
+
+    covered = [result for result in results if result["rule_arguments"]]
+    compared = [result for result in covered if result["llm_arguments"]]
+    field_mismatches = Counter(field for result in compared for field in result["mismatches"])
+    required_ok = [result for result in compared if not set(result["mismatches"]) & set(REQUIRED_FIELDS)]
+
+    summary = {
+        "queries": len(results),
+        "rule_coverage": round(len(covered) / len(results), 3) if results else 0,
+        "compared_with_llm": len(compared),
+        "exact_match_rate": round(sum(not result["mismatches"] for result in compared) / len(compared), 3)
+        if compared else None,
+        "required_fields_match_rate": round(len(required_ok) / len(compared), 3) if compared else None,
+        "field_mismatches": dict(field_mismatches),
+        "rule_ms_max": max((result["rule_ms"] for result in results), default=0),
+        "llm_ms_mean": round(sum(result["llm_ms"] for result in results) / len(results), 1) if results else 0,
+        # Модель вызывалась бы только для запросов, не разобранных правилами
+        "llm_calls_saved": len(covered),
+    }
+
+    for result in results:
+        status = "rules" if result["rule_arguments"] else "llm"
+        print(f"[{status:<5}] {result['query']}")
+        if result["mismatches"]:
+            for field in result["mismatches"]:
+                print(f"        {field}: rules={result['rule_arguments'][field]!r} "
+                      f"llm={result['llm_arguments'].get(field)!r}")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"summary": summary, "results": results}, file, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
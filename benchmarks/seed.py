@@ -0,0 +1,145 @@
+from psycopg.conninfo import make_conninfo
+
+from benchmarks.synthetic import make_area_names, make_building_names
+from database.migrations import apply_migrations
+from database.pool import build_conninfo
+
+# Таблицы в том виде, в котором их читает бот (только используемые колонки)
+SCHEMA_SQL = """
+CREATE TABLE "Areas" (
+    id serial PRIMARY KEY,
+    original_name text NOT NULL
+);
+CREATE TABLE "Buildings" (
+    id serial PRIMARY KEY,
+    name text NOT NULL,
+    area_id integer REFERENCES "Areas" (id)
+);
+CREATE TABLE "Agents" (
+    id serial PRIMARY KEY,
+    name text NOT NULL,
+    whatsapp text
+);
+CREATE TABLE "Units" (
+    id serial PRIMARY KEY,
+    price numeric(14, 2) NOT NULL,
+    type_unit text,
+    purpose text,
+    completion text,
+    handover_date date,
+    furnishing text,
+    "Studio" text,
+    sqft numeric(10, 2),
+    "Baths" integer,
+    "Beds" integer,
+    view text,
+    vacant text,
+    post_status text NOT NULL DEFAULT 'published',
+    agent_id integer REFERENCES "Agents" (id),
+    building_id integer REFERENCES "Buildings" (id),
+    area_id integer REFERENCES "Areas" (id)
+);
+"""
+
+UNITS_SEED_SQL = """
+INSERT INTO "Units" (price, type_unit, purpose, completion, handover_date, furnishing, "Studio",
+                     sqft, "Baths", "Beds", view, vacant, post_status, agent_id, building_id, area_id)
+SELECT
+    round((300000 + random() * 15000000)::numeric, -3),
+    (ARRAY['Apartment', 'Apartment', 'Apartment', 'Villa', 'Townhouse', 'Penthouse'])[1 + floor(random() * 6)::int],
+    (ARRAY['For Sale', 'For Sale', 'For Rent'])[1 + floor(random() * 3)::int],
+    (ARRAY['Ready', 'Off-Plan'])[1 + floor(random() * 2)::int],
+    DATE '2025-01-01' + floor(random() * 1500)::int,
+    (ARRAY['Furnished', 'Unfurnished', 'Partly Furnished'])[1 + floor(random() * 3)::int],
+    '',
+    round((400 + random() * 5000)::numeric, 2),
+    1 + floor(random() * 5)::int,
+    floor(random() * 6)::int,
+    (ARRAY['Sea View', 'City View', 'Garden View', 'Burj Khalifa View', ''])[1 + floor(random() * 5)::int],
+    (ARRAY['Vacant', 'Rented'])[1 + floor(random() * 2)::int],
+    CASE WHEN random() < 0.1 THEN 'archived' ELSE 'published' END,
+    1 + floor(random() * %(agents)s)::int,
+    building.id,
+    building.area_id
+FROM generate_series(1, %(units)s) AS i
+JOIN "Buildings" AS building ON building.id = 1 + mod(i * 7919, %(buildings)s)
+"""
+
+
+def schema_conninfo(schema):
+    """
+    Строка подключения из настроек проекта, в которой поиск таблиц идет в заданной схеме.
+
+    Args:
+        schema: Имя схемы для синтетических данных
+
+    Returns:
+        str: Строка подключения в формате libpq
+    """
+    return make_conninfo(build_conninfo(), options=f"-c search_path={schema},public")
+
+
+async def create_schema(connection, schema):
+    """
+    Пересоздание схемы с пустыми таблицами "Areas", "Buildings", "Agents" и "Units".
+
+    Args:
+        connection: Соединение в режиме autocommit
+        schema: Имя схемы
+    """
+    await connection.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+    await connection.execute(f'CREATE SCHEMA "{schema}"')
+    await connection.execute(f'SET search_path TO "{schema}", public')
+    await connection.execute(SCHEMA_SQL)
+
+
+async def seed_listings(connection, units, buildings, areas, agents=50, seed=0.42):
+    """
+    Заполнение таблиц синтетическими объявлениями.
+
+    Около 10% объектов получают статус archived, чтобы частичные индексы
+    работали так же, как на реальных данных.
+
+    Args:
+        connection: Соединение, у которого search_path указывает на нужную схему
+        units: Количество объектов
+        buildings: Количество зданий
+        areas: Количество районов
+        agents: Количество агентов
+        seed: Зерно для random() в PostgreSQL
+    """
+    area_names = make_area_names(areas)
+    building_names = make_building_names(buildings)
+
+    async with connection.transaction():
+        await connection.execute("SELECT setseed(%s)", [seed])
+        await connection.execute('INSERT INTO "Areas" (original_name) SELECT unnest(%s::text[])', [area_names])
+        await connection.execute(
+            'INSERT INTO "Buildings" (name, area_id) SELECT name, 1 + floor(random() * %s)::int'
+            " FROM unnest(%s::text[]) AS name",
+            [areas, building_names],
+        )
+        await connection.execute(
+            "INSERT INTO \"Agents\" (name, whatsapp) SELECT 'Agent ' || i, '+9715' || lpad(i::text, 8, '0')"
+            " FROM generate_series(1, %s) AS i",
+            [agents],
+        )
+        await connection.execute(UNITS_SEED_SQL, {"units": units, "buildings": buildings, "agents": agents})
+
+    await connection.execute("ANALYZE")
+
+
+async def seed_schema(connection, schema, units, buildings, areas):
+    """
+    Пересоздание схемы, заполнение ее синтетическими объявлениями и применение миграций бота.
+
+    Args:
+        connection: Соединение в режиме autocommit
+        schema: Имя схемы
+        units: Количество объектов
+        buildings: Количество зданий
+        areas: Количество районов
+    """
+    await create_schema(connection, schema)
+    await seed_listings(connection, units, buildings, areas)
+    await apply_migrations(schema_conninfo(schema))
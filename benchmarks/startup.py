@@ -0,0 +1,166 @@
+"""
+Время запуска процесса бота до первого обслуженного обновления, с прогревом и без.
+
+Каждый замер - новый процесс Python, поэтому в него входят и импорт
+модулей, и холодные пул соединений, справочники и клиент модели. В
+процессе диспетчер настраивается так же, как в main.py (setup_dispatcher),
+выполняются обработчики запуска, после чего пользователь отправляет
+/start и запрос, а затем второй пользователь - такой же запрос. Bot API
+заменен сессией без сети, модель - локальным OpenAI-совместимым
+сервером, поиск идет по схеме с синтетическими объявлениями. Режимы:
+    cold - WARM_UP_ON_STARTUP=False, пул, запросы, справочники и клиент
+           модели создаются при первом поиске
+    warm - WARM_UP_ON_STARTUP=True, все это готово до приема обновлений
+В отчете - медианы времени от запуска процесса до конца импорта, до
+готовности (обработчики запуска выполнены), до ответа на /start и до
+первой страницы результатов первого поиска, а также длительность первого
+и второго поиска. Запросы к Bot API при настройке бота (setup_bot) в
+замер не входят. Подключение к базе берется из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.startup --units 100000 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from aiogram.methods import EditMessageText
+from psycopg import AsyncConnection
+
+from benchmarks.fakes import FakeLLM, FakeSession, make_search_queries, message_update
+from benchmarks.seed import schema_conninfo, seed_schema
+from benchmarks.synthetic import make_area_names
+from handlers.start_handler import _pending_requests
+from loader import bot, dp, proj_settings
+from main import setup_dispatcher
+
+MODES = {"cold": "False", "warm": "True"}
+PHASES = ("imports_ms", "ready_ms", "first_update_ms", "first_search_page_ms", "first_search_ms", "second_search_ms")
+
+
+async def _search(session, update_id, user_id, query):
+    # Время от запроса до первой страницы результатов
+    first_page = session.wait_for(lambda method: isinstance(method, EditMessageText)
+                                  and method.chat_id == user_id and method.reply_markup is not None)
+    started = time.perf_counter()
+    await dp.feed_raw_update(bot=bot, update=message_update(update_id, user_id, query))
+    task = _pending_requests[user_id]["task"]
+    await asyncio.wait([first_page, task], return_when=asyncio.FIRST_COMPLETED)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    # Обработка запроса завершается до следующего шага, чтобы не пересекаться с ним
+    first_page.cancel()
+    await task
+
+    return elapsed
+
+
+async def _child(args):
+    """
+    Один запуск в отдельном процессе: время этапов от --spawned в секундах epoch.
+    """
+    marks = {"imports_ms": time.time()}
+    session = FakeSession()
+    bot.session = session
+    setup_dispatcher()
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    marks["ready_ms"] = time.time()
+    try:
+        await dp.feed_raw_update(bot=bot, update=message_update(1, 1000, "/start"))
+        marks["first_update_ms"] = time.time()
+
+        # Один и тот же запрос с разными окончаниями: кеш извлечения не срабатывает
+        query = next(iter(make_search_queries(make_area_names(args.areas))))
+        first_search = await _search(session, 2, 1000, f"{query}, вариант 1")
+        marks["first_search_page_ms"] = time.time()
+
+        await dp.feed_raw_update(bot=bot, update=message_update(3, 1001, "/start"))
+        second_search = await _search(session, 4, 1001, f"{query}, вариант 2")
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+    report = {phase: (moment - args.spawned) * 1000 for phase, moment in marks.items()}
+    print(json.dumps({**report, "first_search_ms": first_search, "second_search_ms": second_search}))
+
+
+async def _spawn(mode, args, env):
+    env = {**env, "WARM_UP_ON_STARTUP": MODES[mode]}
+    spawned = time.time()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.startup", "--child", "--spawned", repr(spawned), "--areas", str(args.areas),
+        env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"Процесс запуска в режиме {mode} завершился с кодом {process.returncode}")
+
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--buildings", type=int, default=2000)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5, help="Запусков процесса в каждом режиме")
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="Задержка ответа поддельной модели, мс")
+    parser.add_argument("--memory-search", action="store_true", help="Искать в снимке в памяти")
+    parser.add_argument("--rule-extractor", action="store_true", help="Извлекать критерии правилами до модели")
+    parser.add_argument("--llm-port", type=int, default=18084)
+    parser.add_argument("--schema", default="bench_startup")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после замеров")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--spawned", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        proj_settings.request_debounce = 0
+        proj_settings.debug_mode = False
+        await _child(args)
+        return
+
+    llm = FakeLLM(make_search_queries(make_area_names(args.areas)), latency_ms=args.llm_ms)
+    # Процессы бота читают настройки из окружения, libpq - схему бенчмарка из PGOPTIONS
+    env = {**os.environ, "PGOPTIONS": f"-c search_path={args.schema},public",
+           "OPENAI_BASE_URL": await llm.start(args.llm_port), "REQUEST_DEBOUNCE": "0",
+           "MEMORY_SEARCH_ENABLED": str(args.memory_search), "RULE_EXTRACTOR_ENABLED": str(args.rule_extractor)}
+
+    runs = {mode: [] for mode in MODES}
+    try:
+        async with await AsyncConnection.connect(schema_conninfo(args.schema), autocommit=True) as connection:
+            await seed_schema(connection, args.schema, args.units, args.buildings, args.areas)
+            try:
+                # Первый запуск прогревает кеш страниц PostgreSQL и файлов модулей и в отчет не входит
+                await _spawn("cold", args, env)
+                # Режимы чередуются, чтобы фоновые колебания нагрузки влияли на них одинаково
+                for _ in range(args.repeat):
+                    for mode in MODES:
+                        runs[mode].append(await _spawn(mode, args, env))
+            finally:
+                if not args.keep:
+                    await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+    finally:
+        await llm.stop()
+
+    report = {
+        "units": args.units,
+        "repeat": args.repeat,
+        "memory_search": args.memory_search,
+        "rule_extractor": args.rule_extractor,
+        **{mode: {phase: round(statistics.median(run[phase] for run in mode_runs), 1) for phase in PHASES}
+           for mode, mode_runs in runs.items()},
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
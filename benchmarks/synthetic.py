@@ -0,0 +1,78 @@
+import random
+
+AREA_WORDS = [
+    "Dubai", "Marina", "Downtown", "Business", "Bay", "Palm", "Jumeirah", "Creek", "Harbour",
+    "Hills", "Arabian", "Ranches", "Sports", "City", "Motor", "Silicon", "Oasis", "Meydan",
+    "Al", "Barsha", "Furjan", "Quoz", "Sufouh", "Village", "Lakes", "Springs", "Meadows",
+]
+
+BUILDING_WORDS = [
+    "Tower", "Residence", "Heights", "Gate", "Park", "View", "Vista", "Grande", "Royal",
+    "Golden", "Sky", "Sea", "Crystal", "Emerald", "Pearl", "Opera", "Burj", "Khalifa",
+    "Marina", "Horizon", "Bluewaters", "Elite", "Sunrise", "Azure", "Cove", "Terrace",
+]
+
+
+def make_names(words, count, seed, min_words=2, max_words=3):
+    """
+    Генерация уникальных названий из набора слов.
+
+    Args:
+        words: Слова, из которых собираются названия
+        count: Количество названий
+        seed: Зерно генератора случайных чисел
+        min_words: Минимальное число слов в названии
+        max_words: Максимальное число слов в названии
+
+    Returns:
+        list: Отсортированный список уникальных названий
+    """
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        name = " ".join(rng.sample(words, rng.randint(min_words, max_words)))
+        if name in names:
+            name = f"{name} {len(names)}"
+        names.add(name)
+
+    return sorted(names)
+
+
+def make_area_names(count, seed=1):
+    return make_names(AREA_WORDS, count, seed)
+
+
+def make_building_names(count, seed=2):
+    return make_names(BUILDING_WORDS, count, seed)
+
+
+PROPERTY_TYPES = ["Apartment", "apartment", "Villa", "Townhouse", "Penthouse"]
+VIEWS = ["", "", "", "Sea View", "city view"]
+
+
+def make_criteria(rng, area_names):
+    """
+    Случайные критерии поиска по именам аргументов _common_params и _tier_levels из database_handler.
+
+    Args:
+        rng: Генератор random.Random
+        area_names: Названия районов, части которых используются в критерии area
+
+    Returns:
+        dict: Критерии без пустых значений
+    """
+    price_min = rng.choice([0, 500000, 1000000, 2000000])
+    criteria = {
+        "purpose": rng.choice(["For Sale", "For Rent", "buy", ""]),
+        "beds": rng.randint(1, 5),
+        "property_type": rng.choice(PROPERTY_TYPES),
+        "price_min": price_min,
+        "price_max": price_min + rng.choice([500000, 1000000, 3000000]),
+        "view": rng.choice(VIEWS),
+        "baths": rng.choice([0, 0, 1, 2]),
+        "sqft_min": rng.choice([0, 0, 800]),
+        "area": rng.choice([""] * 3 + [name.split()[0] for name in area_names[:5]]),
+        "completion": rng.choice(["", "", "Ready"]),
+    }
+
+    return {key: value for key, value in criteria.items() if value or key == "price_min"}
@@ -0,0 +1,177 @@
+"""
+Отправка сообщений через поддельный Bot API с ограничениями Telegram.
+
+Локальный сервер отвечает 429 с retry_after, если в чат приходит больше
+--server-chat-rate запросов в секунду или боту - больше
+--server-global-rate запросов в секунду (скользящее окно в одну секунду).
+Множество чатов одновременно отправляют сообщения и правят клавиатуры,
+сначала без ограничителя, затем с RateLimitMiddleware. В отчете -
+устойчивая пропускная способность, число ответов 429 и число правок,
+которые ограничитель объединил. С ограничителем на лимитах API замер
+завершается ошибкой, если сервер ответил 429 хотя бы раз; с
+--limiter-global-rate выше лимита API - если после повторов по
+retry_after какая-то отправка или правка не удалась.
+
+Запуск из корня проекта:
+    python -m benchmarks.telegram_rate_limit --chats 100 --messages 5 --edits 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiohttp import web
+
+from rate_limiter import RateLimitMiddleware
+
+TOKEN = "123456:ABCDEFabcdef"
+
+
+class FakeBotAPI:
+    """
+    Поддельный Bot API со скользящими окнами по чату и по боту.
+    """
+
+    def __init__(self, chat_rate, global_rate):
+        self.chat_rate = chat_rate
+        self.global_rate = global_rate
+        self.reset()
+
+    def reset(self):
+        self.accepted = 0
+        self.rejected = 0
+        self._chat_requests = defaultdict(deque)
+        self._global_requests = deque()
+        self._message_ids = defaultdict(int)
+
+    @staticmethod
+    def _count(requests, now):
+        while requests and now - requests[0] >= 1:
+            requests.popleft()
+        return len(requests)
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        chat_id = int(data.get("chat_id", 0))
+        now = time.monotonic()
+
+        if (self._count(self._chat_requests[chat_id], now) >= self.chat_rate
+                or self._count(self._global_requests, now) >= self.global_rate):
+            self.rejected += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": "Too Many Requests: retry after 1",
+                                      "parameters": {"retry_after": 1}})
+
+        self.accepted += 1
+        self._chat_requests[chat_id].append(now)
+        self._global_requests.append(now)
+
+        if method.lower() == "sendmessage":
+            self._message_ids[chat_id] += 1
+            message_id = self._message_ids[chat_id]
+        else:
+            message_id = int(data.get("message_id", 0))
+        return web.json_response({"ok": True, "result": {
+            "message_id": message_id, "date": int(time.time()), "text": data.get("text", ""),
+            "chat": {"id": chat_id, "type": "private"},
+        }})
+
+
+async def _chat_load(bot, chat_id, messages, edits, failures):
+    for _ in range(messages):
+        try:
+            message = await bot.send_message(chat_id=chat_id, text="Найдено 40 объектов по вашему запросу")
+        except TelegramRetryAfter:
+            failures["send"] += 1
+            continue
+
+        # Быстрые нажатия кнопок пагинации: каждая правка заменяет клавиатуру того же сообщения
+        results = await asyncio.gather(*(
+            bot.edit_message_reply_markup(chat_id=chat_id, message_id=message.message_id,
+                                          reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+                                              InlineKeyboardButton(text=str(page), callback_data=f"page:{page}")
+                                          ]]))
+            for page in range(edits)
+        ), return_exceptions=True)
+        failures["edit"] += sum(isinstance(result, TelegramRetryAfter) for result in results)
+
+
+async def _run(args, url, api, limiter):
+    session = AiohttpSession(api=TelegramAPIServer.from_base(url))
+    if limiter is not None:
+        session.middleware(limiter)
+    bot = Bot(token=TOKEN, session=session)
+
+    api.reset()
+    failures = defaultdict(int)
+    started = time.perf_counter()
+    await asyncio.gather(*(_chat_load(bot, chat_id, args.messages, args.edits, failures)
+                           for chat_id in range(1, args.chats + 1)))
+    elapsed = time.perf_counter() - started
+    await session.close()
+
+    return {
+        "limiter": limiter is not None,
+        "seconds": round(elapsed, 2),
+        "accepted_requests": api.accepted,
+        "accepted_per_second": round(api.accepted / elapsed, 1),
+        "responses_429": api.rejected,
+        "failed_sends": failures["send"],
+        "failed_edits": failures["edit"],
+        "collapsed_edits": limiter.collapsed if limiter is not None else 0,
+        "retried_after_429": limiter.retried if limiter is not None else 0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=5, help="Сообщений в каждый чат")
+    parser.add_argument("--edits", type=int, default=5, help="Правок клавиатуры каждого сообщения")
+    parser.add_argument("--server-chat-rate", type=int, default=3, help="Лимит поддельного API на чат в секунду")
+    parser.add_argument("--server-global-rate", type=int, default=30, help="Лимит поддельного API на бота в секунду")
+    parser.add_argument("--limiter-global-rate", type=float,
+                        help="Общий лимит ограничителя; выше лимита API - проверка повторов по retry_after")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.server_chat_rate, args.server_global_rate)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    url = f"http://127.0.0.1:{args.port}"
+    limiter = RateLimitMiddleware(global_rate=args.limiter_global_rate or args.server_global_rate, chat_rate=1.0,
+                                  chat_burst=args.server_chat_rate)
+    try:
+        reports = [await _run(args, url, api, None), await _run(args, url, api, limiter)]
+    finally:
+        await runner.cleanup()
+
+    for report in reports:
+        print(json.dumps(report, ensure_ascii=False))
+
+    limited = reports[-1]
+    assert not limited["failed_sends"] and not limited["failed_edits"], \
+        f"С ограничителем не удалось {limited['failed_sends']} отправок и {limited['failed_edits']} правок"
+    if not args.limiter_global_rate or args.limiter_global_rate <= args.server_global_rate:
+        assert not limited["responses_429"], \
+            f"С ограничителем на лимитах API сервер ответил 429 {limited['responses_429']} раз"
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+Память и время на разбор большого результата поиска до и после перехода на Unit.
+
+"До" - путь строк в исходном коде: словари RealDictRow из курсора,
+копия каждой строки с переименованием building_name/area_name и еще
+одна копия в 17 ключей при группировке по зданиям. "После" - строка
+декодируется из курсора сразу в Unit, и группировка кладет в здания
+те же объекты. Для каждого размера из --rows замеряются время, пиковый
+и оставшийся (пока результат жив) объем памяти по tracemalloc.
+Объекты в данные состояния больше не попадают, размер состояния
+замеряет benchmarks/fsm_state_size.py. Подключение берется из DB_* в .env.
+
+Запуск из корня проекта:
+    python -m benchmarks.unit_rows --rows 1000 10000 --repeat 5
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+from psycopg import AsyncConnection
+
+from benchmarks.seed import schema_conninfo, seed_schema
+from database import close_pool
+from database.database_handler import UNITS_SELECT, _fetch_all
+from database.units import unit_row
+from utils import organize_by_building
+
+QUERY = UNITS_SELECT.format(extra_columns="") + " ORDER BY u.price, u.id LIMIT %(limit)s"
+
+
+def _original_rows_to_properties(results):
+    # Исходный _rows_to_properties из database_handler
+    properties = []
+    for row in results:
+        property_dict = dict(row)
+        property_dict['building'] = property_dict.pop('building_name')
+        property_dict['area'] = property_dict.pop('area_name')
+        properties.append(property_dict)
+
+    return properties
+
+
+def _original_organize_by_building(properties):
+    # Исходные organize_by_building и property_details из utils.other_utils
+    result = {}
+    for prop in properties:
+        building_name = prop.get("building", "Неизвестное здание")
+        if building_name not in result:
+            result[building_name] = []
+        result[building_name].append({
+            'id': prop.get('id'), 'price': prop.get('price'), 'type_unit': prop.get('type_unit'),
+            'purpose': prop.get('purpose'), 'completion': prop.get('completion'),
+            'handover_date': prop.get('handover_date'), 'furnishing': prop.get('furnishing'),
+            'studio': prop.get('Studio'), 'sqft': prop.get('sqft'), 'baths': prop.get('Baths'),
+            'beds': prop.get('Beds'), 'view': prop.get('view'), 'vacant': prop.get('vacant'),
+            'agent_name': prop.get('agent_name'), 'agent_whatsapp': prop.get('agent_whatsapp'),
+            'area': prop.get('area'), 'building': prop.get("building", "Неизвестное здание"),
+        })
+
+    return result
+
+
+async def _original(limit):
+    return _original_organize_by_building(_original_rows_to_properties(await _fetch_all(QUERY, {"limit": limit})))
+
+
+async def _units(limit):
+    return organize_by_building(await _fetch_all(QUERY, {"limit": limit}, unit_row))
+
+
+async def _measure(fetch, limit, repeat):
+    timings, peaks, retained = [], [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        grouped = await fetch(limit)
+        timings.append((time.perf_counter() - started) * 1000)
+        del grouped
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            grouped = await fetch(limit)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append((peak - baseline) / 1024)
+        retained.append((current - baseline) / 1024)
+
+    return {
+        "rows": sum(len(units) for units in grouped.values()),
+        "ms_p50": round(statistics.median(timings), 3),
+        "peak_kib": round(statistics.median(peaks), 1),
+        "retained_kib": round(statistics.median(retained), 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="Строк в результате")
+    parser.add_argument("--buildings", type=int, default=500)
+    parser.add_argument("--areas", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--schema", default="bench_unit_rows")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему после замеров")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    # Пул соединений бота читает настройки libpq из окружения, так запросы идут в схему бенчмарка
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema},public"
+
+    reports = []
+    async with await AsyncConnection.connect(schema_conninfo(args.schema), autocommit=True) as connection:
+        # Около 10% объектов архивные, поэтому объектов заполняется с запасом
+        await seed_schema(connection, args.schema, max(args.rows) * 12 // 10, args.buildings, args.areas)
+        try:
+            # Прогрев соединения и кеша страниц
+            await _units(max(args.rows))
+            for rows in args.rows:
+                reports.append({
+                    "rows": rows,
+                    "original": await _measure(_original, rows, args.repeat),
+                    "units": await _measure(_units, rows, args.repeat),
+                })
+                print(json.dumps(reports[-1], ensure_ascii=False, indent=2))
+        finally:
+            await close_pool()
+            if not args.keep:
+                await connection.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Пропускная способность обработки обновлений в зависимости от числа процессов.
+
+Обновления от множества пользователей распределяются через WorkerPool.
+Обработчик в каждом процессе извлекает критерии правилами по большому
+справочнику (нагрузка на процессор), ждет имитацию запроса к базе и
+отправляет ответ в поддельный Bot API без сети. Номер сообщения
+пользователя сохраняется в состоянии FSM, так проверяется, что
+обновления одного пользователя обрабатываются по порядку. Замер
+завершается ошибкой, если обновления одного пользователя попали в разные
+процессы или были обработаны не по порядку.
+
+Запуск из корня проекта:
+    python -m benchmarks.worker_scaling --workers 1 2 4 --users 200 --messages 5
+"""
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import time
+
+from aiogram import Bot, Dispatcher, F, Router, types
+from aiogram.fsm.context import FSMContext
+
+from benchmarks.fakes import FakeSession, message_update
+from benchmarks.synthetic import make_area_names, make_building_names
+from database import build_catalog
+from utils.rule_extractor import extract_search_arguments
+from workers import WorkerPool
+
+QUERY = "апартаменты в {area} от 4000000 до 7000000 с двумя спальнями"
+
+
+def setup(results, catalog_size, repeat, io_ms):
+    """
+    Диспетчер процесса-обработчика для замера; передается в WorkerPool через functools.partial.
+    """
+    areas = make_area_names(catalog_size)
+    catalog = build_catalog(areas, make_building_names(catalog_size))
+    router = Router()
+
+    @router.message(F.text)
+    async def handle(message: types.Message, state: FSMContext) -> None:
+        sequence, area_index = map(int, message.text.split())
+        expected = (await state.get_data()).get("sequence", -1) + 1
+
+        for _ in range(repeat):
+            extract_search_arguments(QUERY.format(area=areas[area_index % len(areas)]), catalog)
+        await asyncio.sleep(io_ms / 1000)
+
+        await state.set_data({"sequence": sequence})
+        await message.answer(text="ok")
+        results.put((message.from_user.id, os.getpid(), sequence == expected))
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+
+    return Bot(token="123456:ABCDEFabcdef", session=FakeSession()), dispatcher
+
+
+def _measure(workers, args, results):
+    pool = WorkerPool(workers, functools.partial(setup, results, args.catalog_size, args.repeat, args.io_ms))
+    pool.start()
+
+    total = args.users * args.messages
+    started = time.perf_counter()
+    for sequence in range(args.messages):
+        for user_id in range(1, args.users + 1):
+            pool.submit(message_update(sequence * args.users + user_id, user_id, f"{sequence} {user_id}"))
+
+    handled = [results.get() for _ in range(total)]
+    elapsed = time.perf_counter() - started
+    pool.stop()
+
+    processes = {}
+    for user_id, pid, _ in handled:
+        processes.setdefault(user_id, set()).add(pid)
+    split_users = [user_id for user_id, pids in processes.items() if len(pids) > 1]
+    assert not split_users, f"Обновления пользователей {split_users[:10]} обработаны в разных процессах"
+    ordered = sum(in_order for _, _, in_order in handled)
+    assert ordered == total, f"Не по порядку обработано {total - ordered} обновлений из {total}"
+
+    return {"workers": workers, "updates": total, "seconds": round(elapsed, 3),
+            "updates_per_second": round(total / elapsed, 1), "out_of_order": total - ordered}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5, help="Сообщений от каждого пользователя")
+    parser.add_argument("--catalog-size", type=int, default=2000, help="Районов и зданий в справочнике")
+    parser.add_argument("--repeat", type=int, default=3, help="Извлечений критериев на одно обновление")
+    parser.add_argument("--io-ms", type=float, default=5.0, help="Имитация ожидания базы, мс")
+    parser.add_argument("--output", help="Путь к JSON-файлу с результатами")
+    args = parser.parse_args()
+
+    results = multiprocessing.get_context("spawn").Queue()
+    reports = [_measure(workers, args, results) for workers in args.workers]
+
+    print(f"Процессоров: {os.cpu_count()}")
+    for report in reports:
+        print(f"Процессов: {report['workers']:>2}  {report['updates_per_second']:>8} обновлений/с  "
+              f"за {report['seconds']} с, не по порядку: {report['out_of_order']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,69 @@ class ProjectSettings(BaseSettings):
     bot_token: str = Field(alias="bot_token")
     debug_mode: bool = Field(alias="debug_mode")
 
+    bot_mode: str = Field(default="polling", alias="bot_mode")
+    webhook_url: str = Field(default="", alias="webhook_url")
+    webhook_path: str = Field(default="/webhook", alias="webhook_path")
+    webhook_host: str = Field(default="0.0.0.0", alias="webhook_host")
+    webhook_port: int = Field(default=8080, alias="webhook_port")
+    webhook_secret: str = Field(default="", alias="webhook_secret")
+    bot_workers: int = Field(default=1, alias="bot_workers")
+    request_debounce: float = Field(default=1.0, alias="request_debounce")
+    warm_up_on_startup: bool = Field(default=True, alias="warm_up_on_startup")
+
+    telegram_rate_limit: bool = Field(default=True, alias="telegram_rate_limit")
+    telegram_global_rate: float = Field(default=30.0, alias="telegram_global_rate")
+    telegram_chat_rate: float = Field(default=1.0, alias="telegram_chat_rate")
+    telegram_chat_burst: int = Field(default=3, alias="telegram_chat_burst")
+    telegram_max_retries: int = Field(default=3, alias="telegram_max_retries")
+
+    metrics_port: int | None = Field(default=None, alias="metrics_port")
+    metrics_host: str = Field(default="0.0.0.0", alias="metrics_host")
+
+    db_host: str = Field(alias="db_host")
+    db_port: int = Field(default=5432, alias="db_port")
+    db_name: str = Field(alias="db_name")
+    db_user: str = Field(alias="db_user")
+    db_password: str = Field(alias="db_password")
+
+    db_pool_min_size: int = Field(default=2, alias="db_pool_min_size")
+    db_pool_max_size: int = Field(default=10, alias="db_pool_max_size")
+    db_pool_acquire_timeout: float = Field(default=10.0, alias="db_pool_acquire_timeout")
+    db_pool_max_idle: float = Field(default=300.0, alias="db_pool_max_idle")
+    db_pool_max_lifetime: float = Field(default=3600.0, alias="db_pool_max_lifetime")
+    db_pool_health_check: bool = Field(default=True, alias="db_pool_health_check")
+    db_migrate_on_startup: bool = Field(default=False, alias="db_migrate_on_startup")
+
+    catalog_ttl: float = Field(default=600.0, alias="catalog_ttl")
+    catalog_listen: bool = Field(default=False, alias="catalog_listen")
+    catalog_listen_retry_delay: float = Field(default=5.0, alias="catalog_listen_retry_delay")
+
+    fsm_storage: str = Field(default="memory", alias="fsm_storage")
+    fsm_redis_url: str = Field(default="redis://localhost:6379/0", alias="fsm_redis_url")
+    fsm_state_ttl: int | None = Field(default=86400, alias="fsm_state_ttl")
+    fsm_memory_budget: int | None = Field(default=50 * 1024 * 1024, alias="fsm_memory_budget")
+    fsm_report_interval: float | None = Field(default=600.0, alias="fsm_report_interval")
+
+    memory_search_enabled: bool = Field(default=False, alias="memory_search_enabled")
+    memory_search_refresh_interval: float = Field(default=5.0, alias="memory_search_refresh_interval")
+    memory_search_full_reload_interval: float = Field(default=3600.0, alias="memory_search_full_reload_interval")
+
+    candidates_enabled: bool = Field(default=True, alias="candidates_enabled")
+    candidates_top_k: int = Field(default=10, alias="candidates_top_k")
+    candidates_min_score: float = Field(default=0.5, alias="candidates_min_score")
+
+    rule_extractor_enabled: bool = Field(default=True, alias="rule_extractor_enabled")
+
+    extraction_cache_size: int = Field(default=5000, alias="extraction_cache_size")
+    extraction_cache_ttl: float = Field(default=86400.0, alias="extraction_cache_ttl")
+    extraction_cache_path: str | None = Field(default=None, alias="extraction_cache_path")
+
+    openai_api_key: str = Field(alias="openai_api_key")
+    openai_base_url: str | None = Field(default=None, alias="openai_base_url")
+    openai_model: str = Field(default="gpt-4.1", alias="openai_model")
+    openai_timeout: float = Field(default=30.0, alias="openai_timeout")
+    openai_max_concurrency: int = Field(default=8, alias="openai_max_concurrency")
+    openai_max_retries: int = Field(default=3, alias="openai_max_retries")
+    openai_retry_base_delay: float = Field(default=0.5, alias="openai_retry_base_delay")
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="allow")
@@ -1,4 +1,7 @@
+from pathlib import Path
+
 import yaml
 
-with open("config/bot_messages.yaml", encoding="utf-8") as file:
+# Путь от каталога модуля: бот и скрипты можно запускать не только из корня проекта
+with open(Path(__file__).with_name("bot_messages.yaml"), encoding="utf-8") as file:
     bot_messages = yaml.safe_load(file)
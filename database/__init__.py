@@ -1 +1,8 @@
-from .database_handler import search_database, get_available_areas, get_available_buildings
\ No newline at end of file
+from .database_handler import (get_available_areas, get_available_buildings, prepare_statements,
+                               TIER_ORIGINAL, TIER_PRICE_INCREASED, TIER_RENT, PRICE_INCREASE_FACTOR)
+from .search import (count_search_results, count_units, search_buildings_page, search_units_page,
+                     get_unit, start_memory_search, stop_memory_search)
+from .units import Unit
+from .pool import get_pool, close_pool
+from .catalog import Catalog, build_catalog, get_catalog, invalidate_catalog, start_catalog_listener, stop_catalog_listener
+from .migrations import MIGRATIONS, apply_migrations, migrate_on_startup
\ No newline at end of file
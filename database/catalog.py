@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, replace
+
+from psycopg import AsyncConnection
+
+from loader import proj_settings
+from .database_handler import get_available_areas, get_available_buildings
+from .pool import build_conninfo
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Канал, в который триггеры пишут об изменениях справочников
+CATALOG_CHANNEL = "catalog_changed"
+
+@dataclass(frozen=True, slots=True)
+class Catalog:
+    """
+    Снимок справочников районов и зданий.
+
+    Attributes:
+        areas: Список названий районов
+        buildings: Список названий зданий
+        areas_text: Список районов в том виде, в котором он подставляется в промпт
+        buildings_text: Список зданий в том виде, в котором он подставляется в промпт
+        version: Хеш содержимого, меняется только при изменении справочников
+        loaded_at: Время загрузки по time.monotonic()
+    """
+    areas: tuple
+    buildings: tuple
+    areas_text: str
+    buildings_text: str
+    version: str
+    loaded_at: float
+
+
+_catalog: Catalog | None = None
+_catalog_lock = asyncio.Lock()
+_listener_task: asyncio.Task | None = None
+# Счетчик сбросов кеша, чтобы не потерять уведомление, пришедшее во время перечитывания
+_generation = 0
+
+
+def build_catalog(areas, buildings):
+    """
+    Сборка снимка справочников с заранее подготовленным текстом для промпта.
+
+    Args:
+        areas: Список названий районов
+        buildings: Список названий зданий
+
+    Returns:
+        Catalog: Снимок справочников
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for name in areas:
+        digest.update(f"a:{name}\0".encode())
+    for name in buildings:
+        digest.update(f"b:{name}\0".encode())
+
+    return Catalog(
+        areas=tuple(areas),
+        buildings=tuple(buildings),
+        areas_text=str(areas),
+        buildings_text=str(buildings),
+        version=digest.hexdigest(),
+        loaded_at=time.monotonic(),
+    )
+
+
+def _is_fresh(catalog):
+    return catalog is not None and time.monotonic() - catalog.loaded_at < proj_settings.catalog_ttl
+
+
+async def get_catalog():
+    """
+    Получение справочников районов и зданий из кеша процесса.
+
+    Таблицы перечитываются не чаще одного раза за catalog_ttl секунд или сразу
+    после уведомления об их изменении. Если перечитать не удалось, продолжает
+    использоваться предыдущий снимок. Пустой результат считается ошибкой
+    загрузки (get_available_* возвращают пустой список при ошибке запроса) и
+    не кешируется: следующий вызов снова обратится к базе.
+
+    Returns:
+        Catalog: Снимок справочников
+    """
+    global _catalog
+
+    catalog = _catalog
+    if _is_fresh(catalog):
+        return catalog
+
+    async with _catalog_lock:
+        if _is_fresh(_catalog):
+            return _catalog
+
+        generation = _generation
+        areas, buildings = await asyncio.gather(get_available_areas(), get_available_buildings())
+
+        loaded = bool(areas) and bool(buildings)
+        if not loaded and _catalog is not None:
+            logger.warning("Не удалось обновить справочники, используется предыдущий снимок")
+            return _catalog
+
+        new_catalog = build_catalog(areas, buildings)
+        if not loaded:
+            logger.warning("Не удалось загрузить справочники, загрузка повторится при следующем обращении")
+            new_catalog = replace(new_catalog, loaded_at=float("-inf"))
+        elif generation != _generation:
+            new_catalog = replace(new_catalog, loaded_at=float("-inf"))
+        if _catalog is None or _catalog.version != new_catalog.version:
+            logger.info(f"Справочники загружены: {len(areas)} районов, {len(buildings)} зданий, "
+                        f"версия {new_catalog.version}")
+        _catalog = new_catalog
+
+    return _catalog
+
+
+def invalidate_catalog():
+    """
+    Сброс кеша справочников: следующий вызов get_catalog перечитает таблицы.
+    """
+    global _catalog, _generation
+
+    _generation += 1
+    if _catalog is not None:
+        _catalog = replace(_catalog, loaded_at=float("-inf"))
+
+
+async def _listen_catalog_changes():
+    """
+    Ожидание уведомлений об изменении справочников с переподключением при обрыве.
+    """
+    while True:
+        try:
+            async with await AsyncConnection.connect(build_conninfo(), autocommit=True) as connection:
+                await connection.execute(f"LISTEN {CATALOG_CHANNEL}")
+                logger.info(f"Подписка на канал {CATALOG_CHANNEL} оформлена")
+                # Изменения, пропущенные во время переподключения, не должны потеряться
+                invalidate_catalog()
+
+                async for notify in connection.notifies():
+                    logger.info(f"Справочник {notify.payload} изменен, кеш сброшен")
+                    invalidate_catalog()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка подписки на изменения справочников: {e}")
+            await asyncio.sleep(proj_settings.catalog_listen_retry_delay)
+
+
+async def start_catalog_listener():
+    """
+    Запуск фоновой подписки на изменения справочников, если она включена в настройках.
+    """
+    global _listener_task
+
+    if proj_settings.catalog_listen and _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_catalog_changes())
+
+
+async def stop_catalog_listener():
+    """
+    Остановка фоновой подписки на изменения справочников.
+    """
+    global _listener_task
+
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
@@ -1,191 +1,665 @@
-import psycopg2
-from psycopg2 import extras
+import asyncio
 import logging
+import re
+import weakref
+from datetime import date, datetime
+from decimal import Decimal
+
+from psycopg import AsyncClientCursor, errors
+from psycopg.rows import dict_row
+
+from .pool import get_pool
+from .units import unit_row
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Параметры подключения к базе данных
-db_params = {
-    "host": "45.159.250.69",
-    "database": "query_ai_test",
-    "user": "query_ai",
-    "password": "AItest!@25",
-    "port": "5432"
+
+# Колонки объекта, которые возвращает поиск, в порядке полей Unit
+UNITS_COLUMNS = """
+        u.id, u.price, u.type_unit, u.purpose, u.completion, 
+        u.handover_date, u.furnishing, u."Studio", u.sqft, 
+        u."Baths", u."Beds", u.view, u.vacant, ag.name as agent_name, ag.whatsapp as agent_whatsapp,
+        b.name as building_name, a.original_name as area_name"""
+
+UNITS_JOINS = """
+    FROM 
+        "Units" u
+    LEFT JOIN 
+        "Buildings" b ON u.building_id = b.id
+    LEFT JOIN 
+        "Areas" a ON u.area_id = a.id
+    LEFT JOIN
+        "Agents" ag on u.agent_id = ag.id
+    """
+
+# Общая часть запроса поиска объектов
+UNITS_FROM = UNITS_JOINS + """WHERE 
+        u.post_status != 'archived'
+    """
+
+UNITS_SELECT = """
+    SELECT """ + UNITS_COLUMNS + "{extra_columns}" + UNITS_FROM
+
+# Название здания для группировки: у объектов без здания - пустая строка
+BUILDING_NAME = "COALESCE(b.name, '')"
+
+# Уровни ослабления критериев поиска
+TIER_ORIGINAL = 0
+TIER_PRICE_INCREASED = 1
+TIER_RENT = 2
+
+# Во сколько раз поднимается максимальная цена на втором уровне
+PRICE_INCREASE_FACTOR = 1.2
+
+
+def _normalize_purpose(purpose):
+    # Преобразование параметров
+    if purpose == 'buy':
+        return 'For sale'
+    if purpose == 'rent':
+        return 'For rent'
+
+    return purpose
+
+
+# Тип каждого параметра канонических запросов, с ним запрос подготавливается (PREPARE)
+TIER_PARAM_TYPES = {"purpose": "text", "price_max": "numeric", "sqft_min": "numeric", "sqft_max": "numeric"}
+
+PARAM_TYPES = {
+    "property_type": "text", "beds": "integer", "price_min": "numeric", "view": "text", "area": "text",
+    "building": "text", "baths": "integer", "furnishing": "text", "vacant": "text", "handover_date": "date",
+    "completion": "text", "t1_enabled": "boolean", "t2_enabled": "boolean", "building_name": "text",
+    "key_price": "numeric", "key_name": "text", "key_id": "integer", "limit": "bigint", "unit_id": "integer",
+    **{f"{prefix}_{name}": param_type for prefix in ("tier", "t0", "t1", "t2")
+       for name, param_type in TIER_PARAM_TYPES.items()},
 }
 
+PARAM_PATTERN = re.compile(r"%\((\w+)\)s")
+
+
+class Statement:
+    """
+    Каноническая форма запроса с именованными параметрами %(name)s.
+
+    Необязательные критерии не меняют текст запроса: каждое условие
+    записано как "параметр IS NULL OR условие", и отсутствующий критерий
+    передается как NULL. Поэтому вариантов текста немного, и каждый из
+    них подготавливается на соединении пула один раз, а дальше
+    выполняется через EXECUTE без повторного разбора.
 
-def get_db_connection():
+    Args:
+        name: Имя подготовленного запроса
+        sql: Текст запроса с именованными параметрами
     """
-    Создание соединения с базой данных PostgreSQL.
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.params = list(dict.fromkeys(PARAM_PATTERN.findall(sql)))
+        positions = {param: index for index, param in enumerate(self.params, start=1)}
+
+        self.prepare_sql = (f"PREPARE {name} ({', '.join(PARAM_TYPES[param] for param in self.params)}) AS "
+                            + PARAM_PATTERN.sub(lambda match: f"${positions[match[1]]}", sql))
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * len(self.params))})" if self.params else f"EXECUTE {name}"
+
+    def values(self, params):
+        """
+        Значения параметров в порядке их номеров в подготовленном запросе.
+
+        Args:
+            params: Словарь значений по имени параметра; отсутствующие передаются как NULL
+
+        Returns:
+            list: Значения для EXECUTE
+        """
+        return [params.get(param) for param in self.params]
+
+
+# Дата готовности из ответа модели: ISO-дата, год и месяц, квартал или год
+HANDOVER_ISO_RE = re.compile(r"^\s*(\d{4})-(\d{1,2})(?:-(\d{1,2}))?\s*$")
+HANDOVER_QUARTER_RES = (
+    re.compile(r"\bq([1-4])\s*[-/,]?\s*((?:19|20)\d\d)\b"),
+    re.compile(r"\b((?:19|20)\d\d)\s*[-/,]?\s*q([1-4])\b"),
+    re.compile(r"\b([1-4])(?:-?(?:й|ый|ой))?\s+(?:квартал\w*|quarter)\s+((?:19|20)\d\d)\b"),
+)
+HANDOVER_YEAR_RE = re.compile(r"\b(?:19|20)\d\d\b")
+
+
+def _first_day_after(year, month):
+    return date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+
+
+def normalize_handover_date(value):
+    """
+    Приведение даты готовности из критериев к границе для условия handover_date < граница.
+
+    Модель возвращает дату свободным текстом. ISO-дата используется как есть,
+    год с месяцем, квартал ("Q4 2025", "4 квартал 2025") и год (в том числе
+    "end of 2026") - как первый день после этого периода, то есть подходят
+    объекты, готовые до его конца. Остальное в поиске не участвует, а не
+    ломает весь запрос.
+
+    Args:
+        value: Значение handover_date из критериев
 
     Returns:
-        connection: Объект соединения с базой данных
+        date | None: Граница даты готовности или None
     """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = str(value).strip().lower()
     try:
-        connection = psycopg2.connect(**db_params)
-        return connection
-    except Exception as e:
-        logger.error(f"Ошибка при подключении к базе данных: {e}")
-        raise
+        match = HANDOVER_ISO_RE.match(text)
+        if match:
+            year, month, day = int(match[1]), int(match[2]), match[3]
+            return date(year, month, int(day)) if day else _first_day_after(year, month)
+
+        for index, pattern in enumerate(HANDOVER_QUARTER_RES):
+            match = pattern.search(text)
+            if match:
+                quarter, year = (match[2], match[1]) if index == 1 else (match[1], match[2])
+                return _first_day_after(int(year), int(quarter) * 3)
+    except ValueError:
+        pass
+    else:
+        years = HANDOVER_YEAR_RE.findall(text)
+        if len(years) == 1:
+            return date(int(years[0]) + 1, 1, 1)
+
+    logger.warning(f"Дата готовности {value!r} не распознана и в поиске не участвует")
+    return None
+
+
+def _given(value):
+    # Пустые значения критериев (None, "", 0) в поиске не участвуют
+    return value if value else None
+
+
+def _common_params(property_type=None, beds=None, area=None, building=None, view=None,
+                   price_min=None, baths=None, furnishing=None, completion=None,
+                   vacant=None, handover_date=None):
+    """
+    Параметры условий поиска, которые не меняются при ослаблении критериев.
+
+    Returns:
+        dict: Значения параметров COMMON_CONDITIONS
+    """
+    return {
+        "property_type": _given(property_type),
+        "beds": _given(beds),
+        "price_min": price_min,
+        "view": _given(view),
+        # ILIKE для нечувствительного к регистру поиска с частичным совпадением
+        "area": f"%{area}%" if area else None,
+        "building": f"%{building}%" if building else None,
+        "baths": _given(baths),
+        "furnishing": _given(furnishing),
+        "vacant": _given(vacant),
+        "handover_date": normalize_handover_date(handover_date),
+        "completion": _given(completion),
+    }
+
+
+# Сравнение без учета регистра идет по нормализованным колонкам *_lower (см. database/migrations.py),
+# чтобы работали обычные индексы
+COMMON_CONDITIONS = """
+        AND (%(property_type)s IS NULL OR u.type_unit_lower = lower(%(property_type)s))
+        AND (%(beds)s IS NULL OR u."Beds" = %(beds)s)
+        AND (%(price_min)s IS NULL OR u.price >= %(price_min)s)
+        AND (%(view)s IS NULL OR u.view_lower = lower(%(view)s))
+        AND (%(area)s IS NULL OR a.original_name ILIKE %(area)s)
+        AND (%(building)s IS NULL OR b.name ILIKE %(building)s)
+        AND (%(baths)s IS NULL OR u."Baths" = %(baths)s)
+        AND (%(furnishing)s IS NULL OR u.furnishing_lower = lower(%(furnishing)s))
+        AND (%(vacant)s IS NULL OR u.vacant_lower = lower(%(vacant)s))
+        AND (%(handover_date)s IS NULL OR u.handover_date < %(handover_date)s)
+        AND (%(completion)s IS NULL OR u.completion = %(completion)s)"""
+
+
+def _tier_levels(purpose=None, price_max=None, sqft_min=None, sqft_max=None):
+    """
+    Уровни ослабления критериев: назначение, цена и площадь на каждом уровне.
+
+    Args:
+        purpose: Назначение после _normalize_purpose
+        price_max: Максимальная цена
+        sqft_min: Минимальная площадь
+        sqft_max: Максимальная площадь
+
+    Returns:
+        list: Пары (уровень, аргументы _tier_params) в порядке предпочтения
+    """
+    levels = [(TIER_ORIGINAL, {"purpose": purpose, "price_max": price_max,
+                               "sqft_min": sqft_min, "sqft_max": sqft_max})]
+
+    if price_max:
+        increased_price_max = price_max * PRICE_INCREASE_FACTOR
+        levels.append((TIER_PRICE_INCREASED, {"purpose": purpose, "price_max": increased_price_max,
+                                              "sqft_min": sqft_min, "sqft_max": sqft_max}))
+
+        if purpose and purpose.lower() == "for sale":
+            levels.append((TIER_RENT, {"purpose": 'For Rent', "price_max": increased_price_max}))
+
+    return levels
+
+
+def _tier_conditions(prefix):
+    """
+    Условия, которые ослабляются на разных уровнях: назначение, цена и площадь.
+
+    Args:
+        prefix: Префикс имен параметров уровня
+
+    Returns:
+        str: Условия, объединенные через AND
+    """
+    return (f"(%({prefix}_price_max)s IS NULL OR u.price <= %({prefix}_price_max)s)"
+            f" AND (%({prefix}_purpose)s IS NULL OR u.purpose_lower = lower(%({prefix}_purpose)s))"
+            f" AND (%({prefix}_sqft_min)s IS NULL OR u.sqft >= %({prefix}_sqft_min)s)"
+            f" AND (%({prefix}_sqft_max)s IS NULL OR u.sqft <= %({prefix}_sqft_max)s)")
+
+
+def _tier_params(prefix, purpose=None, price_max=None, sqft_min=None, sqft_max=None):
+    return {
+        f"{prefix}_purpose": _given(purpose),
+        f"{prefix}_price_max": price_max,
+        f"{prefix}_sqft_min": _given(sqft_min),
+        f"{prefix}_sqft_max": _given(sqft_max),
+    }
+
+
+def _common_criteria(criteria):
+    return {key: value for key, value in criteria.items()
+            if key not in ("purpose", "price_max", "sqft_min", "sqft_max")}
+
+
+def _tiers_params(criteria):
+    """
+    Параметры условий всех уровней ослабления критериев для TIER_COLUMN и TIERS_FILTER.
+
+    Args:
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+
+    Returns:
+        dict: Значения параметров; отсутствующие уровни выключены флагами t1_enabled и t2_enabled
+    """
+    levels = dict(_tier_levels(purpose=_normalize_purpose(criteria.get("purpose")),
+                               price_max=criteria.get("price_max"), sqft_min=criteria.get("sqft_min"),
+                               sqft_max=criteria.get("sqft_max")))
 
+    params = _common_params(**_common_criteria(criteria))
+    for tier in (TIER_ORIGINAL, TIER_PRICE_INCREASED, TIER_RENT):
+        params.update(_tier_params(f"t{tier}", **levels.get(tier, {})))
+    params["t1_enabled"] = TIER_PRICE_INCREASED in levels
+    params["t2_enabled"] = TIER_RENT in levels
 
-def search_database(purpose=None, beds=None, property_type=None, area=None,
-                    building=None, view=None, price_min=None, price_max=None,
-                    baths=None, sqft_min=None, sqft_max=None, furnishing=None,
-                    completion=None, vacant=None, handover_date=None):
+    return params
+
+
+def _tier_filter_params(criteria, tier, building=None):
     """
-    Поиск объектов недвижимости в базе данных по заданным параметрам.
+    Параметры условий поиска для одного уровня и, при необходимости, одного здания.
 
     Args:
-        purpose (str): Назначение (покупка/аренда)
-        beds (int): Количество спален
-        property_type (str): Тип недвижимости
-        area (str): Район
-        building (str): Название здания
-        view (str): Вид из окна
-        price_min (float): Минимальная цена
-        price_max (float): Максимальная цена
-        baths (int): Количество ванных комнат
-        sqft_min (float): Минимальная площадь в квадратных футах
-        sqft_max (float): Максимальная площадь в квадратных футах
-        furnishing (str): Меблировка
-        completion (str): Статус готовности
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+        tier: Уровень ослабления критериев
+        building: Точное название здания ('' - объекты без здания)
 
     Returns:
-        list: Список объектов недвижимости, соответствующих критериям
+        dict: Значения параметров TIER_FILTER
     """
-    # Проверка обязательных параметров
-    if property_type is None or beds is None or price_min is None or price_max is None:
+    levels = dict(_tier_levels(purpose=_normalize_purpose(criteria.get("purpose")),
+                               price_max=criteria.get("price_max"), sqft_min=criteria.get("sqft_min"),
+                               sqft_max=criteria.get("sqft_max")))
+
+    return {**_common_params(**_common_criteria(criteria)), **_tier_params("tier", **levels[tier]),
+            "building_name": building}
+
+
+# Номер лучшего уровня, на котором подходит строка, и фильтр по всем уровням
+TIER_COLUMN = (f"CASE WHEN {_tier_conditions('t0')} THEN {TIER_ORIGINAL}"
+               f" WHEN %(t1_enabled)s AND {_tier_conditions('t1')} THEN {TIER_PRICE_INCREASED}"
+               f" WHEN %(t2_enabled)s AND {_tier_conditions('t2')} THEN {TIER_RENT} END")
+TIERS_FILTER = (f" AND (({_tier_conditions('t0')}) OR (%(t1_enabled)s AND {_tier_conditions('t1')})"
+                f" OR (%(t2_enabled)s AND {_tier_conditions('t2')}))")
+
+# Условия одного уровня и, если передано, одного здания
+TIER_FILTER = (COMMON_CONDITIONS + f" AND {_tier_conditions('tier')}"
+               f" AND (%(building_name)s IS NULL OR {BUILDING_NAME} = %(building_name)s)")
+
+COUNT_STATEMENT = Statement("bot_count", (
+    f"WITH matched AS (SELECT {TIER_COLUMN} AS tier, {BUILDING_NAME} AS building_name"
+    + UNITS_FROM + COMMON_CONDITIONS + TIERS_FILTER
+    + ") SELECT tier, count(*) AS units, count(DISTINCT building_name) AS buildings FROM matched"
+    " WHERE tier = (SELECT min(tier) FROM matched) GROUP BY tier"
+))
+
+COUNT_UNITS_STATEMENT = Statement("bot_count_units", "SELECT count(*) AS units" + UNITS_FROM + TIER_FILTER)
+
+# Страница зданий - сводка по объектам каждого здания, сами объекты загружаются при открытии здания.
+# Постраничная выборка по ключу: вперед - после ключа по возрастанию,
+# назад - перед ключом по убыванию. Без ключа - первая или последняя страница
+# Здания с одинаковой минимальной ценой упорядочиваются по кодам символов названия, как str в Python,
+# а не по правилам сортировки базы - так страницы совпадают со снимком в памяти
+BUILDING_ORDER = f'{BUILDING_NAME} COLLATE "C"'
+BUILDINGS_KEY = f"(min(u.price), {BUILDING_ORDER})"
+BUILDINGS_PAGE = (
+    f"SELECT {BUILDING_NAME} AS building, count(*) AS units, min(u.price) AS min_price, max(u.price) AS max_price"
+    + UNITS_FROM + TIER_FILTER
+    + f" GROUP BY {BUILDING_NAME} HAVING (%(key_price)s IS NULL OR {BUILDINGS_KEY} {{operator}} (%(key_price)s, %(key_name)s))"
+    f" ORDER BY min(u.price) {{order}}, {BUILDING_ORDER} {{order}} LIMIT %(limit)s"
+)
+BUILDINGS_PAGE_STATEMENTS = {
+    False: Statement("bot_buildings_page", BUILDINGS_PAGE.format(operator=">", order="ASC")),
+    True: Statement("bot_buildings_page_reverse", BUILDINGS_PAGE.format(operator="<", order="DESC")),
+}
+
+UNITS_PAGE = (
+    UNITS_SELECT.format(extra_columns="") + TIER_FILTER
+    + " AND (%(key_price)s IS NULL OR (u.price, u.id) {operator} (%(key_price)s, %(key_id)s))"
+    " ORDER BY u.price {order}, u.id {order} LIMIT %(limit)s"
+)
+UNITS_PAGE_STATEMENTS = {
+    False: Statement("bot_units_page", UNITS_PAGE.format(operator=">", order="ASC")),
+    True: Statement("bot_units_page_reverse", UNITS_PAGE.format(operator="<", order="DESC")),
+}
+
+GET_UNIT_STATEMENT = Statement("bot_get_unit", UNITS_SELECT.format(extra_columns="") + " AND u.id = %(unit_id)s")
+
+# Все канонические запросы, которые prepare_statements готовит при запуске
+STATEMENTS = (COUNT_STATEMENT, COUNT_UNITS_STATEMENT, *BUILDINGS_PAGE_STATEMENTS.values(),
+              *UNITS_PAGE_STATEMENTS.values(), GET_UNIT_STATEMENT)
+
+
+async def _fetch_all(query, params, row_factory=dict_row):
+    # Получение соединения из пула
+    pool = await get_pool()
+    async with pool.connection() as connection:
+        async with connection.cursor(row_factory=row_factory) as cursor:
+            # Выполнение запроса
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+
+# Имена запросов, уже подготовленных на каждом соединении пула
+_prepared = weakref.WeakKeyDictionary()
+
+
+async def _execute_prepared(connection, statement, params, row_factory=dict_row):
+    prepared = _prepared.setdefault(connection, set())
+    if statement.name not in prepared:
+        await connection.execute(statement.prepare_sql, prepare=False)
+        prepared.add(statement.name)
+
+    # Аргументы EXECUTE подставляются в текст на клиенте: типы параметров сервер берет из PREPARE
+    async with AsyncClientCursor(connection, row_factory=row_factory) as cursor:
+        await cursor.execute(statement.execute_sql, statement.values(params))
+        return await cursor.fetchall()
+
+
+async def _fetch_prepared(statement, params, row_factory=dict_row):
+    """
+    Выполнение канонического запроса, подготовленного на соединении пула.
+
+    Args:
+        statement: Statement
+        params: Значения параметров по имени
+        row_factory: Фабрика строк psycopg, по умолчанию - словари
+
+    Returns:
+        list: Строки результата
+    """
+    pool = await get_pool()
+    async with pool.connection() as connection:
+        try:
+            return await _execute_prepared(connection, statement, params, row_factory)
+        except errors.InvalidSqlStatementName:
+            # Подготовленные запросы сброшены на сервере (DISCARD ALL или пулер соединений)
+            await connection.rollback()
+            _prepared.pop(connection, None)
+            return await _execute_prepared(connection, statement, params, row_factory)
+
+
+async def _prepare_connection(connection):
+    prepared = _prepared.setdefault(connection, set())
+    try:
+        for statement in STATEMENTS:
+            if statement.name not in prepared:
+                await connection.execute(statement.prepare_sql, prepare=False)
+                prepared.add(statement.name)
+    finally:
+        # PREPARE не откатывается вместе с транзакцией, а соединение возвращается в пул без нее
+        await connection.rollback()
+
+
+async def prepare_statements():
+    """
+    Подготовка всех канонических запросов на соединениях пула при запуске бота.
+
+    Пул открывается, если еще не открыт, и каждое из его min_size соединений
+    получает все запросы сразу, поэтому первые поиски пользователей не тратят
+    время на PREPARE. Соединения, которые пул откроет позже, готовят запросы
+    при первом использовании, как и раньше.
+
+    Returns:
+        int: Количество подготовленных соединений
+    """
+    pool = await get_pool()
+    # Все соединения удерживаются до конца подготовки, поэтому каждое из них разное
+    connections = [await pool.getconn() for _ in range(pool.min_size)]
+    try:
+        await asyncio.gather(*(_prepare_connection(connection) for connection in connections))
+    finally:
+        for connection in connections:
+            await pool.putconn(connection)
+
+    return len(connections)
+
+
+def _has_required(criteria):
+    return not (criteria.get("property_type") is None or criteria.get("beds") is None
+                or criteria.get("price_min") is None or criteria.get("price_max") is None)
+
+
+def count_search_query(criteria):
+    """
+    Запрос выбора лучшего уровня ослабления критериев с подсчетом найденного.
+
+    Args:
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+
+    Returns:
+        tuple: Текст запроса с именованными параметрами и словарь параметров к нему
+    """
+    return COUNT_STATEMENT.sql, _tiers_params(criteria)
+
+
+async def count_search_results(criteria):
+    """
+    Выбор лучшего непустого уровня ослабления критериев и подсчет найденного.
+
+    Строки объектов не передаются: запрос возвращает только уровень и
+    количество объектов и зданий на нем.
+
+    Args:
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+
+    Returns:
+        tuple: Уровень (None, если ничего не найдено), количество объектов и количество зданий
+    """
+    if not _has_required(criteria):
         logger.error("Отсутствуют обязательные параметры: type_unit, Beds, price_min, price_max")
-        return []
+        return None, 0, 0
 
-    # Преобразование параметров
-    if purpose == 'buy':
-        purpose = 'For sale'
-    elif purpose == 'rent':
-        purpose = 'For rent'
+    try:
+        results = await _fetch_prepared(COUNT_STATEMENT, _tiers_params(criteria))
+    except Exception as e:
+        logger.error(f"Ошибка при выполнении запроса: {e}")
+        return None, 0, 0
 
-    # Начало построения SQL запроса
-    query = """
-    SELECT 
-        u.id, u.price, u.type_unit, u.purpose, u.completion, 
-        u.handover_date, u.furnishing, u."Studio", u.sqft, 
-        u."Baths", u."Beds", u.view, u.vacant, ag.name as agent_name, ag.whatsapp as agent_whatsapp,
-        b.name as building_name, a.original_name as area_name
-    FROM 
-        "Units" u
-    LEFT JOIN 
-        "Buildings" b ON u.building_id = b.id
-    LEFT JOIN 
-        "Areas" a ON u.area_id = a.id
-    LEFT JOIN
-        "Agents" ag on u.agent_id = ag.id
-    WHERE 
-        u.post_status != 'archived'
+    if not results:
+        return None, 0, 0
+
+    return results[0]["tier"], results[0]["units"], results[0]["buildings"]
+
+
+async def count_units(criteria, tier, building=None):
     """
+    Количество объектов на заданном уровне, при необходимости - в одном здании.
 
-    # Список параметров для подготовленного запроса
-    params = []
+    Args:
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+        tier: Уровень ослабления критериев
+        building: Точное название здания
 
-    # Добавление условий поиска
-    if property_type:
-        query += " AND u.type_unit ILIKE %s"
-        params.append(property_type)
+    Returns:
+        int: Количество объектов
+    """
+    try:
+        results = await _fetch_prepared(COUNT_UNITS_STATEMENT, _tier_filter_params(criteria, tier, building))
+    except Exception as e:
+        logger.error(f"Ошибка при выполнении запроса: {e}")
+        return 0
 
+    return results[0]["units"]
 
-    if beds:
-        query +=  ' AND u."Beds" = %s'
-        params.append(beds)
 
-    if price_min is not None:
-        query += " AND u.price >= %s"
-        params.append(price_min)
+def _keyset_params(key):
+    # Цена хранится в состоянии строкой, чтобы не терять точность при сериализации
+    return Decimal(key[0]), key[1]
 
-    if price_max is not None:
-        query += " AND u.price <= %s"
-        params.append(price_max)
 
-    if purpose:
-        query += " AND u.purpose ILIKE %s"
-        params.append(purpose)
+def _page_params(after=None, before=None, from_end=False):
+    """
+    Ключ и направление постраничной выборки.
 
-    if view:
-        query += " AND u.view ILIKE %s"
-        params.append(view)
+    Args:
+        after: Ключ последней строки предыдущей страницы, чтобы получить следующую
+        before: Ключ первой строки текущей страницы, чтобы получить предыдущую
+        from_end: Выбрать последнюю страницу
 
-    if area:
-        query += " AND a.original_name ILIKE %s"
-        params.append(f"%{area}%")  # ILIKE для нечувствительного к регистру поиска с частичным совпадением
+    Returns:
+        tuple: Цена и второй элемент ключа (или None) и признак обратного порядка строк
+    """
+    if after is not None:
+        return _keyset_params(after), False
+    if before is not None:
+        return _keyset_params(before), True
 
-    if building:
-        query += " AND b.name ILIKE %s"
-        params.append(f"%{building}%")  # ILIKE для нечувствительного к регистру поиска с частичным совпадением
+    return (None, None), from_end
 
-    # Дополнительные параметры поиска
-    if baths:
-        query += ' AND u."Baths" = %s'
-        params.append(baths)
 
-    if sqft_min:
-        query += " AND u.sqft >= %s"
-        params.append(sqft_min)
+def buildings_page_query(criteria, tier, limit, after=None, before=None, from_end=False):
+    """
+    Запрос страницы зданий, аргументы те же, что у search_buildings_page.
 
-    if sqft_max:
-        query += " AND u.sqft <= %s"
-        params.append(sqft_max)
+    Returns:
+        tuple: Текст запроса с именованными параметрами, словарь параметров и признак обратного порядка строк
+    """
+    (key_price, key_name), reverse = _page_params(after, before, from_end)
+    params = {**_tier_filter_params(criteria, tier), "key_price": key_price, "key_name": key_name, "limit": limit}
 
-    if furnishing:
-        query += " AND u.furnishing ILIKE %s"
-        params.append(furnishing)
+    return BUILDINGS_PAGE_STATEMENTS[reverse].sql, params, reverse
 
-    if vacant:
-        query += " AND u.vacant ILIKE %s"
-        params.append(vacant)
 
-    if furnishing:
-        query += " AND u.handover_date < %s"
-        params.append(handover_date)
+async def search_buildings_page(criteria, tier, limit, after=None, before=None, from_end=False):
+    """
+    Страница зданий с подходящими объектами, упорядоченных по самому дешевому объекту.
 
-    if completion:
-        query += " AND u.completion = %s"
-        params.append(completion)
+    Строки объектов не передаются: для каждого здания база возвращает
+    только количество подходящих объектов и диапазон их цен.
 
-    # Сортировка результатов по цене
-    query += " ORDER BY u.price ASC"
+    Args:
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+        tier: Уровень ослабления критериев
+        limit: Размер страницы
+        after: Ключ [цена, название] последнего здания предыдущей страницы
+        before: Ключ [цена, название] первого здания следующей страницы
+        from_end: Выбрать последнюю страницу
 
-    print(query)
+    Returns:
+        list: Словари с ключами building, units, min_price и max_price
+    """
+    _, params, reverse = buildings_page_query(criteria, tier, limit, after, before, from_end)
 
     try:
-        # Получение соединения с базой данных
-        connection = get_db_connection()
-        with connection:
-            with connection.cursor(cursor_factory=extras.RealDictCursor) as cursor:
-                # Выполнение запроса
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-
-                # Преобразование результатов в список словарей
-                properties = []
-                for row in results:
-                    # Преобразование строк RealDictRow в обычные словари
-                    property_dict = dict(row)
-
-                    # Переименование ключей для соответствия ожидаемому формату
-                    property_dict['building'] = property_dict.pop('building_name')
-                    property_dict['area'] = property_dict.pop('area_name')
-
-                    properties.append(property_dict)
-
-                return properties
+        results = await _fetch_prepared(BUILDINGS_PAGE_STATEMENTS[reverse], params)
     except Exception as e:
         logger.error(f"Ошибка при выполнении запроса: {e}")
         return []
 
+    return results[::-1] if reverse else results
+
 
-def get_available_areas():
+def units_page_query(criteria, tier, building, limit, after=None, before=None, from_end=False):
+    """
+    Запрос страницы объектов здания, аргументы те же, что у search_units_page.
+
+    Returns:
+        tuple: Текст запроса с именованными параметрами, словарь параметров и признак обратного порядка строк
+    """
+    (key_price, key_id), reverse = _page_params(after, before, from_end)
+    params = {**_tier_filter_params(criteria, tier, building), "key_price": key_price, "key_id": key_id,
+              "limit": limit}
+
+    return UNITS_PAGE_STATEMENTS[reverse].sql, params, reverse
+
+
+async def search_units_page(criteria, tier, building, limit, after=None, before=None, from_end=False):
+    """
+    Страница объектов одного здания, упорядоченных по цене.
+
+    Args:
+        criteria: Критерии поиска по именам аргументов _common_params и _tier_levels
+        tier: Уровень ослабления критериев
+        building: Точное название здания
+        limit: Размер страницы
+        after: Ключ [цена, id] последнего объекта предыдущей страницы
+        before: Ключ [цена, id] первого объекта следующей страницы
+        from_end: Выбрать последнюю страницу
+
+    Returns:
+        list: Объекты Unit
+    """
+    _, params, reverse = units_page_query(criteria, tier, building, limit, after, before, from_end)
+
+    try:
+        results = await _fetch_prepared(UNITS_PAGE_STATEMENTS[reverse], params, unit_row)
+    except Exception as e:
+        logger.error(f"Ошибка при выполнении запроса: {e}")
+        return []
+
+    return results[::-1] if reverse else results
+
+
+async def get_unit(unit_id):
+    """
+    Получение одного объекта недвижимости по идентификатору.
+
+    Args:
+        unit_id: Идентификатор объекта
+
+    Returns:
+        Unit | None: Объект недвижимости или None, если он не найден
+    """
+    try:
+        results = await _fetch_prepared(GET_UNIT_STATEMENT, {"unit_id": unit_id}, unit_row)
+    except Exception as e:
+        logger.error(f"Ошибка при выполнении запроса: {e}")
+        return None
+
+    return results[0] if results else None
+
+
+async def get_available_areas():
     """
     Получение списка всех доступных районов.
 
@@ -199,18 +673,18 @@ def get_available_areas():
     """
 
     try:
-        connection = get_db_connection()
-        with connection:
-            with connection.cursor() as cursor:
-                cursor.execute(query)
-                results = cursor.fetchall()
+        pool = await get_pool()
+        async with pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query)
+                results = await cursor.fetchall()
                 return [row[0] for row in results]
     except Exception as e:
         logger.error(f"Ошибка при получении списка районов: {e}")
         return []
 
 
-def get_available_buildings():
+async def get_available_buildings():
     """
     Получение списка всех доступных зданий.
 
@@ -224,11 +698,11 @@ def get_available_buildings():
     """
 
     try:
-        connection = get_db_connection()
-        with connection:
-            with connection.cursor() as cursor:
-                cursor.execute(query)
-                results = cursor.fetchall()
+        pool = await get_pool()
+        async with pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query)
+                results = await cursor.fetchall()
                 return [row[0] for row in results]
     except Exception as e:
         logger.error(f"Ошибка при получении списка зданий: {e}")
@@ -238,22 +712,22 @@ def get_available_buildings():
 
 
 # Пример использования
-if __name__ == "__main__":
+async def _example():
     #Пример поиска квартиры
-    properties = search_database(
-        beds=2,
-        property_type="Apartment",
-        price_min=4000000,
-        price_max=9000000
-    )
-
-    print(f"Найдено объектов: {len(properties)}")
-
-    for prop in properties:
-        print(prop)
-        print(f"ID: {prop['id']}, Цена: {prop['price']}, "
-              f"Здание: {prop['building']}, Район: {prop['area']}")
-    # areas = get_available_areas()
-    # buildings = get_available_buildings()
+    criteria = dict(beds=2, property_type="Apartment", price_min=4000000, price_max=9000000)
+    tier, units, buildings = await count_search_results(criteria)
+
+    print(f"Найдено объектов: {units}, зданий: {buildings}")
+
+    if tier is not None:
+        for building in await search_buildings_page(criteria, tier, limit=10):
+            print(f"Здание: {building['building']}, объектов: {building['units']}, "
+                  f"цены: {building['min_price']} - {building['max_price']}")
+    # areas = await get_available_areas()
+    # buildings = await get_available_buildings()
     # print(areas)
-    # print(buildings)
\ No newline at end of file
+    # print(buildings)
+
+
+if __name__ == "__main__":
+    asyncio.run(_example())
\ No newline at end of file
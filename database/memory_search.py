@@ -0,0 +1,472 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from psycopg.rows import tuple_row
+
+from loader import proj_settings
+from .catalog import get_catalog
+from .database_handler import (UNITS_COLUMNS, UNITS_JOINS, UNITS_SELECT, _fetch_all, _normalize_purpose, _tier_levels,
+                               normalize_handover_date)
+from .units import UNIT_SIZE, Unit
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_QUERY = UNITS_SELECT.format(extra_columns=", u.post_status, u.updated_at")
+
+# Архивные объекты тоже выбираются, чтобы удалить их из снимка
+CHANGES_QUERY = "SELECT " + UNITS_COLUMNS + ", u.post_status, u.updated_at" + UNITS_JOINS + "WHERE u.updated_at > %s"
+
+ACTIVE_UNITS_QUERY = "SELECT count(*) AS units FROM \"Units\" u WHERE u.post_status != 'archived'"
+
+# Изменения перечитываются с запасом: updated_at - время начала транзакции,
+# и транзакция, начатая раньше последнего обновления, может закоммититься позже
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# Доля удаленных строк, после которой колонки перестраиваются без них
+COMPACT_RATIO = 0.2
+
+# Поля, которые поиск сравнивает без учета регистра, и поля с точным сравнением
+LOWER_CATEGORIES = ("type_unit", "purpose", "view", "furnishing", "vacant")
+EXACT_CATEGORIES = ("completion", "building", "area")
+
+
+def _float(value):
+    return np.nan if value is None else float(value)
+
+
+def _category_value(name, unit):
+    value = getattr(unit, name)
+    if name in LOWER_CATEGORIES and value is not None:
+        return value.lower()
+    # Объекты без здания группируются под пустым названием, как COALESCE(b.name, '') в SQL
+    if name == "building" and value is None:
+        return ""
+
+    return value
+
+
+class ListingsSnapshot:
+    """
+    Снимок активных объектов в памяти процесса для поиска без запросов к базе.
+
+    Числовые поля хранятся в массивах NumPy, строковые - в виде кодов
+    словаря. Условия поиска совпадают с SQL из database_handler, включая
+    ослабление критериев по уровням, а сортировка - с ORDER BY (price, id).
+    Сами объекты хранятся как Unit и отдаются из снимка без копирования.
+    """
+
+    def __init__(self):
+        self._reset_columns()
+        self.watermark = None
+        self.catalog_version = None
+        self.loaded_at = time.monotonic()
+
+    def _reset_columns(self):
+        self.rows = []
+        self.positions = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.price = np.zeros(0, dtype=np.float64)
+        self.sqft = np.zeros(0, dtype=np.float64)
+        self.beds = np.zeros(0, dtype=np.float64)
+        self.baths = np.zeros(0, dtype=np.float64)
+        self.handover = np.zeros(0, dtype="datetime64[D]")
+        self.codes = {name: np.zeros(0, dtype=np.int32) for name in LOWER_CATEGORIES + EXACT_CATEGORIES}
+        self.dictionaries = {name: [] for name in self.codes}
+        self._lookup = {name: {} for name in self.codes}
+
+    @property
+    def size(self):
+        return len(self.positions)
+
+    def _encode(self, name, value):
+        if value is None:
+            return -1
+
+        lookup = self._lookup[name]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self.dictionaries[name])
+            lookup[value] = code
+            self.dictionaries[name].append(value)
+
+        return code
+
+    def _append(self, units):
+        self.positions.update((unit.id, len(self.rows) + index) for index, unit in enumerate(units))
+        self.rows.extend(units)
+        self.alive = np.concatenate([self.alive, np.ones(len(units), dtype=bool)])
+        self.ids = np.concatenate([self.ids, np.array([unit.id for unit in units], dtype=np.int64)])
+        self.price = np.concatenate([self.price, np.array([_float(unit.price) for unit in units])])
+        self.sqft = np.concatenate([self.sqft, np.array([_float(unit.sqft) for unit in units])])
+        self.beds = np.concatenate([self.beds, np.array([_float(unit.beds) for unit in units])])
+        self.baths = np.concatenate([self.baths, np.array([_float(unit.baths) for unit in units])])
+        self.handover = np.concatenate([self.handover, np.array(
+            [unit.handover_date or "NaT" for unit in units], dtype="datetime64[D]")])
+        for name in self.codes:
+            values = np.array([self._encode(name, _category_value(name, unit)) for unit in units], dtype=np.int32)
+            self.codes[name] = np.concatenate([self.codes[name], values])
+
+    def _write(self, position, unit):
+        self.rows[position] = unit
+        self.price[position] = _float(unit.price)
+        self.sqft[position] = _float(unit.sqft)
+        self.beds[position] = _float(unit.beds)
+        self.baths[position] = _float(unit.baths)
+        self.handover[position] = unit.handover_date or "NaT"
+        for name in self.codes:
+            self.codes[name][position] = self._encode(name, _category_value(name, unit))
+
+    def _compact(self):
+        rows = [self.rows[position] for position in np.flatnonzero(self.alive)]
+        self._reset_columns()
+        self._append(rows)
+
+    def apply(self, rows):
+        """
+        Применение новых и измененных объектов к снимку.
+
+        Args:
+            rows: Кортежи строк запроса SNAPSHOT_QUERY или CHANGES_QUERY
+        """
+        new_units = []
+        for row in rows:
+            # После колонок объекта идут post_status и updated_at
+            unit = Unit._make(row[:UNIT_SIZE])
+            archived = row[UNIT_SIZE] == "archived"
+            updated_at = row[UNIT_SIZE + 1]
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+
+            position = self.positions.get(unit.id)
+
+            if archived:
+                if position is not None:
+                    self.alive[position] = False
+                    del self.positions[unit.id]
+            elif position is not None:
+                self._write(position, unit)
+            else:
+                new_units.append(unit)
+
+        if new_units:
+            self._append(new_units)
+
+        if len(self.rows) and 1 - self.size / len(self.rows) > COMPACT_RATIO:
+            self._compact()
+
+    def _code(self, name, value):
+        return self._lookup[name].get(value.lower() if name in LOWER_CATEGORIES else value)
+
+    def _equals(self, name, value):
+        code = self._code(name, value)
+        if code is None:
+            return np.zeros(len(self.rows), dtype=bool)
+
+        return self.codes[name] == code
+
+    def _contains(self, name, value):
+        # Аналог ILIKE '%value%' по небольшому словарю названий
+        value = value.lower()
+        # Последний элемент таблицы соответствует коду -1 (NULL) и всегда False
+        matches = np.zeros(len(self.dictionaries[name]) + 1, dtype=bool)
+        matches[:-1] = [value in name_value.lower() for name_value in self.dictionaries[name]]
+
+        return matches[self.codes[name]]
+
+    def _common_mask(self, property_type=None, beds=None, area=None, building=None, view=None,
+                     price_min=None, baths=None, furnishing=None, completion=None,
+                     vacant=None, handover_date=None):
+        # Те же условия, что в COMMON_CONDITIONS
+        mask = self.alive.copy()
+
+        if property_type:
+            mask &= self._equals("type_unit", property_type)
+        if beds:
+            mask &= self.beds == beds
+        if price_min is not None:
+            mask &= self.price >= price_min
+        if view:
+            mask &= self._equals("view", view)
+        if area:
+            mask &= self._contains("area", area)
+        if building:
+            mask &= self._contains("building", building)
+        if baths:
+            mask &= self.baths == baths
+        if furnishing:
+            mask &= self._equals("furnishing", furnishing)
+        if vacant:
+            mask &= self._equals("vacant", vacant)
+        handover_date = normalize_handover_date(handover_date)
+        if handover_date:
+            # Объекты без даты готовности, как и NULL в SQL, не подходят
+            mask &= self.handover < np.datetime64(handover_date, "D")
+        if completion:
+            mask &= self._equals("completion", completion)
+
+        return mask
+
+    def _tier_mask(self, purpose=None, price_max=None, sqft_min=None, sqft_max=None):
+        # Те же условия, что в _tier_conditions уровня
+        mask = np.ones(len(self.rows), dtype=bool)
+
+        if price_max is not None:
+            mask &= self.price <= price_max
+        if purpose:
+            mask &= self._equals("purpose", purpose)
+        if sqft_min:
+            mask &= self.sqft >= sqft_min
+        if sqft_max:
+            mask &= self.sqft <= sqft_max
+
+        return mask
+
+    def _tier_masks(self, purpose=None, price_max=None, sqft_min=None, sqft_max=None, **common):
+        common_mask = self._common_mask(**common)
+        for tier, conditions in _tier_levels(purpose=_normalize_purpose(purpose), price_max=price_max,
+                                             sqft_min=sqft_min, sqft_max=sqft_max):
+            yield tier, common_mask & self._tier_mask(**conditions)
+
+    def _filter(self, criteria, tier, building=None):
+        mask = next(mask for level, mask in self._tier_masks(**criteria) if level == tier)
+        if building is not None:
+            code = self._code("building", building)
+            mask &= self.codes["building"] == (-1 if code is None else code)
+
+        return mask
+
+    def _sorted_positions(self, mask):
+        positions = np.flatnonzero(mask)
+        return positions[np.lexsort((self.ids[positions], self.price[positions]))]
+
+    def _rows(self, positions):
+        # Unit неизменяем, поэтому объекты снимка отдаются без копирования
+        return [self.rows[position] for position in positions]
+
+    def count_search_results(self, criteria):
+        """
+        Аналог count_search_results из database_handler.
+
+        Returns:
+            tuple: Уровень (None, если ничего не найдено), количество объектов и количество зданий
+        """
+        if (criteria.get("property_type") is None or criteria.get("beds") is None
+                or criteria.get("price_min") is None or criteria.get("price_max") is None):
+            logger.error("Отсутствуют обязательные параметры: type_unit, Beds, price_min, price_max")
+            return None, 0, 0
+
+        try:
+            for tier, mask in self._tier_masks(**criteria):
+                units = int(mask.sum())
+                if units:
+                    return tier, units, len(np.unique(self.codes["building"][mask]))
+        except ValueError as e:
+            logger.error(f"Ошибка при поиске в памяти: {e}")
+
+        return None, 0, 0
+
+    def count_units(self, criteria, tier, building=None):
+        """
+        Аналог count_units из database_handler.
+
+        Returns:
+            int: Количество объектов
+        """
+        try:
+            return int(self._filter(criteria, tier, building).sum())
+        except ValueError as e:
+            logger.error(f"Ошибка при поиске в памяти: {e}")
+            return 0
+
+    def buildings_page(self, criteria, tier, limit, after=None, before=None, from_end=False):
+        """
+        Аналог search_buildings_page из database_handler.
+
+        Returns:
+            list: Словари с ключами building, units, min_price и max_price
+        """
+        try:
+            positions = self._sorted_positions(self._filter(criteria, tier))
+        except ValueError as e:
+            logger.error(f"Ошибка при поиске в памяти: {e}")
+            return []
+
+        # Первое вхождение здания в отсортированных по цене строках - его самый дешевый объект,
+        # последнее - самый дорогой; коды зданий в обоих вызовах np.unique идут в одном порядке
+        codes = self.codes["building"][positions]
+        _, first, counts = np.unique(codes, return_index=True, return_counts=True)
+        _, last = np.unique(codes[::-1], return_index=True)
+        last = len(codes) - 1 - last
+        # Объекты без здания попадают под пустым названием, как COALESCE(b.name, '') в BUILDINGS_PAGE
+        buildings = sorted((self.price[positions[low]], _category_value("building", self.rows[positions[low]]),
+                            self.rows[positions[low]].price, int(units), self.rows[positions[high]].price)
+                           for low, high, units in zip(first, last, counts))
+
+        if after is not None:
+            key = (float(Decimal(after[0])), after[1])
+            buildings = [building for building in buildings if building[:2] > key][:limit]
+        elif before is not None:
+            key = (float(Decimal(before[0])), before[1])
+            buildings = [building for building in buildings if building[:2] < key][-limit:]
+        elif from_end:
+            buildings = buildings[-limit:]
+        else:
+            buildings = buildings[:limit]
+
+        return [{"building": name, "units": units, "min_price": min_price, "max_price": max_price}
+                for _, name, min_price, units, max_price in buildings]
+
+    def units_page(self, criteria, tier, building, limit, after=None, before=None, from_end=False):
+        """
+        Аналог search_units_page из database_handler.
+
+        Returns:
+            list: Объекты Unit
+        """
+        try:
+            positions = self._sorted_positions(self._filter(criteria, tier, building))
+        except ValueError as e:
+            logger.error(f"Ошибка при поиске в памяти: {e}")
+            return []
+
+        price, ids = self.price[positions], self.ids[positions]
+        if after is not None:
+            key_price, key_id = float(Decimal(after[0])), after[1]
+            positions = positions[(price > key_price) | ((price == key_price) & (ids > key_id))][:limit]
+        elif before is not None:
+            key_price, key_id = float(Decimal(before[0])), before[1]
+            positions = positions[(price < key_price) | ((price == key_price) & (ids < key_id))][-limit:]
+        elif from_end:
+            positions = positions[-limit:]
+        else:
+            positions = positions[:limit]
+
+        return self._rows(positions)
+
+    def get_unit(self, unit_id):
+        """
+        Аналог get_unit из database_handler.
+
+        Returns:
+            Unit | None: Объект недвижимости или None, если его нет в снимке
+        """
+        position = self.positions.get(unit_id)
+        if position is None:
+            return None
+
+        return self._rows([position])[0]
+
+
+_snapshot: ListingsSnapshot | None = None
+_refresh_task: asyncio.Task | None = None
+
+
+def get_snapshot():
+    """
+    Текущий снимок объектов, если поиск в памяти включен и снимок загружен.
+
+    Returns:
+        ListingsSnapshot | None: Снимок или None, если поиск должен идти через базу
+    """
+    return _snapshot if proj_settings.memory_search_enabled else None
+
+
+async def load_snapshot():
+    """
+    Полная загрузка активных объектов в новый снимок.
+
+    Колонки нового снимка строятся в отдельном потоке: на сотне тысяч объектов
+    это секунды, которые иначе останавливали бы обработку обновлений. Поиск
+    до замены ссылки на снимок идет по прежнему снимку.
+
+    Returns:
+        ListingsSnapshot: Загруженный снимок
+    """
+    catalog = await get_catalog()
+    rows = await _fetch_all(SNAPSHOT_QUERY, [], tuple_row)
+    snapshot = ListingsSnapshot()
+    await asyncio.to_thread(snapshot.apply, rows)
+    snapshot.catalog_version = catalog.version
+
+    return snapshot
+
+
+async def refresh_snapshot():
+    """
+    Обновление снимка: только измененные с прошлого раза объекты, а полная
+    перезагрузка - при первом запуске, смене справочников, расхождении числа
+    объектов (их удалили из таблицы) или раз в memory_search_full_reload_interval.
+    """
+    global _snapshot
+
+    catalog = await get_catalog()
+    snapshot = _snapshot
+
+    if (snapshot is None or snapshot.watermark is None or snapshot.catalog_version != catalog.version
+            or time.monotonic() - snapshot.loaded_at > proj_settings.memory_search_full_reload_interval):
+        started = time.perf_counter()
+        _snapshot = await load_snapshot()
+        logger.info(f"Снимок объектов загружен: {_snapshot.size} объектов "
+                    f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return
+
+    changes = await _fetch_all(CHANGES_QUERY, [snapshot.watermark - REFRESH_OVERLAP], tuple_row)
+    snapshot.apply(changes)
+
+    active = (await _fetch_all(ACTIVE_UNITS_QUERY, []))[0]["units"]
+    if active != snapshot.size:
+        logger.info(f"В снимке {snapshot.size} объектов, в базе {active}, снимок перезагружается")
+        _snapshot = await load_snapshot()
+
+
+async def _refresh_periodically():
+    while True:
+        await asyncio.sleep(proj_settings.memory_search_refresh_interval)
+        try:
+            await refresh_snapshot()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка обновления снимка объектов: {e}")
+
+
+async def start_memory_search():
+    """
+    Загрузка снимка и запуск его фонового обновления, если поиск в памяти включен.
+
+    Пока снимок не загружен, поиск идет через базу данных.
+    """
+    global _refresh_task
+
+    if not proj_settings.memory_search_enabled or _refresh_task is not None:
+        return
+
+    try:
+        await refresh_snapshot()
+    except Exception as e:
+        logger.error(f"Не удалось загрузить снимок объектов, поиск идет через базу: {e}")
+
+    _refresh_task = asyncio.create_task(_refresh_periodically())
+
+
+async def stop_memory_search():
+    """
+    Остановка фонового обновления снимка.
+    """
+    global _refresh_task
+
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from psycopg import AsyncConnection
+
+from loader import proj_settings
+from .catalog import CATALOG_CHANNEL
+from .pool import build_conninfo
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы несколько запущенных ботов не применяли миграции одновременно
+MIGRATIONS_LOCK_ID = 7_340_001
+
+MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version integer PRIMARY KEY,
+    description text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    """
+    Одна версия схемы базы данных.
+
+    Attributes:
+        version: Номер версии, миграции применяются по возрастанию
+        description: Краткое описание изменений
+        sql: Команды, выполняемые в одной транзакции
+        transactional: Выполнять ли команды в транзакции. Без нее (нужно для
+            CREATE INDEX CONCURRENTLY) команды выполняются по одной, поэтому
+            точка с запятой допустима только между ними
+    """
+    version: int
+    description: str
+    sql: str
+    transactional: bool = True
+
+    def statements(self):
+        return [statement.strip() for statement in self.sql.split(";") if statement.strip()]
+
+
+MIGRATIONS = [
+    Migration(1, "Уведомления об изменении справочников районов и зданий", f"""
+        CREATE OR REPLACE FUNCTION notify_catalog_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CATALOG_CHANNEL}', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS areas_catalog_changed ON "Areas";
+        CREATE TRIGGER areas_catalog_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Areas"
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+        DROP TRIGGER IF EXISTS buildings_catalog_changed ON "Buildings";
+        CREATE TRIGGER buildings_catalog_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Buildings"
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+    """),
+    # Поиск сравнивает эти поля без учета регистра; с ILIKE индексы не используются,
+    # а с вычисляемыми колонками в нижнем регистре хватает обычного равенства.
+    # Хранимые вычисляемые колонки переписывают всю таблицу под исключительной
+    # блокировкой, поэтому миграции применяются отдельным шагом, а не при запуске бота
+    Migration(2, "Нормализованные колонки для сравнения без учета регистра", """
+        ALTER TABLE "Units"
+            ADD COLUMN IF NOT EXISTS type_unit_lower text GENERATED ALWAYS AS (lower(type_unit)) STORED,
+            ADD COLUMN IF NOT EXISTS purpose_lower text GENERATED ALWAYS AS (lower(purpose)) STORED,
+            ADD COLUMN IF NOT EXISTS view_lower text GENERATED ALWAYS AS (lower(view)) STORED,
+            ADD COLUMN IF NOT EXISTS furnishing_lower text GENERATED ALWAYS AS (lower(furnishing)) STORED,
+            ADD COLUMN IF NOT EXISTS vacant_lower text GENERATED ALWAYS AS (lower(vacant)) STORED;
+    """),
+    # Поиск по части названия района и здания (ILIKE '%...%').
+    # Расширение pg_trgm создается от имени пользователя бота, если у него есть
+    # такое право, иначе его заранее создает администратор базы
+    Migration(3, "Триграммные индексы по названиям районов и зданий", """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS areas_original_name_trgm_idx
+            ON "Areas" USING gin (original_name gin_trgm_ops);
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS buildings_name_trgm_idx
+            ON "Buildings" USING gin (name gin_trgm_ops);
+    """, transactional=False),
+    # Условие индексов совпадает с условием в UNITS_FROM, поэтому архивные объекты в них не попадают.
+    # Индексы строятся без блокировки записи в "Units"
+    Migration(4, "Частичные индексы по основным критериям поиска объектов", """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS units_search_idx
+            ON "Units" (type_unit_lower, "Beds", price)
+            WHERE post_status != 'archived';
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS units_building_id_idx
+            ON "Units" (building_id)
+            WHERE post_status != 'archived';
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS units_area_id_idx
+            ON "Units" (area_id)
+            WHERE post_status != 'archived';
+    """, transactional=False),
+    # Время изменения объекта нужно для инкрементального обновления снимка в памяти (database/memory_search.py)
+    Migration(5, "Время последнего изменения объектов", """
+        ALTER TABLE "Units" ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS units_set_updated_at ON "Units";
+        CREATE TRIGGER units_set_updated_at
+            BEFORE UPDATE ON "Units"
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+        CREATE INDEX IF NOT EXISTS units_updated_at_idx ON "Units" (updated_at);
+    """),
+    # Имя и WhatsApp агента снимок хранит в каждом его объекте, а изменения снимка выбираются
+    # по "Units".updated_at: правка агента отмечает изменившимися его активные объекты
+    Migration(6, "Обновление времени изменения объектов при правке агента", """
+        CREATE OR REPLACE FUNCTION touch_agent_units() RETURNS trigger AS $$
+        BEGIN
+            UPDATE "Units" u SET updated_at = now()
+            FROM new_agents n JOIN old_agents o ON o.id = n.id
+            WHERE u.agent_id = n.id AND u.post_status != 'archived'
+                AND (n.name, n.whatsapp) IS DISTINCT FROM (o.name, o.whatsapp);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS agents_touch_units ON "Agents";
+        CREATE TRIGGER agents_touch_units
+            AFTER UPDATE ON "Agents"
+            REFERENCING OLD TABLE AS old_agents NEW TABLE AS new_agents
+            FOR EACH STATEMENT EXECUTE FUNCTION touch_agent_units();
+    """),
+]
+
+
+async def apply_migrations(conninfo=None, target=None):
+    """
+    Применение еще не примененных миграций по возрастанию версии.
+
+    Каждая миграция выполняется в своей транзакции (или, если она не
+    транзакционная, по одной команде) и записывается в таблицу
+    schema_migrations, поэтому повторный запуск ничего не меняет.
+    Прерванное построение индекса CONCURRENTLY оставляет недействительный
+    индекс, который IF NOT EXISTS не перестроит: перед повторным запуском
+    его нужно удалить.
+
+    Args:
+        conninfo: Строка подключения, по умолчанию из настроек проекта
+        target: Последняя версия, которую нужно применить; по умолчанию все
+
+    Returns:
+        list: Номера примененных при этом запуске версий
+    """
+    applied_now = []
+
+    async with await AsyncConnection.connect(conninfo or build_conninfo(), autocommit=True) as connection:
+        await connection.execute(MIGRATIONS_TABLE_SQL)
+        await connection.execute("SELECT pg_advisory_lock(%s)", [MIGRATIONS_LOCK_ID])
+        try:
+            cursor = await connection.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in await cursor.fetchall()}
+
+            for migration in MIGRATIONS:
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+
+                if migration.transactional:
+                    async with connection.transaction():
+                        await connection.execute(migration.sql)
+                        await _record_migration(connection, migration)
+                else:
+                    for statement in migration.statements():
+                        await connection.execute(statement)
+                    await _record_migration(connection, migration)
+                applied_now.append(migration.version)
+                logger.info(f"Применена миграция {migration.version}: {migration.description}")
+        finally:
+            await connection.execute("SELECT pg_advisory_unlock(%s)", [MIGRATIONS_LOCK_ID])
+
+    if not applied_now:
+        logger.info("Схема базы данных в актуальном состоянии")
+
+    return applied_now
+
+
+async def _record_migration(connection, migration):
+    await connection.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+        [migration.version, migration.description],
+    )
+
+
+async def get_missing_migrations(conninfo=None):
+    """
+    Версии схемы, которые еще не применены к базе данных.
+
+    Args:
+        conninfo: Строка подключения, по умолчанию из настроек проекта
+
+    Returns:
+        list: Номера недостающих версий по возрастанию
+    """
+    async with await AsyncConnection.connect(conninfo or build_conninfo(), autocommit=True) as connection:
+        cursor = await connection.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        applied = set()
+        if (await cursor.fetchone())[0]:
+            cursor = await connection.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in await cursor.fetchall()}
+
+    return [migration.version for migration in MIGRATIONS if migration.version not in applied]
+
+
+async def migrate_on_startup():
+    """
+    Проверка схемы базы данных при запуске бота.
+
+    По умолчанию миграции применяются отдельным шагом (python -m database.migrations),
+    а бот только проверяет, что все они применены: запросы поиска рассчитаны на
+    последнюю версию схемы. С db_migrate_on_startup миграции применяются здесь же.
+
+    Raises:
+        RuntimeError: Если схема отстает от кода и миграции при запуске выключены
+    """
+    if proj_settings.db_migrate_on_startup:
+        await apply_migrations()
+        return
+
+    missing = await get_missing_migrations()
+    if missing:
+        raise RuntimeError(f"Схема базы данных отстает: не применены миграции {missing}, "
+                           f"выполните python -m database.migrations перед запуском бота")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Применение миграций схемы базы данных")
+    parser.add_argument("--target", type=int, help="Последняя версия, которую нужно применить")
+    args = parser.parse_args()
+
+    asyncio.run(apply_migrations(target=args.target))
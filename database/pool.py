@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+from loader import proj_settings
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_pool: AsyncConnectionPool | None = None
+_pool_lock = asyncio.Lock()
+
+
+def build_conninfo():
+    """
+    Формирование строки подключения к PostgreSQL из настроек проекта.
+
+    Returns:
+        str: Строка подключения в формате libpq
+    """
+    return make_conninfo(
+        host=proj_settings.db_host,
+        port=proj_settings.db_port,
+        dbname=proj_settings.db_name,
+        user=proj_settings.db_user,
+        password=proj_settings.db_password,
+    )
+
+
+async def get_pool():
+    """
+    Получение общего пула соединений с базой данных.
+
+    Пул создается один раз при первом обращении и переиспользуется всеми
+    запросами, поэтому на каждый поиск не тратится новое TCP-соединение
+    и авторизация.
+
+    Returns:
+        AsyncConnectionPool: Открытый пул соединений
+    """
+    global _pool
+
+    if _pool is not None:
+        return _pool
+
+    async with _pool_lock:
+        if _pool is None:
+            pool = AsyncConnectionPool(
+                conninfo=build_conninfo(),
+                min_size=proj_settings.db_pool_min_size,
+                max_size=proj_settings.db_pool_max_size,
+                timeout=proj_settings.db_pool_acquire_timeout,
+                max_idle=proj_settings.db_pool_max_idle,
+                max_lifetime=proj_settings.db_pool_max_lifetime,
+                check=AsyncConnectionPool.check_connection if proj_settings.db_pool_health_check else None,
+                open=False,
+            )
+            try:
+                await pool.open(wait=True, timeout=proj_settings.db_pool_acquire_timeout)
+            except Exception as e:
+                logger.error(f"Ошибка при подключении к базе данных: {e}")
+                await pool.close()
+                raise
+            logger.info(f"Пул соединений открыт: min_size={pool.min_size}, max_size={pool.max_size}")
+            _pool = pool
+
+    return _pool
+
+
+async def close_pool():
+    """
+    Закрытие пула соединений при остановке бота.
+    """
+    global _pool
+
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+            logger.info("Пул соединений закрыт")
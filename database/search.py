@@ -0,0 +1,82 @@
+from . import database_handler
+
+try:
+    from . import memory_search
+except ImportError:
+    # NumPy не установлен: поиск всегда идет через базу данных
+    memory_search = None
+
+
+def _snapshot():
+    return memory_search.get_snapshot() if memory_search is not None else None
+
+
+async def count_search_results(criteria):
+    """
+    Выбор уровня ослабления критериев и подсчет найденного, см. database_handler.count_search_results.
+    """
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.count_search_results(criteria)
+
+    return await database_handler.count_search_results(criteria)
+
+
+async def count_units(criteria, tier, building=None):
+    """
+    Количество объектов на уровне, см. database_handler.count_units.
+    """
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.count_units(criteria, tier, building)
+
+    return await database_handler.count_units(criteria, tier, building)
+
+
+async def search_buildings_page(criteria, tier, limit, after=None, before=None, from_end=False):
+    """
+    Страница зданий, см. database_handler.search_buildings_page.
+    """
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.buildings_page(criteria, tier, limit, after, before, from_end)
+
+    return await database_handler.search_buildings_page(criteria, tier, limit, after, before, from_end)
+
+
+async def search_units_page(criteria, tier, building, limit, after=None, before=None, from_end=False):
+    """
+    Страница объектов здания, см. database_handler.search_units_page.
+    """
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.units_page(criteria, tier, building, limit, after, before, from_end)
+
+    return await database_handler.search_units_page(criteria, tier, building, limit, after, before, from_end)
+
+
+async def get_unit(unit_id):
+    """
+    Один объект по идентификатору, см. database_handler.get_unit.
+    """
+    snapshot = _snapshot()
+    if snapshot is not None:
+        return snapshot.get_unit(unit_id)
+
+    return await database_handler.get_unit(unit_id)
+
+
+async def start_memory_search():
+    """
+    Загрузка снимка объектов в память, если поиск в памяти включен и NumPy установлен.
+    """
+    if memory_search is not None:
+        await memory_search.start_memory_search()
+
+
+async def stop_memory_search():
+    """
+    Остановка обновления снимка объектов.
+    """
+    if memory_search is not None:
+        await memory_search.stop_memory_search()
@@ -0,0 +1,69 @@
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+
+class Unit(NamedTuple):
+    """
+    Объект недвижимости из результатов поиска.
+
+    Строка запроса с колонками UNITS_COLUMNS декодируется в Unit один раз,
+    прямо из курсора, без промежуточного словаря. Кортеж неизменяем,
+    поэтому один и тот же объект без копирования группируется по зданиям
+    и отдается из снимка в памяти. В отличие от dataclass создание Unit -
+    один вызов tuple.__new__, без присваивания каждого поля.
+
+    Attributes:
+        id: Идентификатор объекта
+        price: Цена
+        type_unit: Тип недвижимости
+        purpose: Назначение (продажа/аренда)
+        completion: Статус готовности
+        handover_date: Дата сдачи
+        furnishing: Меблировка
+        studio: Колонка "Studio"
+        sqft: Площадь в квадратных футах
+        baths: Количество ванных комнат
+        beds: Количество спален
+        view: Вид из окна
+        vacant: Свободен ли объект
+        agent_name: Имя агента
+        agent_whatsapp: Номер WhatsApp агента
+        building: Название здания
+        area: Название района
+    """
+    id: int
+    price: Decimal
+    type_unit: str | None
+    purpose: str | None
+    completion: str | None
+    handover_date: date | None
+    furnishing: str | None
+    studio: str | None
+    sqft: Decimal | None
+    baths: int | None
+    beds: int | None
+    view: str | None
+    vacant: str | None
+    agent_name: str | None
+    agent_whatsapp: str | None
+    building: str | None
+    area: str | None
+
+
+# Количество колонок объекта в начале строки результата
+UNIT_SIZE = len(Unit._fields)
+
+
+def unit_row(cursor):
+    """
+    Фабрика строк psycopg, которая декодирует строку результата сразу в Unit.
+    Колонки запроса должны совпадать с UNITS_COLUMNS.
+
+    Args:
+        cursor: Курсор, для которого создается фабрика
+
+    Returns:
+        Callable: Функция, превращающая значения строки в Unit
+    """
+    return Unit._make
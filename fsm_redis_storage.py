@@ -0,0 +1,56 @@
+import msgpack
+from aiogram.fsm.storage.redis import RedisStorage
+
+
+def pack_data(data):
+    """
+    Сериализация данных состояния в MessagePack.
+
+    Args:
+        data: Данные состояния пользователя
+
+    Returns:
+        bytes: Сериализованные данные
+    """
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack_data(value):
+    """
+    Десериализация данных состояния из MessagePack.
+
+    Args:
+        value: Сериализованные данные
+
+    Returns:
+        dict: Данные состояния пользователя
+    """
+    return msgpack.unpackb(value, raw=False)
+
+
+class MsgpackRedisStorage(RedisStorage):
+    """
+    Хранилище состояний в Redis (или любом сервере с протоколом Redis),
+    в котором данные хранятся в MessagePack вместо JSON. Запись данных
+    продлевает и срок хранения состояния.
+    """
+
+    async def set_data(self, key, data):
+        redis_key = self.key_builder.build(key, "data")
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            if data:
+                pipeline.set(redis_key, pack_data(dict(data)), ex=self.data_ttl)
+            else:
+                pipeline.delete(redis_key)
+            # Пользователь, который только листает результаты, меняет данные, но не состояние:
+            # без продления состояние истекло бы раньше данных
+            if self.state_ttl:
+                pipeline.expire(self.key_builder.build(key, "state"), self.state_ttl)
+            await pipeline.execute()
+
+    async def get_data(self, key):
+        value = await self.redis.get(self.key_builder.build(key, "data"))
+        if value is None:
+            return {}
+
+        return unpack_data(value)
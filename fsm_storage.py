@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def approximate_size(value):
+    """
+    Приблизительный объем памяти, занимаемый значением вместе с вложенными объектами.
+
+    Args:
+        value: Значение из данных состояния
+
+    Returns:
+        int: Размер в байтах по sys.getsizeof
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximate_size(item) for item in value)
+
+    return size
+
+
+@dataclass(slots=True)
+class _Session:
+    state: str | None = None
+    data: dict = field(default_factory=dict)
+    size: int = 0
+    touched_at: float = 0.0
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """
+    Хранилище состояний в памяти процесса с ограничением по времени и объему.
+
+    Сессия пользователя удаляется, если к ней не обращались дольше ttl
+    секунд. Если общий объем данных превышает max_bytes, удаляются сессии,
+    к которым обращались раньше всех. Раз в report_interval секунд
+    в лог пишется отчет о сессиях, см. start_storage_report.
+    """
+
+    def __init__(self, ttl=None, max_bytes=None, report_interval=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.report_interval = report_interval
+        self.total_bytes = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        # Сессии упорядочены по времени последнего обращения, самые старые - в начале
+        self._sessions = OrderedDict()
+
+    def stats(self):
+        """
+        Количество сессий, их приблизительный объем и число вытеснений.
+
+        Returns:
+            dict: Счетчики хранилища
+        """
+        self._evict_idle()
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.total_bytes,
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+        }
+
+    def _drop(self, key):
+        self.total_bytes -= self._sessions.pop(key).size
+
+    def _evict_idle(self):
+        if self.ttl is None:
+            return
+
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.touched_at >= deadline:
+                break
+            self._drop(key)
+            self.evicted_idle += 1
+
+    def _touch(self, key, create=False):
+        self._evict_idle()
+
+        session = self._sessions.get(key)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[key] = _Session()
+
+        session.touched_at = time.monotonic()
+        self._sessions.move_to_end(key)
+        return session
+
+    def _resize(self, key, session):
+        if session.state is None and not session.data:
+            self._drop(key)
+            return
+
+        self.total_bytes -= session.size
+        session.size = approximate_size(session.state) + approximate_size(session.data)
+        self.total_bytes += session.size
+
+        # Текущая сессия стоит в конце, поэтому сама себя она не вытесняет
+        while self.max_bytes and self.total_bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)))
+            self.evicted_lru += 1
+
+    async def set_state(self, key, state=None):
+        session = self._touch(key, create=True)
+        session.state = state.state if isinstance(state, State) else state
+        self._resize(key, session)
+
+    async def get_state(self, key):
+        session = self._touch(key)
+        return session.state if session is not None else None
+
+    async def set_data(self, key, data):
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+
+        session = self._touch(key, create=True)
+        session.data = data.copy()
+        self._resize(key, session)
+
+    async def get_data(self, key):
+        session = self._touch(key)
+        return session.data.copy() if session is not None else {}
+
+    async def close(self):
+        pass
+
+
+_report_task: asyncio.Task | None = None
+
+
+async def _report_periodically(storage, interval):
+    while True:
+        await asyncio.sleep(interval)
+        stats = storage.stats()
+        logger.info(f"Сессий в хранилище состояний: {stats['sessions']}, около {stats['bytes'] / 1024:.1f} КБ, "
+                    f"вытеснено по времени: {stats['evicted_idle']}, по объему: {stats['evicted_lru']}")
+
+
+async def start_storage_report(dispatcher):
+    """
+    Запуск периодического отчета о сессиях в хранилище состояний в памяти.
+
+    Args:
+        dispatcher: Диспетчер бота, передается aiogram при запуске
+    """
+    global _report_task
+
+    storage = dispatcher.storage
+    if isinstance(storage, BoundedMemoryStorage) and storage.report_interval and _report_task is None:
+        _report_task = asyncio.create_task(_report_periodically(storage, storage.report_interval))
+
+
+async def stop_storage_report():
+    """
+    Остановка периодического отчета о сессиях.
+    """
+    global _report_task
+
+    if _report_task is not None:
+        _report_task.cancel()
+        try:
+            await _report_task
+        except asyncio.CancelledError:
+            pass
+        _report_task = None
+
+
+def create_fsm_storage(settings) -> BaseStorage:
+    """
+    Создание хранилища состояний по настройкам проекта.
+
+    Args:
+        settings: Настройки проекта
+
+    Returns:
+        BaseStorage: Хранилище в памяти процесса ("memory") или в Redis ("redis")
+    """
+    if settings.fsm_storage == "redis":
+        # msgpack и redis нужны только этому хранилищу, с хранилищем в памяти они не импортируются
+        from fsm_redis_storage import MsgpackRedisStorage
+
+        logger.info("Состояния пользователей хранятся в Redis")
+        return MsgpackRedisStorage.from_url(settings.fsm_redis_url, state_ttl=settings.fsm_state_ttl,
+                                            data_ttl=settings.fsm_state_ttl)
+
+    return BoundedMemoryStorage(ttl=settings.fsm_state_ttl, max_bytes=settings.fsm_memory_budget,
+                                report_interval=settings.fsm_report_interval)
@@ -1,22 +1,35 @@
 import asyncio
-from uuid import uuid4
+import logging
+import secrets
 
 from aiogram import types, Router, F
 from aiogram.filters import CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 
 from config import bot_messages
-from loader import bot
-from utils import process_real_estate_query, create_whatsapp_link
+from loader import bot, proj_settings
+from database import count_units, TIER_ORIGINAL
+from utils import (process_real_estate_query, create_whatsapp_link, load_buildings_page, load_units_page,
+                   load_unit_details, pages_count)
 import keyboards
+from metrics import SEARCH_RESULTS, SEARCHES_IN_FLIGHT, stage_timer
 from states_storage import HousingSearchStates
 
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 router = Router(name="start")
 
 
 @router.message(CommandStart())
 async def start(message: types.Message, state: FSMContext) -> None:
+    pending = _pending_requests.pop(message.from_user.id, None)
+    if pending is not None:
+        # Ответ, который уже записывается под защитой от отмены, не должен вернуть пользователя к результатам
+        pending["reset"] = True
+        pending["task"].cancel()
     await state.clear()
 
     await message.answer(text=bot_messages["BOT_GREETINGS"])
@@ -24,13 +37,173 @@ async def start(message: types.Message, state: FSMContext) -> None:
     await state.set_state(HousingSearchStates.get_user_request)
 
 
+# Незавершенные запросы пользователей: задача обработки, задача отправки сообщения загрузки,
+# текст прошлых сообщений диалога, извлеченные из них критерии, текст, пришедший подряд,
+# признак объединения с прошлым запросом и признак сброса поиска командой /start или
+# заменой запроса следующим сообщением
+_pending_requests = {}
+
+
 @router.message(HousingSearchStates.get_user_request)
 async def get_user_request(message: types.Message, state: FSMContext) -> None:
-    loader_message = await message.answer(text=bot_messages["LOADER_MESSAGE"])
+    user_id = message.from_user.id
+
+    # Сообщения, пришедшие подряд, объединяются в один запрос: еще не завершенная
+    # обработка прошлого текста отменяется, а сообщение загрузки используется повторно
+    pending = _pending_requests.get(user_id)
+    if pending is not None and not pending["task"].done():
+        # Ответ на замененный запрос, даже если уже записывается, состояние не меняет:
+        # новый запрос включает его текст и ответит в том же сообщении загрузки
+        pending["reset"] = True
+        pending["task"].cancel()
+        request = {"loader": pending["loader"], "base": pending["base"], "extraction": pending["extraction"],
+                   "text": f"{pending['text']} {message.text}", "coalesced": True, "reset": False}
+    else:
+        request = {"loader": asyncio.ensure_future(message.answer(text=bot_messages["LOADER_MESSAGE"])),
+                   "base": None, "extraction": None, "text": message.text, "coalesced": False, "reset": False}
+
+    request["task"] = asyncio.create_task(_process_user_request(user_id, state, request))
+    _pending_requests[user_id] = request
+    request["task"].add_done_callback(lambda _: _pending_requests.pop(user_id)
+                                      if _pending_requests.get(user_id) is request else None)
+
+
+# Статусы, с которыми поиск вернул объекты для просмотра
+RESULTS_STATUSES = ("success", "price_increased", "rent_option")
+
+
+async def _process_user_request(user_id: int, state: FSMContext, request: dict) -> None:
+    if request["base"] is None:
+        state_data = await state.get_data()
+        request["base"] = state_data.get("user_request", "")
+        request["extraction"] = state_data.get("extraction")
+    # Первое сообщение обрабатывается сразу, а после объединения ждем, не допишет ли пользователь еще
+    if request["coalesced"]:
+        await asyncio.sleep(proj_settings.request_debounce)
+
+    SEARCHES_IN_FLIGHT.inc()
+    try:
+        with stage_timer("request"):
+            await _run_user_request(user_id, state, request)
+    except asyncio.CancelledError:
+        # Запрос заменен следующим сообщением пользователя или командой /start
+        SEARCH_RESULTS.labels("cancelled").inc()
+        raise
+    finally:
+        SEARCHES_IN_FLIGHT.dec()
+
+
+async def _run_user_request(user_id: int, state: FSMContext, request: dict) -> None:
+    state_data = {"user_request": f"{request['base']} {request['text']}".strip()}
+    await state.set_data(data=state_data)
+    first_page = None
+
+    async def on_criteria(criteria: dict) -> None:
+        nonlocal first_page
+        loader_message = await _loader_message(request)
+        await loader_message.edit_text(text=bot_messages["SEARCH_STAGE"])
+        # Первая страница без ослабления критериев загружается одновременно с подсчетом результатов
+        first_page = asyncio.create_task(_show_first_page(state, request, loader_message, dict(state_data),
+                                                          {"criteria": criteria, "tier": TIER_ORIGINAL}))
+
+    objects_names_list, buildings_page = None, None
+    try:
+        # Ответ на уточняющий вопрос: модели уходит только новый текст и критерии из прошлых сообщений
+        context = {**request["extraction"], "text": request["text"]} if request["extraction"] else None
+        result = await process_real_estate_query(state_data["user_request"], user_id=user_id,
+                                                 on_criteria=on_criteria, context=context)
+        shown = await first_page if first_page is not None else None
+        if result.get("status") in RESULTS_STATUSES and shown != result["search"]:
+            objects_names_list, buildings_page = await load_buildings_page(search=result["search"], page=None,
+                                                                           action="first",
+                                                                           total=result["total_buildings"])
+    except Exception as e:
+        # Обработка идет в фоне, поэтому ошибка не дойдет до обработчика ошибок aiogram
+        logger.error(f"Ошибка обработки запроса пользователя {user_id}: {e}")
+        result, shown = {"status": "error", "message": bot_messages["ERROR"]}, None
+    finally:
+        if first_page is not None and not first_page.done():
+            first_page.cancel()
+
+    SEARCH_RESULTS.labels(result.get("status", "no_search")).inc()
+
+    # Запрос обработан: ответ записывается целиком, даже если в это время пришло новое сообщение
+    loader_message = await _loader_message(request)
+    if shown is not None and shown == result.get("search"):
+        await asyncio.shield(_show_results_total(state, request, loader_message, result))
+    else:
+        await asyncio.shield(_show_user_request_result(state, request, loader_message, state_data, result,
+                                                       objects_names_list, buildings_page))
+
+
+async def _loader_message(request: dict) -> types.Message:
+    # Отправка сообщения загрузки общая для объединенных запросов: отмена одного из них не должна ее прерывать
+    return await asyncio.shield(request["loader"])
+
+
+async def _show_first_page(state: FSMContext, request: dict, loader_message: types.Message, state_data: dict,
+                           search: dict) -> dict | None:
+    """
+    Показ первой страницы зданий, пока общее количество результатов еще подсчитывается.
+
+    Args:
+        state: Состояние пользователя
+        request: Запрос пользователя, к которому относится ответ
+        loader_message: Сообщение загрузки, в котором показываются результаты
+        state_data: Данные состояния с текстом запроса пользователя
+        search: Поиск по исходным критериям
+
+    Returns:
+        dict | None: Показанный поиск или None, если по исходным критериям ничего не найдено
+    """
+    objects_names_list, buildings_page = await load_buildings_page(search=search, page=None, action="first",
+                                                                   total=None)
+    if not objects_names_list:
+        return None
+
+    result = {"status": "success", "search": search, "total_buildings": None,
+              "message": bot_messages["COUNTING_STAGE"]}
+    await asyncio.shield(_show_user_request_result(state, request, loader_message, state_data, result,
+                                                   objects_names_list, buildings_page))
+    return search
+
+
+async def _show_results_total(state: FSMContext, request: dict, loader_message: types.Message,
+                              result: dict) -> None:
+    """
+    Дополнение показанной заранее первой страницы количеством результатов и пагинацией.
+
+    Args:
+        state: Состояние пользователя
+        request: Запрос пользователя, к которому относится ответ
+        loader_message: Сообщение с первой страницей зданий
+        result: Результат обработки запроса с подсчитанным количеством
+    """
     state_data = await state.get_data()
-    user_request = state_data.get("user_request", "") + f" {message.text}"
-    await state.set_data(data={"user_request": user_request.strip()})
-    result = await process_real_estate_query(user_request, user_id=message.from_user.id)
+    # Пользователь уже начал новый поиск
+    if request["reset"] or state_data.get("search") != result["search"]:
+        return
+
+    state_data["total_buildings"] = result["total_buildings"]
+    state_data["message_text"] = result["message"]
+    await state.set_data(data=state_data)
+
+    # Если пользователь уже открыл здание, пагинация появится при возврате к списку
+    if "wrap_object_name" not in state_data:
+        await loader_message.edit_text(text=result["message"], reply_markup=keyboards.create_objects_keyboard(
+                                                        objects_list=state_data["objects_names_list"],
+                                                        uuid_dict=_names_uuid_dict(state_data),
+                                                        page_num=1,
+                                                        no_pagination=pages_count(state_data["total_buildings"]) == 1
+                                                        ))
+
+
+async def _show_user_request_result(state: FSMContext, request: dict, loader_message: types.Message,
+                                    state_data: dict, result: dict, objects_names_list: list,
+                                    buildings_page: dict) -> None:
+    # После /start или замены запроса ответ на старый запрос состояние не меняет
+    if request["reset"]:
+        return
 
     status = result.get("status", "no_search")
     message_text = result.get("message")
@@ -38,97 +211,135 @@ async def get_user_request(message: types.Message, state: FSMContext) -> None:
             await loader_message.edit_text(text=bot_messages["ERROR"])
     if status == "no_search":
         await loader_message.edit_text(text=message_text)
-    elif status == "not_found":
+
+        # Ответ на уточняющий вопрос должен прийти в get_user_request, даже если состояние
+        # успел поменять ответ на прошлый запрос
+        await state.set_state(HousingSearchStates.get_user_request)
+        if result.get("context") and not request["reset"]:
+            state_data["extraction"] = result["context"]
+            await state.set_data(data=state_data)
+    elif status in ("not_found", "error"):
         await loader_message.edit_text(text=message_text)
 
-        await state.set_data(data={})
-    elif status == "success":
+        if not request["reset"]:
+            await state.set_state(HousingSearchStates.get_user_request)
+            await state.set_data(data={})
+    elif status in RESULTS_STATUSES:
         await state.set_state(HousingSearchStates.results_viewing)
-        state_data["index"] = 0
-        results_names_list = list(result.get("results", {}).keys())
-        state_data["names_uuid_dict"] = dict(zip(results_names_list, [str(uuid4()) for _ in results_names_list]))
-        state_data["result"] = {
-            "status": result["status"],
-            "message": result["message"],
-            "results": {state_data["names_uuid_dict"][key]: val for key, val in result["results"].items()}
-            }
+        # /start или новое сообщение могли прийти, пока записывалось состояние: возвращается get_user_request
+        if request["reset"]:
+            await state.set_state(HousingSearchStates.get_user_request)
+            return
+        state_data["search"] = result["search"]
+        state_data["total_buildings"] = result["total_buildings"]
         state_data["message_text"] = message_text
-        chunk_size = 5
-        state_data["objects_names_list_chunks"] = [
-                                                   results_names_list[i:i+chunk_size] 
-                                                   for i in range(0, len(results_names_list), chunk_size)
-                                                   ]
+        state_data["buildings_page"] = buildings_page
+        _set_buildings_page(state_data, objects_names_list)
         await state.set_data(data=state_data)
 
         await loader_message.edit_text(text=message_text, reply_markup=keyboards.create_objects_keyboard(
-                                                        objects_list=state_data["objects_names_list_chunks"][0],
-                                                        uuid_dict=state_data["names_uuid_dict"],
+                                                        objects_list=state_data["objects_names_list"],
+                                                        uuid_dict=_names_uuid_dict(state_data),
                                                         page_num=1,
-                                                        no_pagination=False if len(state_data["objects_names_list_chunks"]) - 1 else True
+                                                        no_pagination=pages_count(state_data["total_buildings"]) == 1
                                                         ))
 
 
 @router.callback_query(F.data.startswith("foreign:"), StateFilter(HousingSearchStates.results_viewing))
 async def foreign_pagination(call: types.CallbackQuery, state: FSMContext) -> None:
     state_data = await state.get_data()
-    index = state_data.get("index", 0)
-    objects_list = state_data.get("objects_names_list_chunks")
 
     action_type = call.data.split(":")[1]
 
-    if action_type == "next":
-        if index == len(objects_list) - 1:
-            index = 0
-        else:
-            index += 1
-    elif action_type == "back":
-        if not index:
-            index = len(objects_list) - 1
-        else:
-            index -= 1
+    objects_names_list, state_data["buildings_page"] = await load_buildings_page(
+                                                            search=state_data["search"],
+                                                            page=state_data["buildings_page"],
+                                                            action=action_type,
+                                                            total=state_data["total_buildings"]
+                                                            )
+    _set_buildings_page(state_data, objects_names_list)
     
     await call.message.edit_reply_markup(reply_markup=keyboards.create_objects_keyboard(
-                                            objects_list=state_data["objects_names_list_chunks"][index],
-                                            uuid_dict=state_data["names_uuid_dict"],
-                                            page_num=index+1
+                                            objects_list=state_data["objects_names_list"],
+                                            uuid_dict=_names_uuid_dict(state_data),
+                                            page_num=state_data["buildings_page"]["index"] + 1
                                             ))
 
-    state_data["index"] = index
     await state.set_data(data=state_data)
 
 
+def _set_buildings_page(state_data: dict, objects_names_list: list) -> None:
+    # Вместо UUID на каждое здание хранится один короткий токен страницы,
+    # идентификаторы кнопок строятся из него и позиции здания на странице
+    state_data["objects_names_list"] = objects_names_list
+    state_data["names_token"] = secrets.token_hex(4)
+
+
+def _names_uuid_dict(state_data: dict) -> dict:
+    token = state_data.get("names_token", "")
+    return {name: f"{token}{i}" for i, name in enumerate(state_data.get("objects_names_list", []))}
+
+
+async def _building_units(state_data: dict, name: str) -> int:
+    # Количество объектов здания приходит в сводке страницы зданий,
+    # в состояниях, сохраненных до появления сводки, его нет
+    units = state_data["buildings_page"].get("units")
+    if units is not None:
+        return units[state_data["objects_names_list"].index(name)]
+
+    return await count_units(criteria=state_data["search"]["criteria"], tier=state_data["search"]["tier"],
+                             building=name)
+
+
+def _set_wrap_page(state_data: dict, units: list) -> None:
+    # Для кнопок объектов достаточно идентификатора и типа, остальное подгружается по id
+    state_data["wrap_units"] = [[unit.id, unit.type_unit] for unit in units]
+
+
+def _wrap_types(state_data: dict) -> tuple:
+    types_list = [f"{type_unit}: {unit_id}" for unit_id, type_unit in state_data["wrap_units"]]
+    types_ids_dict = {f"{type_unit}: {unit_id}": unit_id for unit_id, type_unit in state_data["wrap_units"]}
+
+    return types_list, types_ids_dict
+
+
 @router.callback_query(F.data.startswith("open-wrap:"), StateFilter(HousingSearchStates.results_viewing))
 async def open_wrap_list(call: types.CallbackQuery, state: FSMContext) -> None:
     state_data = await state.get_data()
-    result_dict = state_data.get("result", {}).get("results", {})
+    uuid_names_dict = {uuid: name for name, uuid in _names_uuid_dict(state_data).items()}
+
+    wrap_object_name = uuid_names_dict.get(call.data.split(":")[1])
+    if wrap_object_name is None:
+        await call.answer(text=bot_messages["ERROR"])
+        return
 
-    wrap_object_name = call.data.split(":")[1]
     state_data["wrap_object_name"] = wrap_object_name
-    state_data["wrap_index"] = 0
-    state_data["wrap_result"] = {elem["id"]: elem for elem in result_dict.get(wrap_object_name, [])}
-    state_data["wrap_types_list"] = [elem.get("type_unit") + f": {elem.get("id")}" for elem in result_dict.get(wrap_object_name, [])]
-    state_data["wrap_types_ids_list"] = {elem.get("type_unit") + f": {elem.get("id")}": elem.get("id")  for elem in result_dict.get(wrap_object_name, [])}
-    chunk_size = 5
-    state_data["wrap_types_list_chunks"] = [
-                                            state_data["wrap_types_list"][i:i+chunk_size] 
-                                            for i in range(0, len(state_data["wrap_types_list"]), chunk_size)
-                                            ]
+    state_data["wrap_total"] = await _building_units(state_data, wrap_object_name)
+    units, state_data["wrap_page"] = await load_units_page(search=state_data["search"],
+                                                           building=wrap_object_name,
+                                                           page=None,
+                                                           action="first",
+                                                           total=state_data["wrap_total"])
+    _set_wrap_page(state_data, units)
     await state.set_data(data=state_data)
 
+    types_list, types_ids_dict = _wrap_types(state_data)
     await call.message.edit_text(text=bot_messages["SELECT_OBJECT"], reply_markup=keyboards.create_wrap_objects_keyboard(
-                                                    types_list=state_data["wrap_types_list_chunks"][0],
-                                                    types_ids_dict=state_data["wrap_types_ids_list"],
+                                                    types_list=types_list,
+                                                    types_ids_dict=types_ids_dict,
                                                     page_num=1,
-                                                    no_pagination=False if len(state_data["wrap_types_list_chunks"]) - 1 else True
+                                                    no_pagination=pages_count(state_data["wrap_total"]) == 1
                                                     ))
 
 
 @router.callback_query(F.data.startswith("wrap-obj:"), StateFilter(HousingSearchStates.results_viewing))
 async def open_wrap_object(call: types.CallbackQuery, state: FSMContext) -> None:
-    state_data = await state.get_data()
-
     wrap_id = int(call.data.split(":")[1])
-    wrap_obj_info = state_data["wrap_result"][wrap_id]
+    wrap_obj_info = await load_unit_details(wrap_id)
+    if wrap_obj_info is None:
+        await call.answer(text=bot_messages["ERROR"])
+        return
+
     link = create_whatsapp_link(message=bot_messages["WHATSAPP_MESSAGE"].format(agent_name=wrap_obj_info["agent_name"], 
                                                                                 building=wrap_obj_info["building"]
                                                                                 ), phone_number=wrap_obj_info["agent_whatsapp"])
@@ -154,29 +365,23 @@ async def open_wrap_object(call: types.CallbackQuery, state: FSMContext) -> None
 @router.callback_query(F.data.startswith("wrap:"), StateFilter(HousingSearchStates.results_viewing))
 async def wrap_pagination(call: types.CallbackQuery, state: FSMContext) -> None:
     state_data = await state.get_data()
-    index = state_data.get("wrap_index", 0)
-    wrap_types_list_chunks = state_data.get("wrap_types_list_chunks")
 
     action_type = call.data.split(":")[1]
 
-    if action_type == "next":
-        if index == len(wrap_types_list_chunks) - 1:
-            index = 0
-        else:
-            index += 1
-    elif action_type == "back":
-        if not index:
-            index = len(wrap_types_list_chunks) - 1
-        else:
-            index -= 1
+    units, state_data["wrap_page"] = await load_units_page(search=state_data["search"],
+                                                           building=state_data["wrap_object_name"],
+                                                           page=state_data["wrap_page"],
+                                                           action=action_type,
+                                                           total=state_data["wrap_total"])
+    _set_wrap_page(state_data, units)
     
+    types_list, types_ids_dict = _wrap_types(state_data)
     await call.message.edit_reply_markup(reply_markup=keyboards.create_wrap_objects_keyboard(
-                                            types_list=wrap_types_list_chunks[index],
-                                            types_ids_dict=state_data["wrap_types_ids_list"],
-                                            page_num=index+1
+                                            types_list=types_list,
+                                            types_ids_dict=types_ids_dict,
+                                            page_num=state_data["wrap_page"]["index"] + 1
                                             ))
 
-    state_data["wrap_index"] = index
     await state.set_data(data=state_data)
 
 
@@ -187,15 +392,44 @@ async def go_back(call: types.CallbackQuery, state: FSMContext) -> None:
     action_type = call.data.split(":")[1]
     if action_type == "foreign":
         await call.message.edit_text(text=state_data["message_text"], reply_markup=keyboards.create_objects_keyboard(
-                                                        objects_list=state_data["objects_names_list_chunks"][state_data["index"]],
-                                                        page_num=state_data["index"] + 1,
-                                                        uuid_dict=state_data["names_uuid_dict"],
-                                                        no_pagination=False if len(state_data["objects_names_list_chunks"]) - 1 else True
+                                                        objects_list=state_data["objects_names_list"],
+                                                        page_num=state_data["buildings_page"]["index"] + 1,
+                                                        uuid_dict=_names_uuid_dict(state_data),
+                                                        no_pagination=pages_count(state_data["total_buildings"]) == 1
                                                         ))
     else:
+        types_list, types_ids_dict = _wrap_types(state_data)
         await call.message.edit_text(text=bot_messages["SELECT_OBJECT"], reply_markup=keyboards.create_wrap_objects_keyboard(
-                                                    types_list=state_data["wrap_types_list_chunks"][state_data["wrap_index"]],
-                                                    types_ids_dict=state_data["wrap_types_ids_list"],
-                                                    page_num=state_data["wrap_index"] + 1,
-                                                    no_pagination=False if len(state_data["wrap_types_list_chunks"]) - 1 else True
+                                                    types_list=types_list,
+                                                    types_ids_dict=types_ids_dict,
+                                                    page_num=state_data["wrap_page"]["index"] + 1,
+                                                    no_pagination=pages_count(state_data["wrap_total"]) == 1
                                                     ))
+
+
+EXPIRED_CALLBACK_PREFIXES = ("foreign:", "open-wrap:", "wrap-obj:", "wrap:", "go-back:")
+
+
+# Обработчики ниже регистрируются последними: они срабатывают, только если
+# данные поиска пользователя уже удалены из хранилища состояний
+@router.callback_query(F.data.startswith(EXPIRED_CALLBACK_PREFIXES), StateFilter(None))
+async def search_expired(call: types.CallbackQuery, state: FSMContext) -> None:
+    await call.answer()
+
+    await call.message.answer(text=bot_messages["SEARCH_EXPIRED"])
+
+    await state.set_state(HousingSearchStates.get_user_request)
+
+
+# Кнопка старого поиска, пока пользователь уже в другом диалоге: его состояние
+# (например, уточнение запроса) не сбрасывается, только снимается ожидание с кнопки
+@router.callback_query(F.data.startswith(EXPIRED_CALLBACK_PREFIXES))
+async def stale_search_button(call: types.CallbackQuery) -> None:
+    await call.answer(text=bot_messages["SEARCH_EXPIRED"])
+
+
+@router.message(StateFilter(None), F.text)
+async def request_without_state(message: types.Message, state: FSMContext) -> None:
+    await state.set_state(HousingSearchStates.get_user_request)
+
+    await get_user_request(message, state)
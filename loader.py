@@ -2,9 +2,19 @@ from aiogram import Bot, Dispatcher
 import yaml
 
 from config import ProjectSettings
+from fsm_storage import create_fsm_storage
+from rate_limiter import RateLimitMiddleware
 
 
 proj_settings = ProjectSettings()
 
 bot = Bot(token=proj_settings.bot_token)
-dp = Dispatcher()
+if proj_settings.telegram_rate_limit:
+    # Общий лимит бота делится между процессами-обработчиками, чаты закреплены за одним процессом
+    bot.session.middleware(RateLimitMiddleware(
+        global_rate=proj_settings.telegram_global_rate / max(1, proj_settings.bot_workers),
+        chat_rate=proj_settings.telegram_chat_rate,
+        chat_burst=proj_settings.telegram_chat_burst,
+        max_retries=proj_settings.telegram_max_retries,
+    ))
+dp = Dispatcher(storage=create_fsm_storage(proj_settings))
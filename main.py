@@ -1,11 +1,24 @@
 import asyncio
 import logging
+import os
+import secrets
+import shutil
+import tempfile
 
 from aiogram.types import BotCommandScopeDefault
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
-from loader import bot, dp
+from database import (close_pool, get_catalog, migrate_on_startup, prepare_statements, start_catalog_listener,
+                      stop_catalog_listener, start_memory_search, stop_memory_search)
+from fsm_storage import start_storage_report, stop_storage_report
+from loader import bot, dp, proj_settings
+from metrics import HandlerMetricsMiddleware, TelegramMetricsMiddleware, mark_startup, start_metrics_server
 from set_commands import set_commands
 from handlers import start_router 
+from utils import close_openai_client, warm_up_openai_client
+from utils.candidates import get_catalog_indexes
+from workers import WorkerPool, poll_updates, webhook_handler
 
 
 logging.basicConfig(level=logging.INFO,
@@ -13,14 +26,175 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 
+async def warm_up_catalog():
+    # Справочники и построенные по ним триграммные индексы отбора кандидатов и правил
+    get_catalog_indexes(await get_catalog())
+
+
+async def warm_up(dispatcher):
+    """
+    Подготовка процесса к обработке обновлений при запуске диспетчера.
+
+    Сначала проверяется версия схемы базы данных (или, если включен
+    db_migrate_on_startup, применяются миграции): с отставшей схемой запросы
+    поиска не работают, поэтому ошибка здесь останавливает запуск. Затем
+    независимые шаги выполняются одновременно: запуск фоновых
+    задач и, если включен warm_up_on_startup, открытие пула соединений с
+    подготовленными запросами, загрузка справочников с индексами и
+    подготовка клиента модели, чтобы их не ждал первый пользователь. Ошибка шага не мешает
+    запуску: то, что не удалось подготовить, создается при первом обращении.
+
+    Args:
+        dispatcher: Диспетчер бота, передается aiogram при запуске
+    """
+    await migrate_on_startup()
+
+    steps = {
+        "catalog_listener": start_catalog_listener(),
+        "memory_search": start_memory_search(),
+        "storage_report": start_storage_report(dispatcher),
+    }
+    if proj_settings.warm_up_on_startup:
+        steps.update({
+            "statements": prepare_statements(),
+            "catalog": warm_up_catalog(),
+            "openai_client": warm_up_openai_client(),
+        })
+
+    for name, result in zip(steps, await asyncio.gather(*steps.values(), return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.error(f"Startup step {name} failed: {result}")
+
+    mark_startup("ready")
+
+
+def setup_dispatcher():
+    """
+    Подключение роутеров и обработчиков запуска и остановки к диспетчеру бота.
+
+    Returns:
+        tuple: Бот и диспетчер
+    """
+    dp.include_router(start_router)
+    start_router.message.middleware(HandlerMetricsMiddleware())
+    start_router.callback_query.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(TelegramMetricsMiddleware())
+    dp.startup.register(warm_up)
+    dp.shutdown.register(stop_catalog_listener)
+    dp.shutdown.register(stop_memory_search)
+    dp.shutdown.register(stop_storage_report)
+    dp.shutdown.register(close_pool)
+    dp.shutdown.register(close_openai_client)
+    dp.shutdown.register(dp.storage.close)
+
+    return bot, dp
+
+
+async def run_polling(pool=None) -> None:
+    if pool is None:
+        await dp.start_polling(bot)
+    else:
+        await poll_updates(bot, pool, allowed_updates=dp.resolve_used_update_types())
+
+
+async def run_webhook(pool=None) -> None:
+    """
+    Прием обновлений через вебхук: Telegram получает ответ сразу,
+    а обновление обрабатывается в фоне тем же диспетчером.
+
+    Локально обновление можно отправить POST-запросом с JSON обновления
+    и заголовком X-Telegram-Bot-Api-Secret-Token, равным WEBHOOK_SECRET.
+
+    Args:
+        pool: Запущенный WorkerPool; если передан, обновления обрабатываются в его процессах
+    """
+    # Без заданного секрета генерируется случайный, его знает только Telegram
+    secret_token = proj_settings.webhook_secret or secrets.token_urlsafe(32)
+
+    app = web.Application()
+    if pool is None:
+        SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=True,
+                             secret_token=secret_token).register(app, path=proj_settings.webhook_path)
+        setup_application(app, dp, bot=bot)
+    else:
+        app.router.add_post(proj_settings.webhook_path, webhook_handler(pool, secret_token))
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=proj_settings.webhook_host, port=proj_settings.webhook_port).start()
+        logger.info(f"Webhook server is listening on {proj_settings.webhook_host}:{proj_settings.webhook_port}"
+                    f"{proj_settings.webhook_path}")
+
+        if proj_settings.webhook_url:
+            await bot.set_webhook(url=proj_settings.webhook_url.rstrip("/") + proj_settings.webhook_path,
+                                  secret_token=secret_token,
+                                  allowed_updates=dp.resolve_used_update_types())
+        else:
+            logger.warning("WEBHOOK_URL is not set, webhook is not registered in Telegram")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def setup_bot(polling) -> str:
+    """
+    Настройка бота в Telegram: независимые запросы к Bot API выполняются одновременно.
+
+    Args:
+        polling: Обновления принимаются опросом, и вебхук нужно удалить до начала опроса
+
+    Returns:
+        str: Имя бота
+    """
+    async def update_commands():
+        # Команды удаляются до установки новых, эти два запроса идут по порядку
+        await bot.delete_my_commands(scope=BotCommandScopeDefault())
+        await set_commands()
+
+    requests = [bot.get_me(), update_commands()]
+    if polling:
+        requests.append(bot.delete_webhook())
+    bot_info, *_ = await asyncio.gather(*requests)
+
+    return bot_info.full_name
+
+
 async def main() -> None:
-    await bot.delete_my_commands(scope=BotCommandScopeDefault())
-    await bot.delete_webhook()
-    await set_commands()
+    run = run_webhook if proj_settings.bot_mode == "webhook" else run_polling
+
+    if proj_settings.bot_workers <= 1:
+        if proj_settings.metrics_port:
+            start_metrics_server(proj_settings.metrics_port, proj_settings.metrics_host)
+        setup_dispatcher()
+        logger.info(f"Bot has {await setup_bot(polling=run is run_polling)} started working")
+        # Прогрев выполняется обработчиком запуска диспетчера до приема первого обновления
+        await run()
+        return
+
+    # Процессы-обработчики пишут метрики в общий каталог, сервер метрик в этом процессе их суммирует
+    metrics_dir = None
+    if proj_settings.metrics_port:
+        metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="bot-metrics-")
+        start_metrics_server(proj_settings.metrics_port, proj_settings.metrics_host)
+
+    # Роутеры подключаются и в этом процессе: по ним определяются нужные типы обновлений
     dp.include_router(start_router)
-    bot_info = await bot.get_me()
-    logger.info(f"Bot has {bot_info.full_name} started working")
-    await dp.start_polling(bot)
+    pool = WorkerPool(proj_settings.bot_workers, setup_dispatcher)
+    # Процессы-обработчики прогреваются, пока идут запросы к Bot API
+    pool_started = asyncio.get_running_loop().run_in_executor(None, pool.start)
+    try:
+        bot_name, _ = await asyncio.gather(setup_bot(polling=run is run_polling), pool_started)
+        logger.info(f"Bot has {bot_name} started working with {proj_settings.bot_workers} worker processes")
+        await run(pool)
+    finally:
+        # Останавливать процессы можно только после того, как pool.start завершился
+        await asyncio.wait([pool_started])
+        await asyncio.get_running_loop().run_in_executor(None, pool.stop)
+        await bot.session.close()
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Границы корзин в секундах: от быстрых запросов к снимку в памяти до вызова модели
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram("bot_stage_seconds", "Длительность этапов обработки запроса", ["stage"],
+                          buckets=LATENCY_BUCKETS)
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Длительность обработчиков событий", ["handler"],
+                            buckets=LATENCY_BUCKETS)
+TELEGRAM_SECONDS = Histogram("bot_telegram_request_seconds", "Длительность запросов к Bot API", ["method"],
+                             buckets=LATENCY_BUCKETS)
+SEARCH_RESULTS = Counter("bot_search_results", "Результаты обработки запросов по статусу", ["status"])
+HANDLERS_IN_FLIGHT = Gauge("bot_handlers_in_flight", "Выполняющиеся обработчики событий", ["handler"],
+                           multiprocess_mode="livesum")
+SEARCHES_IN_FLIGHT = Gauge("bot_searches_in_flight", "Запросы пользователей в обработке",
+                           multiprocess_mode="livesum")
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Время от импорта модулей бота до этапа запуска", ["phase"],
+                        multiprocess_mode="max")
+
+# Отсчет времени запуска: модуль импортируется при старте процесса бота и каждого процесса-обработчика
+_started = time.perf_counter()
+_startup_phases = set()
+
+
+def mark_startup(phase):
+    """
+    Запись времени от импорта модулей бота до этапа запуска процесса, один раз на этап.
+
+    Args:
+        phase: "ready" - обработчики запуска выполнены, "first_update" - обработано первое обновление
+    """
+    if phase in _startup_phases:
+        return
+
+    _startup_phases.add(phase)
+    seconds = time.perf_counter() - _started
+    STARTUP_SECONDS.labels(phase).set(seconds)
+    logger.info(f"Startup phase {phase} reached in {seconds * 1000:.0f} ms")
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Замер длительности этапа обработки запроса.
+
+    Args:
+        stage: Название этапа, например "llm" или "count"
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Длительность и количество выполняющихся обработчиков роутера по имени обработчика.
+    Регистрируется как внутренний middleware, когда обработчик уже выбран.
+    """
+
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        HANDLERS_IN_FLIGHT.labels(name).inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - started)
+            HANDLERS_IN_FLIGHT.labels(name).dec()
+            mark_startup("first_update")
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Длительность запросов к Bot API по методу. Регистрируется после ограничителя
+    частоты, поэтому ожидание в очереди чата в замер не входит.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            TELEGRAM_SECONDS.labels(type(method).__name__).observe(time.perf_counter() - started)
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    Запуск HTTP-сервера метрик в формате Prometheus в отдельном потоке.
+
+    Если задан PROMETHEUS_MULTIPROC_DIR, сервер отдает сумму метрик всех
+    процессов-обработчиков, которые пишут их в этот каталог.
+
+    Args:
+        port: Порт сервера метрик
+        host: Адрес, на котором слушает сервер
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, addr=host, registry=registry)
+    else:
+        start_http_server(port, addr=host)
+    logger.info(f"Metrics are served on {host}:{port}/metrics")
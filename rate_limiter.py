@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Правки одного сообщения, из которых, пока они ждут очереди, отправляется только последняя
+COLLAPSIBLE_METHODS = (EditMessageReplyMarkup, EditMessageText)
+
+# Сколько чатов хранить, прежде чем удалять ведра простаивающих чатов
+CHAT_BUCKETS_CLEANUP_SIZE = 10000
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не больше rate запросов в секунду с всплеском до capacity.
+    Ожидающие получают токены в порядке очереди.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    @property
+    def idle(self):
+        self._refill(time.monotonic())
+        return not self._lock.locked() and self.tokens >= self.capacity
+
+    def pause(self, seconds):
+        """
+        Приостановка выдачи токенов, например по retry_after от Telegram.
+
+        Args:
+            seconds: Длительность паузы в секундах
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        """
+        Ожидание и получение одного токена.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+                if wait <= 0:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(wait)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Ограничение частоты исходящих запросов к Bot API.
+
+    Запросы, адресованные чату, проходят через ведро этого чата и общее
+    ведро бота. На ответ 429 чат приостанавливается на retry_after, и запрос
+    повторяется. Если правка сообщения ждет очереди, а для того же сообщения
+    приходит новая правка того же типа, отправляется только последняя, и оба
+    вызова получают ее ответ. Запросы без чата (getUpdates, answerCallbackQuery
+    и другие) не ограничиваются.
+
+    Args:
+        global_rate: Запросов в секунду для всего бота
+        chat_rate: Запросов в секунду для одного чата
+        chat_burst: Сколько запросов подряд можно отправить в чат без ожидания
+        max_retries: Сколько раз повторять запрос после ответа 429
+    """
+
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=3, max_retries=3):
+        # Общее ведро без всплесков: Telegram считает запросы в скользящем окне
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.collapsed = 0
+        self.retried = 0
+        self._chat_buckets = {}
+        self._pending_edits = {}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= CHAT_BUCKETS_CLEANUP_SIZE:
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items() if not value.idle}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+
+        return bucket
+
+    async def _send(self, make_request, bot, chat_id, entry, key=None):
+        bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            # С этого момента новые правки сообщения встают в очередь отдельно
+            if key is not None and self._pending_edits.get(key) is entry:
+                del self._pending_edits[key]
+
+            try:
+                return await make_request(bot, entry["method"])
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                logger.warning(f"Ограничение Telegram для чата {chat_id}, повтор через {e.retry_after} с")
+                bucket.pause(e.retry_after)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        if not isinstance(method, COLLAPSIBLE_METHODS) or method.message_id is None:
+            return await self._send(make_request, bot, chat_id, {"method": method})
+
+        key = (chat_id, method.message_id, type(method))
+        entry = self._pending_edits.get(key)
+        if entry is not None and not entry["task"].done():
+            entry["method"] = method
+            self.collapsed += 1
+        else:
+            entry = self._pending_edits[key] = {"method": method}
+            # Отправка идет отдельной задачей: ее ответ ждут все вызовы, объединенные с ней
+            entry["task"] = asyncio.create_task(self._send(make_request, bot, chat_id, entry, key))
+            entry["task"].add_done_callback(lambda task: task.cancelled() or task.exception())
+
+        return await asyncio.shield(entry["task"])
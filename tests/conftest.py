@@ -0,0 +1,16 @@
+import os
+import sys
+from pathlib import Path
+
+# Тесты запускаются из корня проекта без .env: обязательные настройки получают
+# значения-заглушки, сеть и база данных в тестах не используются
+os.environ.setdefault("BOT_TOKEN", "123456:ABCDEFabcdef")
+os.environ.setdefault("DEBUG_MODE", "False")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_NAME", "query_ai_test")
+os.environ.setdefault("DB_USER", "query_ai")
+os.environ.setdefault("DB_PASSWORD", "")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("FSM_STORAGE", "memory")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
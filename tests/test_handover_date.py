@@ -0,0 +1,61 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from database.database_handler import _common_params, normalize_handover_date
+from database.memory_search import ListingsSnapshot
+from database.units import Unit
+
+
+@pytest.mark.parametrize("value, expected", [
+    (date(2025, 6, 30), date(2025, 6, 30)),
+    (datetime(2025, 6, 30, 12, 0), date(2025, 6, 30)),
+    ("2025-06-30", date(2025, 6, 30)),
+    ("2025-06", date(2025, 7, 1)),
+    ("2025-12", date(2026, 1, 1)),
+    ("2025", date(2026, 1, 1)),
+    ("Q4 2025", date(2026, 1, 1)),
+    ("2025 Q2", date(2025, 7, 1)),
+    ("4 квартал 2026", date(2027, 1, 1)),
+    ("end of 2026", date(2027, 1, 1)),
+    ("до конца 2026 года", date(2027, 1, 1)),
+])
+def test_normalizes_known_formats(value, expected):
+    assert normalize_handover_date(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "скоро", "2025-13-01", "2025-2026"])
+def test_drops_unknown_formats(value):
+    assert normalize_handover_date(value) is None
+
+
+def test_common_params_binds_date():
+    assert _common_params(handover_date="Q4 2025")["handover_date"] == date(2026, 1, 1)
+    assert _common_params(handover_date="soon")["handover_date"] is None
+
+
+def _unit(unit_id, handover_date):
+    return Unit(unit_id, Decimal(1_000_000), "Apartment", "For Sale", "Off-Plan", handover_date,
+                None, None, None, None, 2, None, None, None, None, "Tower", "Marina")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Q4 2025", [1, 2]),
+    ("2025", [1, 2]),
+    ("2025-06", [1]),
+    ("soon", [1, 2, 3, 4]),
+])
+def test_snapshot_mask_uses_normalized_date(value, expected):
+    snapshot = ListingsSnapshot()
+    snapshot.apply([
+        (*_unit(1, date(2025, 3, 1)), "active", datetime(2025, 1, 1)),
+        (*_unit(2, date(2025, 12, 31)), "active", datetime(2025, 1, 1)),
+        (*_unit(3, date(2026, 1, 1)), "active", datetime(2025, 1, 1)),
+        (*_unit(4, None), "active", datetime(2025, 1, 1)),
+    ])
+
+    mask = snapshot._common_mask(handover_date=value)
+
+    assert snapshot.ids[np.flatnonzero(mask)].tolist() == expected
@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import EditMessageText
+
+from benchmarks.fakes import CLARIFICATION, FakeSession, message_update
+from handlers import start_handler
+from loader import proj_settings
+from states_storage import HousingSearchStates
+
+SEARCH = {"criteria": {"type": "Apartment"}, "tier": 0}
+FOUND = "Найдено 1 здание"
+
+
+class GatedStorage(MemoryStorage):
+    """
+    Хранилище состояний, которое задерживает переход к просмотру результатов,
+    пока тест не откроет шлюз: так запись ответа застает новое сообщение.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.entered = None
+        self.gate = None
+
+    async def set_state(self, key, state=None):
+        if self.gate is not None and getattr(state, "state", state) == HousingSearchStates.results_viewing.state:
+            self.entered.set()
+            await self.gate.wait()
+        await super().set_state(key, state)
+
+
+@pytest.fixture(scope="module")
+def dispatcher():
+    # Роутер можно подключить только к одному диспетчеру, поэтому диспетчер общий для модуля
+    dispatcher = Dispatcher(storage=GatedStorage())
+    dispatcher.include_router(start_handler.router)
+    return dispatcher
+
+
+@pytest.fixture
+def bot():
+    return Bot(token="123456:ABCDEFabcdef", session=FakeSession())
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """
+    Поддельная обработка запроса: текст -> результат, вызовы записываются в calls.
+    Пока для текста задано событие в gates, обработка ждет его.
+    """
+    calls, results, gates = [], {}, {}
+
+    async def process_real_estate_query(user_request, user_id, on_criteria=None, context=None):
+        calls.append((user_request, context))
+        if user_request in gates:
+            await gates[user_request].wait()
+        return results[user_request]
+
+    async def load_buildings_page(search, page, action, total):
+        return ["Tower"], {"index": 0, "units": [1]}
+
+    monkeypatch.setattr(start_handler, "process_real_estate_query", process_real_estate_query)
+    monkeypatch.setattr(start_handler, "load_buildings_page", load_buildings_page)
+    return calls, results, gates
+
+
+_update_ids = itertools.count(1)
+
+
+async def _send(dispatcher, bot, user_id, text):
+    await dispatcher.feed_raw_update(bot=bot, update=message_update(next(_update_ids), user_id, text))
+
+
+async def _idle(user_id):
+    pending = start_handler._pending_requests.get(user_id)
+    if pending is not None:
+        await asyncio.wait_for(asyncio.gather(pending["task"], return_exceptions=True), timeout=5)
+
+
+def test_superseded_result_does_not_swallow_clarifying_reply(dispatcher, bot, search, monkeypatch):
+    monkeypatch.setattr(proj_settings, "request_debounce", 0)
+    calls, results, gates = search
+    user_id = 501
+    results["квартира"] = {"status": "success", "search": SEARCH, "total_buildings": 1, "message": FOUND}
+    results["квартира с видом"] = {"status": "no_search", "message": CLARIFICATION,
+                                   "context": {"arguments": {"type": "Apartment"}}}
+    results["квартира с видом на море"] = {"status": "no_search", "message": CLARIFICATION}
+
+    async def scenario():
+        storage = dispatcher.storage
+        storage.entered, storage.gate = asyncio.Event(), asyncio.Event()
+        try:
+            await _send(dispatcher, bot, user_id, "/start")
+            await _send(dispatcher, bot, user_id, "квартира")
+            # Ответ на первый запрос уже записывается, когда приходит второе сообщение
+            await asyncio.wait_for(storage.entered.wait(), timeout=5)
+            await _send(dispatcher, bot, user_id, "с видом")
+            await _idle(user_id)
+            # Запись ответа на замененный запрос завершается уже после ответа на новый
+            storage.gate.set()
+            await asyncio.sleep(0.05)
+        finally:
+            storage.entered = storage.gate = None
+
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        assert await storage.get_state(key) == HousingSearchStates.get_user_request.state
+        assert bot.session.last_requests[user_id].text == CLARIFICATION
+
+        # Ответ на уточняющий вопрос обрабатывается с критериями из прошлых сообщений
+        await _send(dispatcher, bot, user_id, "на море")
+        await _idle(user_id)
+
+    asyncio.run(scenario())
+
+    assert [request for request, _ in calls] == ["квартира", "квартира с видом", "квартира с видом на море"]
+    assert calls[-1][1] == {"arguments": {"type": "Apartment"}, "text": "на море"}
+
+
+def test_follow_up_message_coalesces_with_pending_request(dispatcher, bot, search, monkeypatch):
+    monkeypatch.setattr(proj_settings, "request_debounce", 0)
+    calls, results, gates = search
+    user_id = 502
+    results["квартира"] = {"status": "no_search", "message": CLARIFICATION}
+    results["квартира 2 спальни"] = {"status": "success", "search": SEARCH, "total_buildings": 1,
+                                     "message": FOUND}
+    gates["квартира"] = asyncio.Event()
+
+    async def scenario():
+        await _send(dispatcher, bot, user_id, "/start")
+        await _send(dispatcher, bot, user_id, "квартира")
+        await asyncio.sleep(0.05)
+        await _send(dispatcher, bot, user_id, "2 спальни")
+        await _idle(user_id)
+
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        assert await dispatcher.storage.get_state(key) == HousingSearchStates.results_viewing.state
+        last = bot.session.last_requests[user_id]
+        assert isinstance(last, EditMessageText) and last.text == FOUND
+
+    asyncio.run(scenario())
+
+    assert [request for request, _ in calls] == ["квартира", "квартира 2 спальни"]
+
+
+def test_first_message_is_not_debounced(dispatcher, bot, search, monkeypatch):
+    monkeypatch.setattr(proj_settings, "request_debounce", 30)
+    calls, results, gates = search
+    user_id = 503
+    results["квартира"] = {"status": "no_search", "message": CLARIFICATION}
+
+    async def scenario():
+        await _send(dispatcher, bot, user_id, "/start")
+        await _send(dispatcher, bot, user_id, "квартира")
+        await _idle(user_id)
+
+    asyncio.run(scenario())
+
+    assert [request for request, _ in calls] == ["квартира"]
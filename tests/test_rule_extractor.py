@@ -0,0 +1,58 @@
+import pytest
+
+from database import build_catalog
+from utils.rule_extractor import UNSUPPORTED_RE, extract_search_arguments
+
+
+@pytest.fixture
+def catalog():
+    return build_catalog([], [])
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Найди мне апартаменты от 4000000 до 7000000 с двумя спальнями",
+     {"type": "Apartment", "bedroom_count": 2, "min_price": 4000000, "max_price": 7000000}),
+    ("квартира 1 спальня от 1.5 до 3 млн с мебелью, аренда",
+     {"bedroom_count": 1, "min_price": 1500000, "max_price": 3000000, "purpose": "For Rent",
+      "furnishing": "Furnished"}),
+    ("villa 4 bedrooms 3 baths under 15m", {"type": "Villa", "bedroom_count": 4, "bath_count": 3,
+                                           "min_price": 0, "max_price": 15000000}),
+    ("пентхаус 3-х спальный до 12 млн", {"type": "Penthouse", "bedroom_count": 3, "max_price": 12000000}),
+    ("2br flat from 500k to 900k ready", {"bedroom_count": 2, "min_price": 500000, "max_price": 900000,
+                                          "completion": "Ready"}),
+    ("2 bedroom apartment до 2000000", {"type": "Apartment", "bedroom_count": 2, "max_price": 2000000}),
+    ("квартира 2 спальни, 2 ванные, до 5 млн", {"bedroom_count": 2, "bath_count": 2, "max_price": 5000000}),
+    ("квартира 2 спальни цена 4000000-7000000", {"min_price": 4000000, "max_price": 7000000}),
+])
+def test_extracts_fully_specified_query(catalog, query, expected):
+    arguments = extract_search_arguments(query, catalog)
+
+    assert arguments is not None
+    assert {field: arguments[field] for field in expected} == expected
+
+
+@pytest.mark.parametrize("query", [
+    # Нет обязательного критерия
+    "2 bedroom до 2000000",
+    "апартаменты до 2 млн",
+    # Критерии, которые правила не разбирают
+    "апартаменты с видом на море 2 спальни до 2 млн",
+    "апартаменты 2 спальни до 2 млн, сдача в 2026",
+    # Диапазон или варианты количества спален
+    "квартира 2-3 спальни до 5 млн",
+    "квартира от 2 до 3 спален до 5 млн",
+    "квартира 1 или 2 спальни до 5 млн",
+    "квартира 2 спальни или 3 до 5 млн",
+    # Несколько ценовых выражений или числа, похожие на цену
+    "apartment 2 bedrooms under 3m, 10-15 min to the beach",
+    "квартира 2 спальни до 3 млн, бюджет 2 млн",
+    "квартира 2 спальни 4000000-7000000",
+    "квартира 2 спальни до 15 минут до метро",
+])
+def test_leaves_ambiguous_query_to_model(catalog, query):
+    assert extract_search_arguments(query, catalog) is None
+
+
+@pytest.mark.parametrize("text", ["2 bedroom до 2000000", "от 2025000 до 3000000"])
+def test_year_pattern_ignores_prices(text):
+    assert UNSUPPORTED_RE.search(text) is None
@@ -1,5 +1,9 @@
-from .gpt_handler import process_users_query
+from .gpt_handler import process_users_query, warm_up_openai_client, close_openai_client
 
-from .other_utils import create_whatsapp_link, organize_by_building
+from .extraction_cache import extraction_cache
+
+from .other_utils import create_whatsapp_link, organize_by_building, property_details
+
+from .result_pages import PAGE_SIZE, pages_count, load_buildings_page, load_units_page, load_unit_details
 
 from .main_handler import process_real_estate_query
\ No newline at end of file
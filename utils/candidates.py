@@ -0,0 +1,181 @@
+import math
+import re
+from collections import defaultdict
+
+from loader import proj_settings
+
+# Транслитерация кириллицы в латиницу, близкая к тому, как пишутся названия в базе
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+}
+
+# Упрощения, сглаживающие разницу между транслитом и английским написанием
+# ("даунтаун" -> "dauntaun" и "downtown" -> "dauntaun")
+PHONETIC_REPLACEMENTS = [
+    ("ow", "au"), ("ou", "u"), ("ee", "i"), ("oo", "u"), ("kh", "h"), ("ph", "f"),
+    ("ck", "k"), ("qu", "kv"), ("x", "ks"), ("w", "v"), ("j", "dzh"), ("c", "k"),
+    ("y", "i"),
+]
+
+_non_word_re = re.compile(r"[^a-z0-9]+")
+_double_letter_re = re.compile(r"([a-z])\1+")
+
+
+def normalize_name(text):
+    """
+    Приведение текста к единому виду для нечеткого сравнения.
+
+    Текст переводится в нижний регистр и латиницу, повторяющиеся буквы
+    схлопываются, а близкие по звучанию сочетания заменяются одинаковыми.
+
+    Args:
+        text: Исходный текст на русском или английском
+
+    Returns:
+        str: Нормализованный текст из латинских слов, разделенных пробелами
+    """
+    text = "".join(CYRILLIC_TO_LATIN.get(char, char) for char in text.lower())
+    for source, target in PHONETIC_REPLACEMENTS:
+        text = text.replace(source, target)
+    text = _double_letter_re.sub(r"\1", text)
+
+    return _non_word_re.sub(" ", text).strip()
+
+
+def _trigrams(text):
+    """
+    Множество триграмм слов текста с границами слов, как в pg_trgm.
+
+    Args:
+        text: Нормализованный текст
+
+    Returns:
+        set: Множество триграмм
+    """
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+
+    return result
+
+
+class FuzzyIndex:
+    """
+    Триграммный индекс по списку названий.
+
+    Вес триграммы обратно пропорционален числу названий, в которых она
+    встречается, поэтому общие слова вроде "tower" или "residence" почти
+    не влияют на выбор.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._name_trigrams = [_trigrams(normalize_name(name)) for name in self.names]
+        self._postings = defaultdict(list)
+
+        for name_id, trigrams in enumerate(self._name_trigrams):
+            for trigram in trigrams:
+                self._postings[trigram].append(name_id)
+
+        total = len(self.names) or 1
+        self._idf = {trigram: math.log(1 + total / len(ids)) for trigram, ids in self._postings.items()}
+        self._name_weights = [sum(self._idf[trigram] for trigram in trigrams) or 1.0
+                              for trigrams in self._name_trigrams]
+
+    def search_scored(self, text, limit, min_score):
+        """
+        Поиск названий, которые вероятнее всего упомянуты в тексте, вместе с оценкой.
+
+        Args:
+            text: Текст запроса пользователя
+            limit: Максимальное количество названий в ответе
+            min_score: Минимальная доля веса названия, найденная в тексте (от 0 до 1)
+
+        Returns:
+            list: Пары (название, оценка) в порядке убывания похожести
+        """
+        scores = defaultdict(float)
+        for trigram in _trigrams(normalize_name(text)):
+            idf = self._idf.get(trigram)
+            if idf is None:
+                continue
+            for name_id in self._postings[trigram]:
+                scores[name_id] += idf
+
+        ranked = sorted(
+            ((score / self._name_weights[name_id], name_id) for name_id, score in scores.items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+
+        return [(self.names[name_id], score) for score, name_id in ranked[:limit] if score >= min_score]
+
+    def search(self, text, limit, min_score):
+        """
+        Поиск названий, которые вероятнее всего упомянуты в тексте.
+
+        Args:
+            text: Текст запроса пользователя
+            limit: Максимальное количество названий в ответе
+            min_score: Минимальная доля веса названия, найденная в тексте (от 0 до 1)
+
+        Returns:
+            list: Названия в порядке убывания похожести
+        """
+        return [name for name, score in self.search_scored(text, limit, min_score)]
+
+
+# Индексы строятся один раз на версию справочников
+_indexes = {}
+
+
+def get_catalog_indexes(catalog):
+    """
+    Триграммные индексы районов и зданий для текущей версии справочников.
+
+    Args:
+        catalog: Снимок справочников
+
+    Returns:
+        tuple: Индекс районов и индекс зданий
+    """
+    indexes = _indexes.get(catalog.version)
+    if indexes is None:
+        indexes = (FuzzyIndex(catalog.areas), FuzzyIndex(catalog.buildings))
+        _indexes.clear()
+        _indexes[catalog.version] = indexes
+
+    return indexes
+
+
+def select_catalog_candidates(catalog, query):
+    """
+    Отбор районов и зданий, которые стоит передать модели вместе с запросом.
+
+    Если в запросе не нашлось ни одного похожего названия, в промпт уходит
+    полный список, чтобы модель могла сопоставить название сама.
+
+    Args:
+        catalog: Снимок справочников
+        query: Запрос пользователя
+
+    Returns:
+        tuple: Текст списка районов и текст списка зданий для промпта
+    """
+    if not proj_settings.candidates_enabled:
+        return catalog.areas_text, catalog.buildings_text
+
+    areas_index, buildings_index = get_catalog_indexes(catalog)
+    limit = proj_settings.candidates_top_k
+    min_score = proj_settings.candidates_min_score
+
+    areas = areas_index.search(query, limit, min_score)
+    buildings = buildings_index.search(query, limit, min_score)
+
+    return (str(areas) if areas else catalog.areas_text,
+            str(buildings) if buildings else catalog.buildings_text)
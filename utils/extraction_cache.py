@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from loader import proj_settings
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_spaces_re = re.compile(r"\s+")
+_edge_punctuation_re = re.compile(r"^[\s.,!?;:]+|[\s.,!?;:]+$")
+
+
+def normalize_query(query):
+    """
+    Нормализация запроса пользователя для использования в ключе кеша.
+
+    Args:
+        query: Запрос пользователя
+
+    Returns:
+        str: Запрос в нижнем регистре без лишних пробелов и знаков по краям
+    """
+    query = query.lower().replace("ё", "е")
+    query = _spaces_re.sub(" ", query)
+
+    return _edge_punctuation_re.sub("", query)
+
+
+class ExtractionCache:
+    """
+    Кеш результатов извлечения критериев моделью.
+
+    Первый уровень - LRU в памяти процесса, второй (необязательный) - файл
+    SQLite, который переживает перезапуск бота. Ключ содержит версию
+    справочников, поэтому после их изменения старые записи не используются.
+    """
+
+    def __init__(self, max_size, ttl, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.version = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._connection = None
+        self._disk_lock = threading.Lock()
+
+        if path:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                "key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def make_key(query, catalog_version, known=None, question=None):
+        # Ответ на уточняющий вопрос зависит и от известных критериев, и от самого вопроса
+        key = f"{catalog_version}:{normalize_query(query)}"
+        if known or question:
+            key += ":" + json.dumps([known or {}, question or ""], ensure_ascii=False, sort_keys=True)
+
+        return key
+
+    def stats(self):
+        """
+        Счетчики попаданий и промахов.
+
+        Returns:
+            dict: Количество попаданий в память и на диск, промахов и записей в памяти
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+        }
+
+    def _get_memory(self, key):
+        item = self._memory.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._memory[key]
+            return None
+
+        self._memory.move_to_end(key)
+        return value
+
+    def _set_memory(self, key, value, expires_at):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _get_disk(self, key):
+        with self._disk_lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM extraction_cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _set_disk(self, key, value, expires_at):
+        with self._disk_lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, version, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, key.split(":", 1)[0], json.dumps(value, ensure_ascii=False), expires_at),
+            )
+            self._connection.commit()
+
+    def _purge_disk(self, keep_version):
+        with self._disk_lock:
+            if keep_version is None:
+                self._connection.execute("DELETE FROM extraction_cache")
+            else:
+                self._connection.execute("DELETE FROM extraction_cache WHERE version != ? OR expires_at < ?",
+                                         (keep_version, time.time()))
+            self._connection.commit()
+
+    async def get(self, key):
+        """
+        Получение сохраненного результата извлечения.
+
+        Args:
+            key: Ключ, полученный из make_key
+
+        Returns:
+            tuple | None: Сообщение модели, аргументы поиска и известные критерии или None при промахе
+        """
+        value = self._get_memory(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self._connection is not None:
+            row = await asyncio.to_thread(self._get_disk, key)
+            if row is not None:
+                value, expires_at = tuple(row[0]), row[1]
+                self._set_memory(key, value, expires_at)
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, value):
+        """
+        Сохранение результата извлечения.
+
+        Args:
+            key: Ключ, полученный из make_key
+            value: Сообщение модели, аргументы поиска и известные критерии
+        """
+        expires_at = time.time() + self.ttl
+        self._set_memory(key, value, expires_at)
+
+        if self._connection is not None:
+            await asyncio.to_thread(self._set_disk, key, list(value), expires_at)
+
+    async def invalidate(self, keep_version=None):
+        """
+        Удаление записей, относящихся к другим версиям справочников.
+
+        Args:
+            keep_version: Актуальная версия справочников; если не указана, кеш очищается полностью
+        """
+        self.version = keep_version
+        if keep_version is None:
+            self._memory.clear()
+        else:
+            prefix = f"{keep_version}:"
+            for key in [key for key in self._memory if not key.startswith(prefix)]:
+                del self._memory[key]
+
+        if self._connection is not None:
+            await asyncio.to_thread(self._purge_disk, keep_version)
+
+        logger.info(f"Кеш извлечения очищен, осталось записей: {len(self._memory)}, статистика: {self.stats()}")
+
+
+extraction_cache = ExtractionCache(
+    max_size=proj_settings.extraction_cache_size,
+    ttl=proj_settings.extraction_cache_ttl,
+    path=proj_settings.extraction_cache_path,
+)
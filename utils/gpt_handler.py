@@ -1,132 +1,364 @@
-from openai import OpenAI
+import asyncio
 import json
+import logging
+import random
 
-def process_users_query(query, areas, buildings):
-    client = OpenAI(api_key = 'TOKEN')
-
-    tools = [{
-        "type": "function",
-        "function": {
-            "name": "database_search",
-            "description": "Получить список подходящих объектов недвижимости",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    'min_price': {"type": "number",
-                                  "description": "Минимальная цена объекта"},
-                    'max_price': {"type": "number",
-                                  "description": "Максимальная цена объекта"},
-                    'type': {
-                        "type": "string",
-                        "enum": [
-                            "Apartment",
-                            "Penthouse",
-                            "Residental",
-                            "Townhouse",
-                            "Villa",
-                        ],
-                        "description": "Тип искомого объекта"
-                    },
-                    'purpose' : {
-                        "type": "string",
-                        "enum": [
-                            "",
-                            "For Sale",
-                            "For Rent"
-                        ],
-                        "description": "Объект для продажи или для аренды"
-                    },
-                    'completion' :{
-                        "type": "string",
-                        "enum": [
-                            '',
-                            "Off-Plan",
-                            "Ready"
-                        ],
-                        "description": "Готов объект недвижимости или нет"
-                    },
-                    'handover_date' : {
-                        "type": "string",
-                        "description": "Дата готовности"
-                    },
-                    'furnishing' : {
-                        "type": "string",
-                        "enum": [
-                            '',
-                            "Furnished",
-                            "Unfurnished"
-                        ],
-                        "description": "Мебелирован объект или нет"
-                    },
-                    'studio' : {
-                        "type": "string",
-                        "enum": [
-                            '',
-                            "Studio",
-                            "None"
-                        ],
-                        "description": "Объект - студия или нет"
-                    },
-                    'sqft' : {"type": "number", "description": "Площадь объекта"},
-                    'bath_count': {"type": "number", "description": "Количество ванн"},
-                    'bedroom_count': {"type": "number", "description": "Количество спален"},
-                    'view' : {
-                        "type": "string",
-                        "description": "Название объекта, вид на который нужен"
-                    },
-                    'vacant' : {
-                        "type": "string",
-                        "enum": [
-                            '',
-                            "Vacant",
-                            "Rented",
-                            "Tenanted"
-                        ],
-                        "description": "Свободно или занято"
-                    },
-                    'area' : {
-                        "type": "string",
-                        "description": "Название района"
-                    },
-                    'building': {
-                        "type": "string",
-                        "description": "Название здания"
-                    },
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+
+from loader import proj_settings
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Коды ответа, при которых запрос к API имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_client: AsyncOpenAI | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+
+TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "database_search",
+        "description": "Получить список подходящих объектов недвижимости",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                'min_price': {"type": "number",
+                              "description": "Минимальная цена объекта"},
+                'max_price': {"type": "number",
+                              "description": "Максимальная цена объекта"},
+                'type': {
+                    "type": "string",
+                    "enum": [
+                        "Apartment",
+                        "Penthouse",
+                        "Residental",
+                        "Townhouse",
+                        "Villa",
+                    ],
+                    "description": "Тип искомого объекта"
+                },
+                'purpose' : {
+                    "type": "string",
+                    "enum": [
+                        "",
+                        "For Sale",
+                        "For Rent"
+                    ],
+                    "description": "Объект для продажи или для аренды"
+                },
+                'completion' :{
+                    "type": "string",
+                    "enum": [
+                        '',
+                        "Off-Plan",
+                        "Ready"
+                    ],
+                    "description": "Готов объект недвижимости или нет"
+                },
+                'handover_date' : {
+                    "type": "string",
+                    "description": "Дата готовности"
+                },
+                'furnishing' : {
+                    "type": "string",
+                    "enum": [
+                        '',
+                        "Furnished",
+                        "Unfurnished"
+                    ],
+                    "description": "Мебелирован объект или нет"
+                },
+                'studio' : {
+                    "type": "string",
+                    "enum": [
+                        '',
+                        "Studio",
+                        "None"
+                    ],
+                    "description": "Объект - студия или нет"
+                },
+                'sqft' : {"type": "number", "description": "Площадь объекта"},
+                'bath_count': {"type": "number", "description": "Количество ванн"},
+                'bedroom_count': {"type": "number", "description": "Количество спален"},
+                'view' : {
+                    "type": "string",
+                    "description": "Название объекта, вид на который нужен"
+                },
+                'vacant' : {
+                    "type": "string",
+                    "enum": [
+                        '',
+                        "Vacant",
+                        "Rented",
+                        "Tenanted"
+                    ],
+                    "description": "Свободно или занято"
+                },
+                'area' : {
+                    "type": "string",
+                    "description": "Название района"
+                },
+                'building': {
+                    "type": "string",
+                    "description": "Название здания"
                 },
-                "required": ["min_price", "max_price","type",'purpose','completion','area','building','vacant','view','bedroom_count','bath_count','sqft','studio','furnishing','handover_date'],
-                "additionalProperties": False
             },
-            "strict": True
-        }
-    }]
-
-
-    prompt = f'''Твоя задача - подобрать пользователю по запросу объекты недвижимости.
-    Тебе необходимо определить критерии, по которым пользователь ищет объект недвижимости. Минимальная необходимая информация - количество спален (bedroom_count), минимальная цена (min_price), максимальная цена (max_price) и тип объекта (type).
-    Если пользователь не сообщил какой-то из обязательных критериев, задавай уточняющие вопросы. Определив критерии, вызови функцию database_search с соответствующими аргументами.
-    
-    
-    Возможные названия зданий:
-    {buildings}
-    
-    Возможные названия районов
-    {areas}
-    
-    Запрос пользователя:
-    {query}
-    '''
-
-
-    messages = [{"role": "user", "content": prompt}]
-
-    completion = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=messages,
-        tools=tools,
-    )
-
-    if completion.choices[0].message.tool_calls:
-        argus = completion.choices[0].message.tool_calls[0].function.arguments
-        return completion.choices[0].message.content, json.loads(argus)
-
-    return completion.choices[0].message.content, None
+            "required": ["min_price", "max_price","type",'purpose','completion','area','building','vacant','view','bedroom_count','bath_count','sqft','studio','furnishing','handover_date'],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+}]
+
+# Критерии поиска - аргументы database_search
+SEARCH_PROPERTIES = TOOLS[0]["function"]["parameters"]["properties"]
+
+# Схема функций - часть неизменного начала промпта, она не меняется между запросами
+TOOLS.append({
+    "type": "function",
+    "function": {
+        "name": "ask_user",
+        "description": "Задать пользователю уточняющий вопрос и сохранить уже известные критерии",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "question": {"type": "string", "description": "Уточняющий вопрос пользователю"},
+                "known": {
+                    "type": "object",
+                    "properties": SEARCH_PROPERTIES,
+                    "description": "Критерии, которые пользователь уже сообщил",
+                },
+            },
+            "required": ["question", "known"],
+        },
+    }
+})
+
+# Неизменное начало промпта: инструкции не зависят ни от запроса, ни от справочников,
+# поэтому вместе со схемой функций попадают в кеш промптов провайдера
+SYSTEM_PROMPT = """Твоя задача - подобрать пользователю по запросу объекты недвижимости.
+Тебе необходимо определить критерии, по которым пользователь ищет объект недвижимости. \
+Минимальная необходимая информация - количество спален (bedroom_count), минимальная цена (min_price), \
+максимальная цена (max_price) и тип объекта (type).
+Если пользователь не сообщил какой-то из обязательных критериев, вызови функцию ask_user с уточняющим вопросом \
+и всеми критериями, которые уже известны. Определив критерии, вызови функцию database_search с соответствующими \
+аргументами.
+Если переданы критерии, известные из прошлых сообщений, дополни их новым сообщением пользователя: \
+новое сообщение важнее, если противоречит им."""
+
+BUILDINGS_PROMPT = """Возможные названия зданий:
+{buildings}"""
+
+AREAS_PROMPT = """Возможные названия районов
+{areas}"""
+
+
+def get_openai_client():
+    """
+    Получение общего асинхронного клиента OpenAI.
+
+    Клиент создается один раз и держит пул keep-alive соединений, поэтому
+    запросы не тратят время на повторную установку TLS-соединения.
+
+    Returns:
+        AsyncOpenAI: Асинхронный клиент OpenAI
+    """
+    global _client, _semaphore
+
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=proj_settings.openai_api_key,
+            base_url=proj_settings.openai_base_url,
+            timeout=proj_settings.openai_timeout,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=proj_settings.openai_timeout,
+                limits=httpx.Limits(max_connections=proj_settings.openai_max_concurrency,
+                                    max_keepalive_connections=proj_settings.openai_max_concurrency),
+            ),
+        )
+        _semaphore = asyncio.Semaphore(proj_settings.openai_max_concurrency)
+
+    return _client
+
+
+def _load_openai_client():
+    client = get_openai_client()
+    # Ресурсы API библиотека openai импортирует только при первом обращении к client.chat
+    client.chat.completions
+
+    return client
+
+
+async def warm_up_openai_client():
+    """
+    Подготовка клиента OpenAI при запуске бота, чтобы первый запрос к модели
+    не ждал создания SSL-контекста и импорта модулей, которые openai и httpx
+    загружают только при первом обращении.
+
+    Клиент создается в отдельном потоке, затем выполняется запрос списка
+    моделей: он проходит весь путь HTTP-запроса и заодно проверяет ключ API.
+    """
+    client = await asyncio.to_thread(_load_openai_client)
+    try:
+        await client.models.list()
+    except APIStatusError as e:
+        # Ответ с ошибкой тоже прогревает клиент, а список моделей есть не у всех совместимых API
+        logger.warning(f"Запрос списка моделей при запуске вернул {e.status_code}")
+
+
+async def close_openai_client():
+    """
+    Закрытие клиента OpenAI и его HTTP-соединений при остановке бота.
+    """
+    global _client, _semaphore
+
+    if _client is not None:
+        await _client.close()
+        _client = None
+        _semaphore = None
+
+
+def _retry_delay(attempt, error):
+    """
+    Расчет паузы перед повторной попыткой: экспоненциальный рост с полным джиттером.
+
+    Args:
+        attempt: Номер неудачной попытки, начиная с нуля
+        error: Исключение, вызвавшее повтор
+
+    Returns:
+        float: Пауза в секундах
+    """
+    retry_after = None
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+
+    if retry_after:
+        try:
+            return float(retry_after) + random.uniform(0, proj_settings.openai_retry_base_delay)
+        except ValueError:
+            pass
+
+    return random.uniform(0, proj_settings.openai_retry_base_delay * 2 ** attempt)
+
+
+async def _create_completion(messages):
+    """
+    Вызов chat.completions.create с ограничением числа одновременных запросов
+    и повтором при ошибках 429/5xx и сетевых сбоях.
+
+    Args:
+        messages: Список сообщений для модели
+
+    Returns:
+        ChatCompletion: Ответ модели
+    """
+    client = get_openai_client()
+
+    for attempt in range(proj_settings.openai_max_retries + 1):
+        try:
+            async with _semaphore:
+                return await client.chat.completions.create(
+                    model=proj_settings.openai_model,
+                    messages=messages,
+                    tools=TOOLS,
+                    tool_choice="required",
+                )
+        except (APIConnectionError, APITimeoutError, APIStatusError) as e:
+            if isinstance(e, APIStatusError) and e.status_code not in RETRYABLE_STATUS_CODES:
+                raise
+            if attempt == proj_settings.openai_max_retries:
+                raise
+
+            delay = _retry_delay(attempt, e)
+            logger.warning(f"Ошибка запроса к OpenAI ({e.__class__.__name__}), повтор через {delay:.2f} с")
+            await asyncio.sleep(delay)
+
+
+def build_messages(query, areas, buildings, known=None, question=None):
+    """
+    Формирование сообщений для модели.
+
+    Сначала идут инструкции и справочники, которые не зависят от запроса,
+    затем критерии и вопрос из прошлых сообщений диалога и в конце - только
+    новое сообщение пользователя. Так начало промпта совпадает между
+    запросами и кешируется провайдером.
+
+    С отбором кандидатов (candidates_enabled) список, в котором нашлись
+    похожие названия, свой для каждого запроса. Такой список идет после
+    полного, который не изменился: полный список длиннее, поэтому списки
+    упорядочены по убыванию длины. Если кандидаты нашлись в обоих
+    справочниках, общим началом остаются только инструкции со схемой функций,
+    и для кеша провайдера их может не хватить (кешируется начало от 1024
+    токенов). Это осознанный обмен: короткий промпт без кеша дешевле и
+    быстрее полного справочника из кеша (см. benchmarks/multi_turn.py).
+
+    Args:
+        query: Новое сообщение пользователя
+        areas: Текст списка районов
+        buildings: Текст списка зданий
+        known: Критерии, известные из прошлых сообщений
+        question: Уточняющий вопрос, на который отвечает пользователь
+
+    Returns:
+        list: Список сообщений для chat.completions.create
+    """
+    catalog_prompts = sorted((BUILDINGS_PROMPT.format(buildings=buildings), AREAS_PROMPT.format(areas=areas)),
+                             key=len, reverse=True)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *({"role": "system", "content": prompt} for prompt in catalog_prompts),
+    ]
+    if known:
+        messages.append({"role": "system", "content": "Критерии, известные из прошлых сообщений: "
+                                                      + json.dumps(known, ensure_ascii=False, sort_keys=True,
+                                                                   separators=(",", ":"))})
+    if question:
+        messages.append({"role": "assistant", "content": question})
+    messages.append({"role": "user", "content": query})
+
+    return messages
+
+
+def _known_criteria(arguments):
+    # Пустые значения не несут информации и только удлиняют промпт следующего сообщения
+    return {key: value for key, value in arguments.items() if key in SEARCH_PROPERTIES and value not in (None, "")}
+
+
+async def process_users_query(query, areas, buildings, known=None, question=None):
+    """
+    Извлечение критериев поиска моделью по новому сообщению пользователя.
+
+    Args:
+        query: Новое сообщение пользователя
+        areas: Текст списка районов
+        buildings: Текст списка зданий
+        known: Критерии, известные из прошлых сообщений
+        question: Уточняющий вопрос, на который отвечает пользователь
+
+    Returns:
+        tuple: Сообщение модели, аргументы database_search (или None, если нужен
+            уточняющий вопрос) и критерии, известные после этого сообщения
+    """
+    known = known or {}
+    completion = await _create_completion(build_messages(query, areas, buildings, known, question))
+    message = completion.choices[0].message
+
+    if not message.tool_calls:
+        return message.content, None, known
+
+    arguments = json.loads(message.tool_calls[0].function.arguments)
+    if message.tool_calls[0].function.name == "ask_user":
+        known = {**known, **_known_criteria(arguments.get("known") or {})}
+        return arguments.get("question") or message.content, None, known
+
+    # Критерий, который модель оставила пустым, берется из прошлых сообщений
+    arguments.update((key, value) for key, value in known.items() if arguments.get(key) in (None, ""))
+    return message.content, arguments, known
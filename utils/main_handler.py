@@ -1,9 +1,14 @@
-from database import search_database, get_available_buildings, get_available_areas
+from database import (count_search_results, get_catalog, TIER_ORIGINAL, TIER_PRICE_INCREASED, TIER_RENT,
+                      PRICE_INCREASE_FACTOR)
 from .gpt_handler import process_users_query
-from .other_utils import create_whatsapp_link, organize_by_building
+from .candidates import select_catalog_candidates
+from .extraction_cache import extraction_cache
+from .rule_extractor import extract_search_arguments
+from .other_utils import create_whatsapp_link
 import logging
 
 from loader import bot, proj_settings
+from metrics import stage_timer
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO,
@@ -11,23 +16,53 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 
-async def process_real_estate_query(natural_language_query, user_id: int):
+async def process_real_estate_query(natural_language_query, user_id: int, on_criteria=None, context=None):
     """
     Основная функция для обработки запроса по недвижимости.
 
+    Правила разбирают весь текст диалога, а модели уходит только новое
+    сообщение вместе с критериями, известными из прошлых сообщений.
+
     Args:
-        natural_language_query: Запрос пользователя на естественном языке
+        natural_language_query: Запрос пользователя на естественном языке - весь текст диалога
+        on_criteria: Асинхронная функция, которая вызывается с критериями поиска сразу после
+            их извлечения, до подсчета результатов
+        context: Продолжение диалога {"text", "known", "question"}: новое сообщение, известные
+            критерии и заданный уточняющий вопрос. Без него весь запрос - первое сообщение
 
     Returns:
-        dict: Результат поиска с группировкой по зданиям и статусом операции
+        dict: Статус операции, сообщение и сохраняемый поиск для постраничной загрузки результатов
     """
     logger.info(f"Обработка запроса: {natural_language_query}")
 
-    buildings = get_available_buildings()
-    areas = get_available_areas()
+    with stage_timer("catalog"):
+        catalog = await get_catalog()
+    if extraction_cache.version != catalog.version:
+        await extraction_cache.invalidate(keep_version=catalog.version)
+
+    message, arguments = None, None
+    context = context or {"text": natural_language_query}
+    known, question = context.get("known") or {}, context.get("question")
+    if proj_settings.rule_extractor_enabled:
+        with stage_timer("rule_extraction"):
+            arguments = extract_search_arguments(natural_language_query, catalog)
 
-    message, arguments = process_users_query(natural_language_query, areas,
-                                             buildings)
+    if arguments is not None:
+        logger.info("Критерии извлечены правилами, запрос к модели не нужен")
+    else:
+        cache_key = extraction_cache.make_key(context["text"], catalog.version, known, question)
+        with stage_timer("extraction_cache"):
+            cached = await extraction_cache.get(cache_key)
+        if cached is not None:
+            # Записи, сохраненные до появления известных критериев, - пары без них
+            message, arguments, known = (*cached, known)[:3]
+        else:
+            with stage_timer("catalog_candidates"):
+                areas, buildings = select_catalog_candidates(catalog, context["text"])
+            with stage_timer("llm"):
+                message, arguments, known = await process_users_query(context["text"], areas, buildings,
+                                                                       known, question)
+            await extraction_cache.set(cache_key, (message, arguments, known))
 
     if message:
         logger.info(message)
@@ -57,116 +92,85 @@ async def process_real_estate_query(natural_language_query, user_id: int):
             await bot.send_message(chat_id=user_id, text=f"Поиск недвижимости с параметрами: purpose={purpose}, beds={beds}, "
                                                         f"type={property_type}, price_min={price_min}, price_max={price_max}")
 
-        # Шаг 2: Поиск с исходными параметрами
-        original_results = search_database(
-            purpose = purpose,
-            beds=beds,
-            property_type=property_type,
-            area=area,
-            building=building,
-            view=view,
-            price_min=price_min,
-            price_max=price_max,
-            baths=baths,
-            sqft_min=sqft_min,
-            sqft_max=sqft_max,
-            furnishing=furnishing,
-            completion=completion,
-            vacant=vacant,
-            handover_date=handover_date,
-        )
-
-        # Если найдены результаты, организуем их по зданиям
-        if original_results:
-            logger.info(f"Найдено {len(original_results)} объектов по исходным параметрам")
+        criteria = {
+            "purpose": purpose,
+            "beds": beds,
+            "property_type": property_type,
+            "area": area,
+            "building": building,
+            "view": view,
+            "price_min": price_min,
+            "price_max": price_max,
+            "baths": baths,
+            "sqft_min": sqft_min,
+            "sqft_max": sqft_max,
+            "furnishing": furnishing,
+            "completion": completion,
+            "vacant": vacant,
+            "handover_date": handover_date,
+        }
+        # Пустые критерии не участвуют в поиске, и хранить их в состоянии пользователя не нужно
+        criteria = {key: value for key, value in criteria.items() if value is not None and value != ""}
+        if on_criteria is not None:
+            await on_criteria(criteria)
+
+        # Шаг 2: Выбор уровня ослабления критериев и подсчет результатов за один запрос.
+        # Сами объекты подгружаются постранично при просмотре
+        with stage_timer("count"):
+            tier, total_units, total_buildings = await count_search_results(criteria)
+        search = {"criteria": criteria, "tier": tier}
+
+        if tier == TIER_ORIGINAL:
+            logger.info(f"Найдено {total_units} объектов по исходным параметрам")
             return {
                 "status": "success",
-                "message": f"Найдено {len(original_results)} объектов по вашему запросу",
-                "results": organize_by_building(original_results)
+                "message": f"Найдено {total_units} объектов по вашему запросу",
+                "search": search,
+                "total_units": total_units,
+                "total_buildings": total_buildings
             }
 
         logger.info("Не найдено объектов по исходным параметрам, увеличиваем цену на 20%")
         await bot.send_message(chat_id=user_id, text="Не найдено объектов по исходным параметрам, увеличиваем цену на 20%")
 
-        # Шаг 3: Если нет результатов, увеличиваем цену на 20% и ищем снова
-        if price_max:
-            increased_price_max = price_max * 1.2
-
-            logger.info(f"Поиск с увеличенной ценой до {increased_price_max}")
-
-            increased_price_results = search_database(
-                purpose = purpose,
-                beds=beds,
-                property_type=property_type,
-                area=area,
-                building=building,
-                view=view,
-                price_min=price_min,
-                price_max=increased_price_max,
-                baths=baths,
-                sqft_min=sqft_min,
-                sqft_max=sqft_max,
-                furnishing=furnishing,
-                completion=completion,
-                vacant=vacant,
-                handover_date=handover_date,
-            )
-
-            # Если найдены результаты с увеличенной ценой, организуем их по зданиям
-            if increased_price_results:
-                logger.info(f"Найдено {len(increased_price_results)} объектов с увеличенной ценой")
-                return {
-                    "status": "price_increased",
-                    "message": f"Найдено {len(increased_price_results)} объектов с увеличенной ценой (до {increased_price_max:,} руб.)",
-                    "results": organize_by_building(increased_price_results)
-                }
+        # Шаг 3: Результаты с увеличенной на 20% ценой
+        if tier == TIER_PRICE_INCREASED:
+            increased_price_max = price_max * PRICE_INCREASE_FACTOR
+            logger.info(f"Найдено {total_units} объектов с увеличенной ценой")
+            return {
+                "status": "price_increased",
+                "message": f"Найдено {total_units} объектов с увеличенной ценой (до {increased_price_max:,} руб.)",
+                "search": search,
+                "total_units": total_units,
+                "total_buildings": total_buildings
+            }
 
         logger.info("Не найдено объектов даже с увеличенной ценой")
         await bot.send_message(chat_id=user_id, text="Не найдено объектов даже с увеличенной ценой")
 
-        # Шаг 4: Если все еще нет результатов и изначально искали для покупки,
-        # проверяем варианты аренды
-        if purpose and purpose.lower() == "for sale":
-            logger.info("Поиск вариантов аренды вместо покупки")
-
-            rental_results = search_database(
-                purpose = 'For Rent',
-                beds=beds,
-                property_type=property_type,
-                area=area,
-                building=building,
-                view=view,
-                price_min=price_min,
-                price_max=increased_price_max,
-                baths=baths,
-                sqft_min=None,
-                sqft_max=None,
-                furnishing=furnishing,
-                completion=completion,
-                vacant=vacant,
-                handover_date=handover_date,
-            )
-
-            # Если найдены варианты аренды, организуем их по зданиям
-            if rental_results:
-                logger.info(f"Найдено {len(rental_results)} вариантов аренды")
-                return {
-                    "status": "rent_option",
-                    "message": f"Не найдено объектов для покупки, но найдено {len(rental_results)} вариантов аренды",
-                    "results": organize_by_building(rental_results)
-                }
-
+        # Шаг 4: Варианты аренды, если изначально искали для покупки
+        if tier == TIER_RENT:
+            logger.info(f"Найдено {total_units} вариантов аренды")
+            return {
+                "status": "rent_option",
+                "message": f"Не найдено объектов для покупки, но найдено {total_units} вариантов аренды",
+                "search": search,
+                "total_units": total_units,
+                "total_buildings": total_buildings
+            }
 
         # Если не найдено результатов ни в одном поиске, возвращаем пустой словарь
         return {
             "status": "not_found",
             "message": "Не найдено подходящих объектов недвижимости",
-            "results": {}
+            "total_units": 0,
+            "total_buildings": 0
         }
     else:
         return {
             "status": "no_search",
-            "message": message
+            "message": message,
+            "context": {"known": known, "question": message}
         }
 
 
@@ -17,38 +17,50 @@ def format_property_info(prop):
     Форматирование информации о недвижимости для вывода пользователю.
 
     Args:
-        prop: Словарь с данными о недвижимости
+        prop: Объект недвижимости Unit
 
     Returns:
         str: Отформатированная строка с информацией
     """
     # Базовая информация, которая есть у всех объектов
-    info = f"ID: {prop['id']}, "
-    info += f"{prop.get('beds', 'Н/Д')} спален, "
-    info += f"{prop.get('baths', 'Н/Д')} ванных, "
-    info += f"{prop.get('sqft', 'Н/Д')} кв.футов, "
-    info += f"Цена: {prop.get('price', 0):,} дубайских тугриков, "
+    info = f"ID: {prop.id}, "
+    info += f"{'Н/Д' if prop.beds is None else prop.beds} спален, "
+    info += f"{'Н/Д' if prop.baths is None else prop.baths} ванных, "
+    info += f"{'Н/Д' if prop.sqft is None else prop.sqft} кв.футов, "
+    info += f"Цена: {prop.price:,} дубайских тугриков, "
 
     # Добавляем вид, если он указан
-    if prop.get('view'):
-        info += f"Вид: {prop['view']}, "
+    if prop.view:
+        info += f"Вид: {prop.view}, "
 
     # Добавляем статус готовности, если он указан
-    if prop.get('completion'):
-        info += f"Статус: {prop['completion']}, "
+    if prop.completion:
+        info += f"Статус: {prop.completion}, "
 
     # Добавляем меблировку, если она указана
-    if prop.get('furnishing'):
-        info += f"Меблировка: {prop['furnishing']}"
+    if prop.furnishing:
+        info += f"Меблировка: {prop.furnishing}"
 
     return info
 
+def property_details(prop):
+    """
+    Характеристики объекта для подстановки в карточку объекта.
+
+    Args:
+        prop: Объект недвижимости Unit
+
+    Returns:
+        dict: Словарь с характеристиками объекта
+    """
+    return prop._asdict()
+
 def organize_by_building(properties):
     """
     Организация объектов недвижимости по зданиям.
 
     Args:
-        properties: Список словарей с объектами недвижимости
+        properties: Список объектов Unit
 
     Returns:
         dict: Словарь, где ключи - названия зданий, значения - списки объектов
@@ -56,33 +68,11 @@ def organize_by_building(properties):
     result = {}
 
     for prop in properties:
-        building_name = prop.get("building", "Неизвестное здание")
-
-        if building_name not in result:
-            result[building_name] = []
-
-        # Создаем новый словарь со всеми характеристиками объекта
-        property_details = {
-            'id': prop.get('id'),
-            'price': prop.get('price'),
-            'type_unit': prop.get('type_unit'),
-            'purpose': prop.get('purpose'),
-            'completion': prop.get('completion'),
-            'handover_date': prop.get('handover_date'),
-            'furnishing': prop.get('furnishing'),
-            'studio': prop.get('Studio'),
-            'sqft': prop.get('sqft'),
-            'baths': prop.get('Baths'),
-            'beds': prop.get('Beds'),
-            'view': prop.get('view'),
-            'vacant': prop.get('vacant'),
-            'agent_name': prop.get('agent_name'),
-            'agent_whatsapp': prop.get('agent_whatsapp'),
-            'area': prop.get('area'),
-            'building': building_name
-        }
-
-        result[building_name].append(property_details)
+        if prop.building not in result:
+            result[prop.building] = []
+
+        # Unit неизменяем, поэтому в группу попадает сам объект, без копии
+        result[prop.building].append(prop)
 
     return result
 
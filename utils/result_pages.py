@@ -0,0 +1,122 @@
+import math
+
+from database import get_unit, search_buildings_page, search_units_page
+from metrics import stage_timer
+from .other_utils import property_details
+
+# Количество кнопок на одной странице результатов
+PAGE_SIZE = 5
+
+
+def pages_count(total):
+    # Пока количество не подсчитано, известна только первая страница
+    if total is None:
+        return 1
+
+    return max(1, math.ceil(total / PAGE_SIZE))
+
+
+async def _load_page(fetch_page, page, action, total):
+    """
+    Загрузка страницы по ключу с переходом по кругу, как в пагинации клавиатур.
+
+    Args:
+        fetch_page: Функция выборки страницы с аргументами limit, after, before, from_end
+        page: Состояние текущей страницы {"index", "first_key", "last_key"} или None
+        action: "first", "next" или "back"
+        total: Общее количество элементов или None, если оно еще не подсчитано
+
+    Returns:
+        tuple: Строки новой страницы и ее номер, начиная с нуля
+    """
+    last_index = pages_count(total) - 1
+    index = page["index"] if page else 0
+    rows = []
+
+    if action == "next" and index < last_index:
+        rows = await fetch_page(limit=PAGE_SIZE, after=page["last_key"])
+        index += 1
+    elif action == "back" and index > 0:
+        rows = await fetch_page(limit=PAGE_SIZE, before=page["first_key"])
+        index -= 1
+    elif action == "back" and last_index > 0:
+        rows = await fetch_page(limit=total - PAGE_SIZE * last_index, from_end=True)
+        index = last_index
+
+    # Первая страница, переход с последней на первую или данные изменились между нажатиями
+    if not rows:
+        rows = await fetch_page(limit=PAGE_SIZE)
+        index = 0
+
+    return rows, index
+
+
+async def load_buildings_page(search, page, action, total):
+    """
+    Загрузка страницы зданий для результатов поиска.
+
+    Args:
+        search: Сохраненный поиск {"criteria", "tier"}
+        page: Состояние текущей страницы или None для первой
+        action: "first", "next" или "back"
+        total: Количество зданий
+
+    Returns:
+        tuple: Названия зданий и новое состояние страницы с количеством объектов каждого здания
+    """
+    async def fetch_page(**kwargs):
+        return await search_buildings_page(search["criteria"], search["tier"], **kwargs)
+
+    with stage_timer("buildings_page"):
+        rows, index = await _load_page(fetch_page, page, action, total)
+    names = [row["building"] for row in rows]
+
+    return names, {
+        "index": index,
+        "first_key": [str(rows[0]["min_price"]), rows[0]["building"]] if rows else None,
+        "last_key": [str(rows[-1]["min_price"]), rows[-1]["building"]] if rows else None,
+        "units": [row["units"] for row in rows],
+    }
+
+
+async def load_units_page(search, building, page, action, total):
+    """
+    Загрузка страницы объектов одного здания.
+
+    Args:
+        search: Сохраненный поиск {"criteria", "tier"}
+        building: Название здания
+        page: Состояние текущей страницы или None для первой
+        action: "first", "next" или "back"
+        total: Количество объектов в здании
+
+    Returns:
+        tuple: Объекты Unit и новое состояние страницы
+    """
+    async def fetch_page(**kwargs):
+        return await search_units_page(search["criteria"], search["tier"], building, **kwargs)
+
+    with stage_timer("units_page"):
+        rows, index = await _load_page(fetch_page, page, action, total)
+
+    return rows, {
+        "index": index,
+        "first_key": [str(rows[0].price), rows[0].id] if rows else None,
+        "last_key": [str(rows[-1].price), rows[-1].id] if rows else None,
+    }
+
+
+async def load_unit_details(unit_id):
+    """
+    Загрузка характеристик одного объекта для карточки объекта.
+
+    Args:
+        unit_id: Идентификатор объекта
+
+    Returns:
+        dict | None: Характеристики объекта или None, если объект больше не доступен
+    """
+    with stage_timer("unit_details"):
+        unit = await get_unit(unit_id)
+
+    return property_details(unit) if unit else None
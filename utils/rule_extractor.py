@@ -0,0 +1,259 @@
+import re
+
+from loader import proj_settings
+from .candidates import get_catalog_indexes
+
+# Числительные, которыми обычно записывают количество спален и ванных
+NUMBER_WORD_STEMS = [
+    ("одн", 1), ("один", 1), ("one", 1),
+    ("дв", 2), ("two", 2),
+    ("три", 3), ("трех", 3), ("трем", 3), ("three", 3),
+    ("четыр", 4), ("four", 4),
+    ("пят", 5), ("five", 5),
+    ("шест", 6), ("six", 6),
+]
+_number_word = (r"(?:одн(?:а|у|ой|им|ого)|один|дв(?:а|е|ух|умя)|три|тр(?:ех|емя)|четыр(?:е|ех|ьмя)"
+                r"|пят(?:ь|и|ью)|шест(?:ь|и|ью)|one|two|three|four|five|six)")
+_count = rf"(?P<count>\d+|{_number_word})"
+
+BEDROOMS_RE = re.compile(
+    rf"\b{_count}(?:-?х)?[\s-]*(?:спал\w*|bed\w*|br|bdr\w*)\b"
+    r"|\b(?P<prefix>одно|дву|двух|трех|четырех|пяти|шести)[\s-]*спальн\w*"
+)
+# Диапазон или варианты количества спален ("2-3 спальни", "от 2 до 3 спален", "1 или 2 спальни"):
+# число перед найденным количеством или после него. После количества "до" и запятая
+# обычно начинают цену или следующий критерий, поэтому там они не учитываются
+_alternative = r"(?:-|–|—|/|или|либо|or)"
+BEDROOMS_BEFORE_RE = re.compile(rf"(?:\d+|{_number_word})(?:-?х)?\s*(?:{_alternative}|,|до|to)\s*$")
+BEDROOMS_AFTER_RE = re.compile(rf"^\s*{_alternative}\s*(?:\d+|{_number_word})\b")
+BATHS_RE = re.compile(rf"\b{_count}[\s-]*(?:ванн\w*|сануз\w*|bath\w*)\b")
+SQFT_RE = re.compile(r"(?P<value>\d[\d\s]*\d|\d)\s*(?:sqft|sq\.?\s*ft|кв\.?\s*фут\w*|square\s+f(?:ee|oo)t)")
+STUDIO_RE = re.compile(r"\b(?:студи\w*|studio)\b")
+
+PROPERTY_TYPES = [
+    ("Penthouse", re.compile(r"\b(?:пентхаус\w*|penthouse\w*)\b")),
+    ("Townhouse", re.compile(r"\b(?:таунхаус\w*|townhouse\w*)\b")),
+    ("Villa", re.compile(r"\b(?:вилл\w*|villa\w*)\b")),
+    ("Apartment", re.compile(r"\b(?:апартамент\w*|квартир\w*|apartment\w*|flat\w*)\b")),
+]
+PURPOSES = [
+    ("For Rent", re.compile(r"\b(?:аренд\w*|снять|сниму|арендовать|rent\w*|lease)\b")),
+    ("For Sale", re.compile(r"\b(?:купить|куплю|покупк\w*|продаж\w*|buy\w*|purchase|sale)\b")),
+]
+FURNISHING = [
+    ("Unfurnished", re.compile(r"\b(?:без\s+мебели|unfurnished)\b")),
+    ("Furnished", re.compile(r"\b(?:с\s+мебелью|мебелирован\w*|меблирован\w*|furnished)\b")),
+]
+COMPLETION = [
+    ("Off-Plan", re.compile(r"\b(?:off[\s-]?plan|строящ\w*|на\s+стадии\s+строительства)\b")),
+    ("Ready", re.compile(r"\b(?:готов\w*|ready)\b")),
+]
+
+# Цена: число с необязательным множителем ("1.5 млн", "500k", "4 000 000") и валютой
+_price = r"\d{1,3}(?:[  ]\d{3})+|\d+(?:[.,]\d+)?"
+_multiplier = r"(?:млн\w*|миллион\w*|mln|million|m|тыс\w*|thousand|k|к)\b\.?"
+_currency = r"(?:aed|дирхам\w*|usd|доллар\w*|руб\w*|eur\w*|евро|\$|€)"
+PRICE_RANGE_RE = re.compile(
+    rf"(?P<keyword>\bот|\bfrom|\bbetween)?\s*(?P<min>{_price})\s*(?P<min_mult>{_multiplier})?\s*"
+    rf"(?:до|-|–|—|to|and)\s*(?P<max>{_price})\s*(?P<max_mult>{_multiplier})?\s*(?P<currency>{_currency})?"
+)
+PRICE_MAX_RE = re.compile(
+    rf"(?:\bдо|\bне\s+дороже|\bмаксимум|\bбюджет\w*|\bup\s+to|\bunder|\bbelow|\bmax\w*|\bbudget)\s*"
+    rf"(?P<max>{_price})\s*(?P<max_mult>{_multiplier})?\s*(?P<currency>{_currency})?"
+)
+# Слово о цене прямо перед диапазоном ("цена 4000000-7000000")
+PRICE_CONTEXT_RE = re.compile(r"(?:цен\w*|стоимост\w*|бюджет\w*|price|budget|cost)\s*:?\s*$")
+# Число без множителя и валюты меньше этого ценой не считается ("10-15 минут", "до 15 минут")
+MIN_BARE_PRICE = 1000
+
+# Критерии, которые правилами не разбираются: если они упомянуты, запрос уходит в модель
+UNSUPPORTED_RE = re.compile(
+    r"\b(?:вид\w*|view\w*|свобод\w*|vacant|сдан\w*|сдач\w*|tenant\w*|rented|handover|"
+    r"район\w*|area|здани\w*|building|tower|башн\w*|кв\.?\s*м|м2|метр\w*|sq\.?\s*m|"
+    r"не\s+(?!дороже|больше|более)|без\s+(?!мебели)|кроме|except|not\b|20\d\d\b)"
+)
+
+# Порог уверенности для сопоставления района или здания без участия модели
+NAME_MATCH_SCORE = 0.85
+
+
+def _parse_count(value):
+    if value.isdigit():
+        return int(value)
+
+    for stem, number in NUMBER_WORD_STEMS:
+        if value.startswith(stem):
+            return number
+
+    return None
+
+
+def _multiplier_value(multiplier):
+    if not multiplier:
+        return 1
+    if multiplier.startswith(("млн", "миллион", "mln", "million", "m")):
+        return 1_000_000
+
+    return 1_000
+
+
+def _parse_price(value, multiplier):
+    number = float(re.sub(r"[  ]", "", value).replace(",", "."))
+
+    return number * _multiplier_value(multiplier)
+
+
+def _extract_bedrooms(text):
+    """
+    Количество спален из единственного упоминания спален в тексте.
+
+    Returns:
+        tuple: Количество (None, если спальни не упомянуты или упомянуты
+            неоднозначно) и совпадение BEDROOMS_RE или None
+    """
+    matches = list(BEDROOMS_RE.finditer(text))
+    if len(matches) != 1:
+        return None, None
+
+    match = matches[0]
+    if BEDROOMS_BEFORE_RE.search(text[:match.start()]) or BEDROOMS_AFTER_RE.search(text[match.end():]):
+        return None, None
+
+    return _parse_count(match.group("prefix") or match.group("count")), match
+
+
+def _is_price(match, text):
+    # Единицы, валюта или слово о цене перед выражением - это цена; голое число - только достаточно большое
+    groups = match.groupdict()
+    if groups.get("min_mult") or groups["max_mult"] or groups["currency"]:
+        return True
+    if PRICE_CONTEXT_RE.search(text[:match.start()]):
+        return True
+
+    # Диапазон без единиц ("4000000-7000000") считается ценой только после "от"/"from"
+    if "keyword" in groups and not groups["keyword"]:
+        return False
+    return _parse_price(groups["max"], None) >= MIN_BARE_PRICE
+
+
+def _extract_price(text):
+    """
+    Цена из единственного ценового выражения в тексте: диапазона или верхней границы.
+
+    Returns:
+        tuple: Минимальная и максимальная цена или (None, None), если цены нет,
+            выражений несколько или число в форме цены ценой уверенно не является
+    """
+    prices = []
+    for match in PRICE_RANGE_RE.finditer(text):
+        if not _is_price(match, text):
+            return None, None
+        max_multiplier = match.group("max_mult")
+        min_multiplier = match.group("min_mult")
+        # "от 1.5 до 3 млн": множитель относится к обеим границам
+        if not min_multiplier and max_multiplier and _parse_price(match.group("min"), None) < 1000:
+            min_multiplier = max_multiplier
+        prices.append((_parse_price(match.group("min"), min_multiplier),
+                       _parse_price(match.group("max"), max_multiplier)))
+        # "до" внутри диапазона не должно найтись еще раз как верхняя граница
+        text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+
+    for match in PRICE_MAX_RE.finditer(text):
+        if not _is_price(match, text):
+            return None, None
+        prices.append((0, _parse_price(match.group("max"), match.group("max_mult"))))
+
+    return prices[0] if len(prices) == 1 else (None, None)
+
+
+def _first_match(patterns, text):
+    found = [value for value, pattern in patterns if pattern.search(text)]
+
+    return found[0] if len(found) == 1 else None
+
+
+def _match_name(index, text):
+    matches = index.search_scored(text, 2, proj_settings.candidates_min_score)
+    if not matches:
+        return ""
+    name, score = matches[0]
+    if score < NAME_MATCH_SCORE or (len(matches) > 1 and matches[1][1] >= NAME_MATCH_SCORE):
+        return None
+
+    return name
+
+
+def extract_search_arguments(query, catalog):
+    """
+    Извлечение критериев поиска правилами, без обращения к модели.
+
+    Разбирает цены (в том числе "млн" и "k"), количество спален и ванных
+    цифрами и словами, тип объекта, назначение, меблировку и готовность.
+    Возвращает аргументы только тогда, когда найдены все обязательные
+    критерии и в тексте нет ничего, что правила могли бы понять неверно:
+    диапазона или вариантов количества спален, нескольких ценовых
+    выражений или чисел в форме цены без единиц и слова о цене.
+
+    Args:
+        query: Запрос пользователя
+        catalog: Снимок справочников для сопоставления районов и зданий
+
+    Returns:
+        dict | None: Аргументы в формате функции database_search или None
+    """
+    text = query.lower().replace("ё", "е")
+
+    if UNSUPPORTED_RE.search(text):
+        return None
+
+    studio = ""
+    bedroom_count, match = _extract_bedrooms(text)
+    if match:
+        text = text[:match.start()] + " " + text[match.end():]
+    elif not BEDROOMS_RE.search(text) and STUDIO_RE.search(text):
+        studio = "Studio"
+        bedroom_count = 0
+
+    bath_count = 0
+    match = BATHS_RE.search(text)
+    if match:
+        bath_count = _parse_count(match.group("count"))
+        text = text[:match.start()] + " " + text[match.end():]
+
+    sqft = 0
+    match = SQFT_RE.search(text)
+    if match:
+        sqft = _parse_price(match.group("value"), None)
+        text = text[:match.start()] + " " + text[match.end():]
+
+    min_price, max_price = _extract_price(text)
+
+    property_type = _first_match(PROPERTY_TYPES, text)
+
+    if (property_type is None or bedroom_count is None or bath_count is None
+            or max_price is None or min_price > max_price):
+        return None
+
+    areas_index, buildings_index = get_catalog_indexes(catalog)
+    area = _match_name(areas_index, query)
+    building = _match_name(buildings_index, query)
+    if area is None or building is None:
+        return None
+
+    return {
+        "min_price": min_price,
+        "max_price": max_price,
+        "type": property_type,
+        "purpose": _first_match(PURPOSES, text) or "",
+        "completion": _first_match(COMPLETION, text) or "",
+        "handover_date": "",
+        "furnishing": _first_match(FURNISHING, text) or "",
+        "studio": studio,
+        "sqft": sqft,
+        "bath_count": bath_count,
+        "bedroom_count": bedroom_count,
+        "view": "",
+        "vacant": "",
+        "area": area,
+        "building": building,
+    }
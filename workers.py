@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import secrets
+import zlib
+
+from aiohttp import web
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def update_user_id(update):
+    """
+    Идентификатор пользователя (или чата), от которого пришло обновление.
+
+    Args:
+        update: Обновление Telegram в виде словаря
+
+    Returns:
+        int: Идентификатор пользователя, чата или, если их нет, обновления
+    """
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        for field in ("from", "user", "chat"):
+            if isinstance(event.get(field), dict) and "id" in event[field]:
+                return event[field]["id"]
+        if isinstance(event.get("message"), dict):
+            return update_user_id({"message": event["message"]})
+
+    return update.get("update_id", 0)
+
+
+async def _feed(bot, dispatcher, update, previous):
+    # Обновления одного пользователя обрабатываются строго друг за другом
+    if previous is not None:
+        await asyncio.wait([previous])
+
+    try:
+        await dispatcher.feed_raw_update(bot=bot, update=update)
+    except Exception as e:
+        logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+
+async def _serve(index, setup, updates, ready):
+    bot, dispatcher = setup()
+    await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher, **dispatcher.workflow_data)
+    ready.put(index)
+    logger.info(f"Воркер {index} готов к обработке обновлений")
+
+    loop = asyncio.get_running_loop()
+    tails = {}
+    try:
+        while (update := await loop.run_in_executor(None, updates.get)) is not None:
+            key = update_user_id(update)
+            task = asyncio.create_task(_feed(bot, dispatcher, update, tails.get(key)))
+            tails[key] = task
+            task.add_done_callback(lambda done, key=key: tails.pop(key) if tails.get(key) is done else None)
+
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher, **dispatcher.workflow_data)
+        await bot.session.close()
+
+
+def _worker_main(index, setup, updates, ready):
+    asyncio.run(_serve(index, setup, updates, ready))
+
+
+class WorkerPool:
+    """
+    Процессы-обработчики обновлений за общим приемом обновлений.
+
+    Обновления одного пользователя всегда попадают в один и тот же процесс
+    и обрабатываются в нем по порядку, поэтому переходы HousingSearchStates
+    не перемешиваются, даже если состояние хранится в памяти процесса.
+    Порядок гарантируется только до возврата из обработчика: поиск по
+    запросу (handlers/start_handler.py) идет в фоновой задаче, и ее
+    результат упорядочивается уже самим обработчиком, а не пулом.
+
+    Args:
+        count: Количество процессов
+        setup: Функция верхнего уровня без аргументов, которая в процессе-обработчике
+            подключает роутеры и возвращает пару (bot, dispatcher)
+    """
+
+    def __init__(self, count, setup):
+        self.count = count
+        self.setup = setup
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue() for _ in range(count)]
+        self._ready = self._context.Queue()
+        self._processes = []
+
+    def start(self):
+        """
+        Запуск процессов и ожидание, пока каждый из них выполнит обработчики запуска.
+        """
+        for index, updates in enumerate(self._queues):
+            process = self._context.Process(target=_worker_main, args=(index, self.setup, updates, self._ready),
+                                            name=f"bot-worker-{index}", daemon=True)
+            process.start()
+            self._processes.append(process)
+
+        started = 0
+        while started < self.count:
+            try:
+                self._ready.get(timeout=1)
+                started += 1
+            except queue.Empty:
+                # Процесс, упавший в обработчиках запуска, готовность уже не сообщит
+                if not all(process.is_alive() for process in self._processes):
+                    self.terminate()
+                    raise RuntimeError("Процесс-обработчик обновлений завершился при запуске")
+
+    def submit(self, update):
+        """
+        Передача обновления процессу, закрепленному за пользователем.
+
+        Args:
+            update: Обновление Telegram в виде словаря
+        """
+        user_id = update_user_id(update)
+        shard = zlib.crc32(str(user_id).encode()) % self.count
+        self._queues[shard].put(update)
+
+    def stop(self):
+        """
+        Остановка процессов после обработки всех переданных обновлений.
+        """
+        for updates in self._queues:
+            updates.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+    def terminate(self):
+        """
+        Немедленное завершение процессов без обработки оставшихся обновлений.
+        """
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+
+async def poll_updates(bot, pool, allowed_updates=None, timeout=30):
+    """
+    Получение обновлений long polling'ом и распределение их по процессам.
+
+    Args:
+        bot: Бот, от имени которого запрашиваются обновления
+        pool: Запущенный WorkerPool
+        allowed_updates: Типы обновлений, которые нужно получать
+        timeout: Время ожидания обновлений в одном запросе, секунд
+    """
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout, allowed_updates=allowed_updates,
+                                            request_timeout=timeout + 10)
+        except Exception as e:
+            logger.error(f"Ошибка получения обновлений: {e}")
+            await asyncio.sleep(1)
+            continue
+
+        for update in updates:
+            pool.submit(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+def webhook_handler(pool, secret_token):
+    """
+    Обработчик aiohttp для вебхука, передающий обновления в процессы без обработки.
+
+    Args:
+        pool: Запущенный WorkerPool
+        secret_token: Ожидаемое значение X-Telegram-Bot-Api-Secret-Token
+
+    Returns:
+        Coroutine function: Обработчик POST-запроса
+    """
+    async def handle(request):
+        if not secrets.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret_token):
+            return web.Response(body="Unauthorized", status=401)
+
+        pool.submit(await request.json())
+        return web.json_response({})
+
+    return handle